@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+
+# Cumulative counters whose last value is the total for the run
+TOTAL_COLUMNS = {
+    "network_received_mb": "network_received_mb",
+    "network_sent_mb": "network_sent_mb",
+    "disk_read_mb": "disk_read_mb",
+    "disk_write_mb": "disk_write_mb",
+    "cpu_throttled_periods": "throttled_periods",
+}
+
+
+def summarize_report(df):
+    """
+    Reduces a report with one row per sample to one row per machine.
+
+    Every aggregate is computed with grouped, vectorized operations: CPU and
+    memory percentiles, peaks, CPU time as the integral of CPU usage over the
+    runtime, I/O totals, and each machine's speedup relative to the slowest one.
+    Columns missing from older reports are skipped.
+    """
+    df = df.sort_values(["container_name", "runtime_seconds"], kind="stable")
+    grouped = df.groupby("container_name", sort=False)
+
+    summary = pd.DataFrame({"samples": grouped.size()})
+    summary["duration_seconds"] = grouped["runtime_seconds"].max()
+
+    if "code_execution_time_seconds" in df:
+        summary["execution_seconds"] = grouped["code_execution_time_seconds"].max()
+
+    cpu = grouped["cpu_usage_percentage"]
+    summary["cpu_p50"] = cpu.quantile(0.5)
+    summary["cpu_p95"] = cpu.quantile(0.95)
+    summary["cpu_peak"] = cpu.max()
+
+    # Trapezoidal integral of CPU usage (100% = one core) over runtime
+    elapsed = grouped["runtime_seconds"].diff().fillna(0).to_numpy()
+    usage = df["cpu_usage_percentage"].to_numpy()
+    previous_usage = grouped["cpu_usage_percentage"].shift().to_numpy()
+    previous_usage = np.where(np.isnan(previous_usage), usage, previous_usage)
+    core_seconds = pd.Series(elapsed * (usage + previous_usage) / 200, index=df.index)
+    summary["cpu_core_seconds"] = core_seconds.groupby(
+        df["container_name"], sort=False
+    ).sum()
+
+    memory = grouped["memory_usage_mb"]
+    summary["memory_p50_mb"] = memory.quantile(0.5)
+    summary["memory_p95_mb"] = memory.quantile(0.95)
+    summary["memory_peak_mb"] = memory.max()
+
+    for column, name in TOTAL_COLUMNS.items():
+        if column in df:
+            summary[name] = grouped[column].max()
+    for column in ("disk_read_iops", "disk_write_iops"):
+        if column in df:
+            summary[f"{column}_peak"] = grouped[column].max()
+
+    time_column = (
+        "execution_seconds"
+        if "execution_seconds" in summary and summary["execution_seconds"].notna().any()
+        else "duration_seconds"
+    )
+    summary["speedup_vs_slowest"] = summary[time_column].max() / summary[time_column]
+    summary["rank"] = summary[time_column].rank(method="min").astype("Int64")
+
+    return summary.sort_values("rank").round(3)
+
+
+def format_summary(summary):
+    """
+    Renders a per-machine summary as compact CSV for the prompt.
+    """
+    return summary.to_csv(index_label="machine")
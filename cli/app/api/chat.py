@@ -0,0 +1,190 @@
+import hashlib
+import json
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict, deque
+
+from openai import AsyncOpenAI
+
+logger = logging.getLogger(__name__)
+
+# Model used to answer questions about a report, unless OPENAI_MODEL is set
+DEFAULT_CHAT_MODEL = "gpt-4"
+
+# Messages kept per session, counting both questions and answers
+MAX_SESSION_HISTORY = 20
+
+# Sessions kept at once; the least recently used one is dropped first
+MAX_SESSIONS = 1000
+
+# Seconds after which an inactive session is dropped
+SESSION_TTL = 3600
+
+# Cached answers, and how long they stay valid (in seconds)
+MAX_CACHED_RESPONSES = 256
+RESPONSE_CACHE_TTL = 600
+
+SYSTEM_PROMPT = (
+    "You are a helpful assistant analyzing data about the speed of different OS's."
+)
+
+
+class TTLCache:
+    """A least-recently-used mapping whose entries also expire after `ttl` seconds"""
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return value
+
+    def set(self, key, value):
+        self.entries[key] = (time.monotonic() + self.ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+
+class SessionStore:
+    """Bounded conversation histories, one per chat session"""
+
+    def __init__(
+        self,
+        max_sessions=MAX_SESSIONS,
+        max_history=MAX_SESSION_HISTORY,
+        ttl=SESSION_TTL,
+    ):
+        self.max_history = max_history
+        self.sessions = TTLCache(max_sessions, ttl)
+
+    def history(self, session_id):
+        """
+        Returns the history of a session, starting a new one when it is unknown
+        or has expired.
+        """
+        history = self.sessions.get(session_id)
+        if history is None:
+            history = deque(maxlen=self.max_history)
+        # Refresh the expiry on every use
+        self.sessions.set(session_id, history)
+        return history
+
+
+def response_cache_key(summary, user_prompt, history, csv_data=None):
+    """
+    Hashes the report, the prompt and the conversation so far. Opening questions
+    about the same report share answers across sessions.
+    """
+    digest = hashlib.sha256()
+    for part in (summary, csv_data or "", json.dumps(list(history)), user_prompt):
+        digest.update(part.encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class ChatGPTInteraction:
+    """
+    Answers questions about a report with the non-blocking OpenAI client.
+
+    The client keeps its HTTP connections open between requests. Each session
+    keeps its own bounded history, and answers are cached by report, prompt and
+    history.
+    """
+
+    def __init__(self):
+        api_key = os.getenv("OPENAI_API_KEY")
+        if not api_key:
+            raise ValueError("OPENAI_API_KEY not found in environment variables")
+        # OPENAI_BASE_URL points the client at any server speaking the chat
+        # completions protocol
+        self.client = AsyncOpenAI(api_key=api_key)
+        self.model = os.getenv("OPENAI_MODEL", DEFAULT_CHAT_MODEL)
+        self.sessions = SessionStore()
+        self.cache = TTLCache(MAX_CACHED_RESPONSES, RESPONSE_CACHE_TTL)
+
+    @staticmethod
+    def new_session_id():
+        return uuid.uuid4().hex
+
+    def _messages(self, summary, history, user_prompt, csv_data):
+        messages = [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {
+                "role": "user",
+                "content": (
+                    "Here is a per-machine summary of the benchmark in CSV format. "
+                    "CPU is in percent of one core, cpu_core_seconds is the CPU "
+                    "time used, and speedup_vs_slowest compares execution times:"
+                    f"\n{summary}"
+                ),
+            },
+        ]
+        if csv_data is not None:
+            messages.append(
+                {
+                    "role": "user",
+                    "content": f"Here are the raw samples in CSV format:\n{csv_data}",
+                }
+            )
+        messages.extend(history)
+        messages.append({"role": "user", "content": user_prompt})
+        return messages
+
+    async def stream_response(self, session_id, summary, user_prompt, csv_data=None):
+        """
+        Yields the answer as it is generated, and records it in the session once
+        complete. A cached answer is yielded in one piece.
+        """
+        history = self.sessions.history(session_id)
+        key = response_cache_key(summary, user_prompt, history, csv_data)
+
+        answer = self.cache.get(key)
+        if answer is not None:
+            logger.info("Answering from the response cache")
+            yield answer
+        else:
+            logger.info(f"Generating response for prompt: {user_prompt}")
+            stream = await self.client.chat.completions.create(
+                model=self.model,
+                messages=self._messages(summary, history, user_prompt, csv_data),
+                temperature=0.7,
+                max_tokens=4000,
+                stream=True,
+            )
+            parts = []
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                token = chunk.choices[0].delta.content
+                if token:
+                    parts.append(token)
+                    yield token
+            answer = "".join(parts)
+            self.cache.set(key, answer)
+            logger.info("Successfully generated response")
+
+        history.append({"role": "user", "content": user_prompt})
+        history.append({"role": "assistant", "content": answer})
+
+    async def generate_response(self, session_id, summary, user_prompt, csv_data=None):
+        """
+        Returns the complete answer to a question.
+        """
+        parts = []
+        async for token in self.stream_response(
+            session_id, summary, user_prompt, csv_data
+        ):
+            parts.append(token)
+        return "".join(parts)
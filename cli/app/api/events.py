@@ -0,0 +1,141 @@
+import asyncio
+import json
+import threading
+from collections import defaultdict
+
+# Maximum number of events buffered for a subscriber before downsampling
+MAX_SUBSCRIBER_BUFFER = 500
+
+# Seconds between keep-alive comments on an idle stream
+HEARTBEAT_INTERVAL = 15
+
+
+class Subscriber:
+    """
+    A client listening to one topic.
+
+    Events are pushed from sampler threads and drained by the client's async
+    generator. When the client falls behind and the buffer fills up, every other
+    buffered sample is dropped and only every `stride`-th new sample of each
+    container is kept, so the stream keeps its shape at a lower resolution.
+    The stride halves again once the client catches up.
+    """
+
+    def __init__(self, loop, max_buffer=MAX_SUBSCRIBER_BUFFER):
+        self.loop = loop
+        self.max_buffer = max_buffer
+        self.buffer = []
+        self.stride = 1
+        self.counters = defaultdict(int)
+        self.closed = False
+        self.ready = asyncio.Event()
+        self.lock = threading.Lock()
+
+    def push(self, event):
+        with self.lock:
+            if event["event"] == "sample":
+                container = event["data"]["container_name"]
+                self.counters[container] += 1
+                if self.counters[container] % self.stride:
+                    return
+                if len(self.buffer) >= self.max_buffer:
+                    self._downsample()
+            self.buffer.append(event)
+        self._wake()
+
+    def close(self):
+        self.closed = True
+        self._wake()
+
+    def _downsample(self):
+        kept = []
+        seen = defaultdict(int)
+        for event in self.buffer:
+            if event["event"] == "sample":
+                container = event["data"]["container_name"]
+                seen[container] += 1
+                if seen[container] % 2 == 0:
+                    continue
+            kept.append(event)
+        self.buffer = kept
+        self.stride *= 2
+
+    def _wake(self):
+        try:
+            self.loop.call_soon_threadsafe(self.ready.set)
+        except RuntimeError:
+            # The client's event loop is gone; nothing is listening anymore
+            self.closed = True
+
+    def drain(self):
+        with self.lock:
+            events, self.buffer = self.buffer, []
+            self.ready.clear()
+            if self.stride > 1 and len(events) < self.max_buffer // 4:
+                self.stride //= 2
+        return events
+
+
+class EventBroker:
+    """Fans out events published by job threads to SSE subscribers"""
+
+    def __init__(self):
+        self.subscribers = defaultdict(list)
+        self.closed_topics = set()
+        self.lock = threading.Lock()
+
+    def publish(self, topic, event, data):
+        with self.lock:
+            subscribers = list(self.subscribers.get(topic, []))
+        for subscriber in subscribers:
+            subscriber.push({"event": event, "data": data})
+
+    def close(self, topic):
+        """Ends every stream of a topic once its buffered events are sent"""
+        with self.lock:
+            self.closed_topics.add(topic)
+            subscribers = self.subscribers.pop(topic, [])
+        for subscriber in subscribers:
+            subscriber.close()
+
+    def forget(self, topic):
+        """Drops a closed topic, e.g. once its job is evicted"""
+        with self.lock:
+            self.closed_topics.discard(topic)
+
+    def subscribe(self, topic):
+        subscriber = Subscriber(asyncio.get_running_loop())
+        with self.lock:
+            if topic in self.closed_topics:
+                subscriber.closed = True
+            else:
+                self.subscribers[topic].append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, topic, subscriber):
+        with self.lock:
+            if subscriber in self.subscribers.get(topic, []):
+                self.subscribers[topic].remove(subscriber)
+
+    async def stream(self, topic):
+        """Yields server-sent events for a topic until it is closed"""
+        subscriber = self.subscribe(topic)
+        try:
+            while True:
+                closed = subscriber.closed
+                for event in subscriber.drain():
+                    yield (
+                        f"event: {event['event']}\n"
+                        f"data: {json.dumps(event['data'])}\n\n"
+                    )
+                if closed:
+                    yield "event: end\ndata: {}\n\n"
+                    break
+                try:
+                    await asyncio.wait_for(
+                        subscriber.ready.wait(), timeout=HEARTBEAT_INTERVAL
+                    )
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+        finally:
+            self.unsubscribe(topic, subscriber)
@@ -0,0 +1,142 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from app.telemetry import JOBS_FINISHED
+
+# Maximum number of jobs running at the same time
+JOB_WORKERS = int(os.getenv("TIN_JOB_WORKERS", "2"))
+
+# Maximum number of finished jobs kept for status queries
+MAX_FINISHED_JOBS = 100
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+class Job:
+    """A unit of work submitted to the job queue"""
+
+    def __init__(self):
+        self.id = uuid.uuid4().hex
+        self.status = QUEUED
+        self.progress = {"completed": 0, "total": 0}
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_event = threading.Event()
+        self.future = None
+        # Called with the job once it is over, whether or not it ran
+        self.cleanup = None
+        # Files produced by the job, by name
+        self.artifacts = {}
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def set_progress(self, completed, total):
+        self.progress = {"completed": completed, "total": total}
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "status": self.status,
+            "progress": self.progress,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "artifacts": sorted(self.artifacts),
+        }
+
+
+class JobQueue:
+    """Runs jobs on a bounded thread pool, off the event loop"""
+
+    def __init__(self, max_workers=JOB_WORKERS, on_evict=None):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.jobs = {}
+        self.lock = threading.Lock()
+        # Called with each finished job dropped from the queue
+        self.on_evict = on_evict
+
+    def submit(self, task, *args, cleanup=None, **kwargs):
+        """
+        Queues task(job, *args, **kwargs) and returns the job. cleanup(job) runs
+        once the job is over, also when it is cancelled before it started.
+        """
+        job = Job()
+        with self.lock:
+            self.jobs[job.id] = job
+            self._evict_finished()
+        job.cleanup = cleanup
+        job.future = self.executor.submit(self._run, job, task, *args, **kwargs)
+        return job
+
+    def _run(self, job, task, *args, **kwargs):
+        try:
+            if job.cancelled:
+                job.status = CANCELLED
+                return
+            job.status = RUNNING
+            job.started_at = time.time()
+            try:
+                job.result = task(job, *args, **kwargs)
+                job.status = CANCELLED if job.cancelled else COMPLETED
+            except Exception as e:
+                job.error = str(e)
+                job.status = CANCELLED if job.cancelled else FAILED
+        finally:
+            job.finished_at = time.time()
+            JOBS_FINISHED.labels(status=job.status).inc()
+            self._cleanup(job)
+
+    def _cleanup(self, job):
+        if job.cleanup is not None:
+            job.cleanup(job)
+
+    def get(self, job_id):
+        """Returns a job by id, or None"""
+        return self.jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """Cancels a queued job, or asks a running job to stop"""
+        job = self.get(job_id)
+        if job is None:
+            return None
+        job.cancel_event.set()
+        if job.status == QUEUED and job.future.cancel():
+            job.status = CANCELLED
+            job.finished_at = time.time()
+            JOBS_FINISHED.labels(status=job.status).inc()
+            self._cleanup(job)
+        return job
+
+    def pending(self):
+        """Number of jobs waiting for a worker"""
+        return sum(1 for job in self.jobs.values() if job.status == QUEUED)
+
+    def running(self):
+        """Number of jobs being run"""
+        return sum(1 for job in self.jobs.values() if job.status == RUNNING)
+
+    def _evict_finished(self):
+        finished = [
+            job
+            for job in self.jobs.values()
+            if job.status in (COMPLETED, FAILED, CANCELLED)
+        ]
+        finished.sort(key=lambda job: job.finished_at or 0)
+        for job in finished[: max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self.jobs[job.id]
+            if self.on_evict is not None:
+                self.on_evict(job)
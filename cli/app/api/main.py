@@ -2,20 +2,48 @@ import json
 import logging
 import os
 import shutil
+import uuid
 from http.client import HTTPException
 from io import StringIO
+from typing import Optional
 
-import docker
 import pandas as pd
-from app.api.utils import (
-    create_machine_config,
-    run_code_in_container,
-    save_uploaded_file,
+from app.api.analysis import format_summary, summarize_report
+from app.api.chat import ChatGPTInteraction
+from app.api.events import EventBroker
+from app.api.jobs import JobQueue
+from app.api.uploads import UPLOAD_DIRECTORY, prune_blobs, save_uploads
+from app.api.utils import create_machine_config, run_code_in_container
+from app.api.workers import Dispatcher, run_code_on_workers
+from app.constants import (
+    DEFAULT_PROFILE,
+    OUTPUT_FILE_NAME,
+    REPORT_HEADERS,
+    SUMMARY_FILE_NAME,
 )
+from app.profiles import resolve_profile
+from app.sampler import SAMPLERS
+from app.series import SERIES_POINT_BUDGET
+from app.store import default_store
+from app.telemetry import (
+    CONTENT_TYPE,
+    JOBS_QUEUED,
+    JOBS_RUNNING,
+    WORKER_TASKS_QUEUED,
+    WORKERS,
+    render_metrics,
+)
+from app.timing import summary_file_for
 from dotenv import load_dotenv
 from fastapi import FastAPI, File, Form, HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from openai import OpenAI
+from fastapi.responses import (
+    FileResponse,
+    JSONResponse,
+    Response,
+    StreamingResponse,
+)
 from pydantic import BaseModel
 
 # Set up logging
@@ -31,63 +59,42 @@ app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:3000"],
     allow_credentials=True,
-    allow_methods=["POST", "GET"],
+    allow_methods=["POST", "GET", "DELETE"],
     allow_headers=["Content-Type"],
 )
 
-UPLOAD_DIRECTORY = "uploads"
-client = docker.from_env()
+job_queue = JobQueue(on_evict=lambda job: evict_job(job))
+event_broker = EventBroker()
+dispatcher = Dispatcher()
 
 
 # AI Chat Classes and Routes
 class ChatRequest(BaseModel):
     csv_data: str
     user_prompt: str
+    # Also send the raw rows to the model, on top of the per-machine summary
+    include_raw: bool = False
+    # Continues an earlier conversation; a new session is started when missing
+    session_id: Optional[str] = None
+    # Streams the answer as server-sent events instead of returning it at once
+    stream: bool = False
 
 
-class ChatGPTInteraction:
-    def __init__(self):
-        api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key:
-            raise ValueError("OPENAI_API_KEY not found in environment variables")
-        self.client = OpenAI(api_key=api_key)
-        self.conversation_history = []
-
-    async def generate_response(self, csv_data: str, user_prompt: str) -> str:
-        try:
-            logger.info(f"Generating response for prompt: {user_prompt}")
-            self.conversation_history.append({"role": "user", "content": user_prompt})
-
-            messages = [
-                {
-                    "role": "system",
-                    "content": "You are a helpful assistant analyzing data about the speed of different OS's.",
-                },
-                {
-                    "role": "user",
-                    "content": f"Here is the data to analyze in CSV format:\n{csv_data}",
-                },
-            ]
-            messages.extend(self.conversation_history)
-
-            response = self.client.chat.completions.create(
-                model="gpt-4", messages=messages, temperature=0.7, max_tokens=4000
-            )
-
-            assistant_response = response.choices[0].message.content
-            self.conversation_history.append(
-                {"role": "assistant", "content": assistant_response}
-            )
-            logger.info("Successfully generated response")
-
-            return assistant_response
-
-        except Exception as e:
-            logger.error(f"Error generating response: {str(e)}")
-            raise HTTPException(status_code=500, detail=str(e))
+chat_interaction = ChatGPTInteraction()
 
 
-chat_interaction = ChatGPTInteraction()
+async def stream_chat_events(session_id, summary, user_prompt, csv_data):
+    """Yields an answer as server-sent token events"""
+    yield f"event: session\ndata: {json.dumps({'session_id': session_id})}\n\n"
+    try:
+        async for token in chat_interaction.stream_response(
+            session_id, summary, user_prompt, csv_data
+        ):
+            yield f"event: token\ndata: {json.dumps({'token': token})}\n\n"
+    except Exception as e:
+        logger.error(f"Error generating response: {str(e)}")
+        yield f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n"
+    yield "event: end\ndata: {}\n\n"
 
 
 @app.post("/api/chat")
@@ -99,97 +106,474 @@ async def chat(request: ChatRequest):
 
         if not request.csv_data or not request.user_prompt:
             logger.error("Missing required data")
-            return {"error": "Missing required data in request"}, 400
+            return JSONResponse(
+                {"error": "Missing required data in request"}, status_code=400
+            )
 
         try:
             csv_io = StringIO(request.csv_data)
             df = pd.read_csv(csv_io)
             logger.info(f"Successfully parsed CSV data with {len(df)} rows")
+            summary = format_summary(summarize_report(df))
         except Exception as e:
             logger.error(f"CSV parsing error: {str(e)}")
-            return {"error": f"Failed to parse CSV data: {str(e)}"}, 400
+            return JSONResponse(
+                {"error": f"Failed to parse CSV data: {str(e)}"}, status_code=400
+            )
+
+        session_id = request.session_id or chat_interaction.new_session_id()
+        csv_data = request.csv_data if request.include_raw else None
+
+        if request.stream:
+            return StreamingResponse(
+                stream_chat_events(session_id, summary, request.user_prompt, csv_data),
+                media_type="text/event-stream",
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+            )
 
         try:
             response = await chat_interaction.generate_response(
-                request.csv_data, request.user_prompt
+                session_id, summary, request.user_prompt, csv_data
             )
-            logger.info("Successfully generated response")
-            return {"response": response}
+            return {"response": response, "session_id": session_id}
         except Exception as e:
             logger.error(f"Error generating response: {str(e)}")
-            return {"error": f"Failed to generate response: {str(e)}"}, 500
+            # The chat completions server failed or could not be reached
+            return JSONResponse(
+                {"error": f"Failed to generate response: {str(e)}"}, status_code=502
+            )
     except Exception as e:
         logger.error(f"Unexpected error: {str(e)}")
-        return {"error": f"Unexpected error: {str(e)}"}, 500
+        return JSONResponse({"error": f"Unexpected error: {str(e)}"}, status_code=500)
 
 
-# File Upload Route
-@app.post("/upload")
-async def process_upload(
-    machines: str = Form(...),
-    language: str = Form(...),
-    entryPoint: str = Form(...),
-    files: list[UploadFile] = File(...),
-):
+def remove_artifacts(job):
     """
-    Process the uploaded files and generate a CSV report.
+    Removes the workspace holding a job's artifacts once the job is evicted.
     """
+    for path in job.artifacts.values():
+        shutil.rmtree(os.path.dirname(path), ignore_errors=True)
 
-    base_folder_path = "uploads/uploaded_files"
-    output_file = "tin-report.csv"
+
+def evict_job(job):
+    """
+    Releases what a job kept for status queries once it is evicted.
+    """
+    remove_artifacts(job)
+    event_broker.forget(job.id)
+
+
+def finish_upload_job(job, workspace):
+    """
+    Ends a job's event stream and removes its workspace, keeping the report
+    with the job until it is evicted from the queue.
+    """
+    event_broker.close(job.id)
+    folder_path = os.path.join(workspace, "files")
+    shutil.rmtree(folder_path if job.artifacts else workspace, ignore_errors=True)
+    print(f"Cleaned up folder: {folder_path}")
+
+
+def run_upload_job(job, machine_configs, workspace, language, entryPoint, options):
+    """
+    Runs an uploaded project on the selected machines and publishes the report.
+    """
+    folder_path = os.path.join(workspace, "files")
+    output_file = os.path.join(workspace, OUTPUT_FILE_NAME)
+    summary_file = summary_file_for(output_file)
 
     current_dir = os.path.dirname(__file__)
     public_folder = os.path.abspath(
         os.path.join(current_dir, "..", "..", "..", "frontend", "public")
     )
-
     os.makedirs(public_folder, exist_ok=True)
+    public_csv_path = os.path.join(public_folder, OUTPUT_FILE_NAME)
+    public_summary_path = os.path.join(public_folder, SUMMARY_FILE_NAME)
+
+    def publish_progress(completed, total):
+        job.set_progress(completed, total)
+        event_broker.publish(job.id, "progress", job.progress)
+
+    def publish_sample(container_name, sample):
+        event_broker.publish(
+            job.id,
+            "sample",
+            {
+                "container_name": container_name,
+                **{
+                    key: value
+                    for key, value in sample.items()
+                    if key in REPORT_HEADERS or key == "memory_peak_mb"
+                },
+            },
+        )
+
+    publish_progress(0, len(machine_configs))
+
+    store = default_store()
+    profile = options.get("profile")
+    run_id = store.create_run(
+        language,
+        entryPoint,
+        source="api",
+        run_id=job.id,
+        profile=profile["name"] if profile else None,
+    )
+    status = "failed"
+
+    try:
+        # Registered workers take the machines off this host's Docker daemon
+        if dispatcher.live_workers():
+            error = run_code_on_workers(
+                dispatcher,
+                job.id,
+                machine_configs,
+                folder_path,
+                language,
+                entryPoint,
+                store,
+                run_id,
+                output_file=output_file,
+                cancel_event=job.cancel_event,
+                on_progress=publish_progress,
+                on_sample=publish_sample,
+                **options,
+            )
+        else:
+            error = run_code_in_container(
+                machine_configs,
+                folder_path,
+                language,
+                entryPoint,
+                output_file=output_file,
+                cancel_event=job.cancel_event,
+                on_progress=publish_progress,
+                on_sample=publish_sample,
+                store=store,
+                run_id=run_id,
+                **options,
+            )
 
-    public_csv_path = os.path.join(public_folder, "tin-report.csv")
+        if job.cancelled:
+            status = "cancelled"
+            return None
 
-    saved_files = []
+        if not os.path.exists(output_file):
+            raise RuntimeError(error or "CSV file not generated")
 
-    for file in files:
-        try:
-            saved_location = save_uploaded_file(base_folder_path, file)
-            saved_files.append(saved_location)
-        except HTTPException:
-            print(f"Failed to upload {file.filename}")
+        job.artifacts["report"] = output_file
+        if os.path.exists(summary_file):
+            job.artifacts["summary"] = summary_file
 
+        shutil.copy(output_file, public_csv_path)
+        print(f"CSV copied to {public_csv_path}")
+        if os.path.exists(summary_file):
+            shutil.copy(summary_file, public_summary_path)
+            print(f"Summary copied to {public_summary_path}")
+
+        # The partial report stays available, but the job fails with the error
+        if error:
+            raise RuntimeError(error)
+
+        status = "completed"
+        return {
+            "message": "CSV saved to public folder",
+            "path": OUTPUT_FILE_NAME,
+            "report": f"/jobs/{job.id}/artifacts/report",
+            "run_id": run_id,
+        }
+    finally:
+        store.finish_run(run_id, status)
+
+
+# File Upload Route
+@app.post("/upload")
+async def process_upload(
+    machines: str = Form(...),
+    language: str = Form(...),
+    entryPoint: str = Form(...),
+    files: list[UploadFile] = File(...),
+    parallel: int = Form(1),
+    isolated: bool = Form(False),
+    sampleInterval: Optional[float] = Form(None),
+    sampler: str = Form("auto"),
+    runs: int = Form(1),
+    warmup: int = Form(0),
+    pool: bool = Form(True),
+    profile: str = Form(DEFAULT_PROFILE),
+):
+    """
+    Save the uploaded files and queue a job that generates a CSV report.
+    """
     try:
         machines_list = json.loads(machines)
-        machine_configs = create_machine_config(machines_list)
+        machine_configs = create_machine_config(machines_list, language)
         print(f"Using machine configurations: {machine_configs}")
     except json.JSONDecodeError:
         raise HTTPException(status_code=400, detail="Invalid machines format.")
 
-    run_code_in_container(machine_configs, base_folder_path, language, entryPoint)
+    if sampler not in SAMPLERS:
+        raise HTTPException(status_code=400, detail=f"Unknown sampler: {sampler}")
 
-    if not os.path.exists(output_file):
-        raise HTTPException(status_code=404, detail="CSV file not generated")
+    if runs < 1 or warmup < 0:
+        raise HTTPException(status_code=400, detail="Invalid runs or warmup count.")
 
     try:
-        shutil.copy(output_file, public_csv_path)
-        print(f"CSV copied to {public_csv_path}")
+        measurement_profile = resolve_profile(profile)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    workspace = os.path.join(UPLOAD_DIRECTORY, uuid.uuid4().hex)
+    folder_path = os.path.join(workspace, "files")
+
+    try:
+        # The workspace hard-links deduplicated uploads; containers get a copy
+        # of it (see run_code_in_container), so runs cannot change the blobs
+        await run_in_threadpool(
+            save_uploads,
+            folder_path,
+            [(file.filename, file.file) for file in files],
+        )
+    except ValueError as e:
+        shutil.rmtree(workspace, ignore_errors=True)
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        print(f"Error copying CSV to public folder: {e}")
-        raise HTTPException(status_code=500, detail=f"Failed to copy CSV: {str(e)}")
+        shutil.rmtree(workspace, ignore_errors=True)
+        print(f"Failed to upload files: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to save files: {e}")
+    await run_in_threadpool(prune_blobs)
+
+    job = job_queue.submit(
+        run_upload_job,
+        machine_configs,
+        workspace,
+        language,
+        entryPoint,
+        {
+            "parallel": parallel,
+            "isolated": isolated,
+            "sample_interval": sampleInterval,
+            "sampler": sampler,
+            "runs": runs,
+            "warmup": warmup,
+            "use_pool": pool,
+            "profile": measurement_profile,
+        },
+        cleanup=lambda job: finish_upload_job(job, workspace),
+    )
+
+    return {"job_id": job.id, "status": job.status}
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """
+    Return the status, progress and result of a job.
+    """
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+
+@app.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str):
+    """
+    Stream a job's samples and progress as server-sent events.
+    """
+    if job_queue.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return StreamingResponse(
+        event_broker.stream(job_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/jobs/{job_id}/artifacts/{name}")
+async def get_job_artifact(job_id: str, name: str):
+    """
+    Download a file produced by a job, such as its report or summary.
+    """
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    path = job.artifacts.get(name)
+    if path is None or not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Artifact not found")
+    return FileResponse(path, media_type="text/csv", filename=os.path.basename(path))
+
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """
+    Cancel a queued or running job.
+    """
+    job = job_queue.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+
+@app.get("/runs")
+async def list_runs(limit: int = 20):
+    """
+    List the most recent benchmark runs.
+    """
+    return await run_in_threadpool(default_store().runs, limit)
+
+
+@app.get("/runs/{run_id}")
+async def get_run(run_id: str, samples: bool = True, points: int = SERIES_POINT_BUDGET):
+    """
+    Return one run with its per-machine summaries and, optionally, its samples
+    downsampled to `points` per machine (0 for all).
+    """
+    store = default_store()
+    run = await run_in_threadpool(store.run, run_id)
+    if run is None:
+        raise HTTPException(status_code=404, detail="Run not found")
+    run["summaries"] = await run_in_threadpool(store.summaries, run_id)
+    if samples:
+        run["samples"] = await run_in_threadpool(store.samples, run_id, points)
+    return run
+
+
+@app.get("/metrics")
+async def metrics():
+    """
+    Expose queue depths, phase durations, sampler lag, Docker API latency and
+    live container usage in the Prometheus text format.
+    """
+    JOBS_QUEUED.set(job_queue.pending())
+    JOBS_RUNNING.set(job_queue.running())
+    WORKER_TASKS_QUEUED.set(len(dispatcher.pending))
+    WORKERS.set(len(dispatcher.live_workers()))
+    return Response(render_metrics(), media_type=CONTENT_TYPE)
+
+
+# Worker Routes
+class WorkerRegistration(BaseModel):
+    name: str
+    capacity: int = 1
+    # Machines whose runtime image the worker already has
+    images: list[str] = []
 
+
+class WorkerPoll(BaseModel):
+    free: int
+    images: Optional[list[str]] = None
+
+
+class SampleBatch(BaseModel):
+    rows: list[list]
+
+
+class ExecutionTime(BaseModel):
+    machine_name: str
+    execution_time: Optional[float] = None
+
+
+class TaskResult(BaseModel):
+    results: list[dict] = []
+    error: Optional[str] = None
+
+
+@app.post("/workers")
+async def register_worker(registration: WorkerRegistration):
+    """
+    Register a `tin worker` agent that runs machines on its own Docker host.
+    """
+    if registration.capacity < 1:
+        raise HTTPException(status_code=400, detail="Invalid capacity.")
+    worker = dispatcher.register(
+        registration.name, registration.capacity, registration.images
+    )
+    print(f"Worker '{worker.name}' registered with {worker.capacity} slots")
+    return {"worker_id": worker.id}
+
+
+@app.get("/workers")
+async def list_workers():
+    """
+    List the registered workers.
+    """
+    return [worker.to_dict() for worker in dispatcher.live_workers()]
+
+
+@app.post("/workers/{worker_id}/poll")
+async def poll_worker_tasks(worker_id: str, poll: WorkerPoll):
+    """
+    Wait for a task for a worker, and tell it which of its tasks were cancelled.
+    """
     try:
-        for saved_file in saved_files:
-            os.remove(saved_file)
-            print(f"Removed uploaded file: {saved_file}")
+        task, cancelled = await run_in_threadpool(
+            dispatcher.poll, worker_id, poll.free, poll.images
+        )
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Worker not found")
+    return {
+        "task": task.to_dict() if task is not None else None,
+        "cancelled": cancelled,
+    }
+
+
+@app.get("/workers/{worker_id}/tasks/{task_id}/files")
+async def get_task_files(worker_id: str, task_id: str):
+    """
+    Download the code of a task as a tar archive.
+    """
+    try:
+        task = dispatcher.task_for(worker_id, task_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Task not found")
+    return FileResponse(task.archive, media_type="application/x-tar")
 
-        shutil.rmtree(base_folder_path, ignore_errors=True)
-        print(f"Cleaned up folder: {base_folder_path}")
 
-        if os.path.exists(output_file):
-            os.remove(output_file)
-            print(f"Removed generated CSV file: {output_file}")
-    except Exception as e:
-        print(f"Error during cleanup: {e}")
+@app.post("/workers/{worker_id}/tasks/{task_id}/samples")
+async def add_task_samples(worker_id: str, task_id: str, batch: SampleBatch):
+    """
+    Store a batch of report rows streamed by a worker.
+    """
+    try:
+        cancelled = await run_in_threadpool(
+            dispatcher.add_rows, worker_id, task_id, batch.rows
+        )
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Task not found")
+    return {"cancelled": cancelled}
+
 
-    return {"message": "CSV saved to public folder", "path": "tin-report.csv"}
+@app.post("/workers/{worker_id}/tasks/{task_id}/execution-time")
+async def set_task_execution_time(worker_id: str, task_id: str, body: ExecutionTime):
+    """
+    Record a machine's execution time once its rows are stored.
+    """
+    try:
+        await run_in_threadpool(
+            dispatcher.set_execution_time,
+            worker_id,
+            task_id,
+            body.machine_name,
+            body.execution_time,
+        )
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Task not found")
+    return {"status": "ok"}
+
+
+@app.post("/workers/{worker_id}/tasks/{task_id}/result")
+async def complete_task(worker_id: str, task_id: str, result: TaskResult):
+    """
+    Finish a task with the per-machine results of the worker.
+    """
+    try:
+        await run_in_threadpool(
+            dispatcher.complete, worker_id, task_id, result.results, result.error
+        )
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Task not found")
+    return {"status": "ok"}
 
 
 if __name__ == "__main__":
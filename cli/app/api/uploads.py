@@ -0,0 +1,202 @@
+import errno
+import hashlib
+import os
+import posixpath
+import shutil
+import tarfile
+import tempfile
+import time
+import uuid
+import zipfile
+
+UPLOAD_DIRECTORY = "uploads"
+
+# Uploaded file contents, stored once under their SHA-256 digest
+BLOB_DIRECTORY = os.path.join(UPLOAD_DIRECTORY, "blobs")
+
+# Size of the chunks uploads are hashed and written in (in bytes)
+CHUNK_SIZE = 1024 * 1024
+
+# Uploads with these suffixes are extracted instead of saved as-is
+ARCHIVE_SUFFIXES = (".zip", ".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz")
+
+# Maximum number of bytes extracted from a single archive
+MAX_EXTRACTED_BYTES = int(os.getenv("TIN_MAX_EXTRACTED_BYTES", str(1024**3)))
+
+# Seconds after which a blob no job links to is removed
+BLOB_MAX_AGE = int(os.getenv("TIN_UPLOAD_BLOB_MAX_AGE", str(7 * 24 * 3600)))
+
+
+def safe_relative_path(name):
+    """
+    Normalizes an uploaded path and rejects anything that would land outside
+    the job's workspace.
+    """
+    path = posixpath.normpath(name.replace("\\", "/")).lstrip("/")
+    if not path or path == "." or path == ".." or path.startswith("../"):
+        raise ValueError(f"Invalid file path: {name}")
+    return path
+
+
+def is_archive(filename):
+    return filename.lower().endswith(ARCHIVE_SUFFIXES)
+
+
+def _write_blob(stream, blob_directory, limit=None):
+    """
+    Streams a file into the blob store while hashing it, and returns the blob path.
+    A blob that already exists is kept and the new copy is discarded.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    descriptor, temporary_path = tempfile.mkstemp(dir=blob_directory)
+    try:
+        with os.fdopen(descriptor, "wb") as temporary:
+            while chunk := stream.read(CHUNK_SIZE):
+                size += len(chunk)
+                if limit is not None and size > limit:
+                    raise ValueError("Archive is too large to extract")
+                digest.update(chunk)
+                temporary.write(chunk)
+        blob = os.path.join(blob_directory, digest.hexdigest())
+        if os.path.exists(blob):
+            os.remove(temporary_path)
+            os.utime(blob)
+        else:
+            os.replace(temporary_path, blob)
+        return blob, size
+    except BaseException:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+        raise
+
+
+def store_blob(fileobj, blob_directory=BLOB_DIRECTORY):
+    """
+    Stores an upload in the blob store and returns the blob path.
+
+    Seekable uploads are hashed first, so content that is already stored is
+    never written again.
+    """
+    os.makedirs(blob_directory, exist_ok=True)
+    if not fileobj.seekable():
+        return _write_blob(fileobj, blob_directory)[0]
+
+    digest = hashlib.sha256()
+    fileobj.seek(0)
+    while chunk := fileobj.read(CHUNK_SIZE):
+        digest.update(chunk)
+    blob = os.path.join(blob_directory, digest.hexdigest())
+    if os.path.exists(blob):
+        os.utime(blob)
+        return blob
+
+    fileobj.seek(0)
+    return _write_blob(fileobj, blob_directory)[0]
+
+
+def place_blob(blob, destination, link=True):
+    """
+    Puts a blob at `destination`, as a hard link when `link` is set and the
+    filesystem allows it, otherwise as a copy.
+
+    A file already at `destination` may be a link to another blob, so it is
+    replaced instead of written through. Of several uploaded files with the
+    same path, the last one wins.
+    """
+    directory = os.path.dirname(destination)
+    os.makedirs(directory, exist_ok=True)
+    temporary_path = os.path.join(directory, f".tin-{uuid.uuid4().hex}")
+    try:
+        if link:
+            try:
+                os.link(blob, temporary_path)
+            except OSError as e:
+                # Other filesystem, or one that does not allow hard links
+                if e.errno not in (errno.EXDEV, errno.EPERM):
+                    raise
+                link = False
+        if not link:
+            shutil.copyfile(blob, temporary_path)
+        os.replace(temporary_path, destination)
+    except BaseException:
+        if os.path.lexists(temporary_path):
+            os.remove(temporary_path)
+        raise
+    return destination
+
+
+def _extract_zip(folder_path, fileobj, blob_directory, link):
+    extracted = 0
+    with zipfile.ZipFile(fileobj) as archive:
+        for info in archive.infolist():
+            if info.is_dir():
+                continue
+            destination = os.path.join(folder_path, safe_relative_path(info.filename))
+            with archive.open(info) as member:
+                blob, size = _write_blob(
+                    member, blob_directory, MAX_EXTRACTED_BYTES - extracted
+                )
+            extracted += size
+            place_blob(blob, destination, link)
+
+
+def _extract_tar(folder_path, fileobj, blob_directory, link):
+    extracted = 0
+    # Stream mode reads the archive front to back without seeking
+    with tarfile.open(fileobj=fileobj, mode="r|*") as archive:
+        for member in archive:
+            # Links, devices and directories are skipped; only regular files
+            # are extracted
+            if not member.isfile():
+                continue
+            destination = os.path.join(folder_path, safe_relative_path(member.name))
+            blob, size = _write_blob(
+                archive.extractfile(member),
+                blob_directory,
+                MAX_EXTRACTED_BYTES - extracted,
+            )
+            extracted += size
+            place_blob(blob, destination, link)
+
+
+def save_uploads(folder_path, files, link=True, blob_directory=BLOB_DIRECTORY):
+    """
+    Saves uploaded (filename, fileobj) pairs into a job's folder.
+
+    A single zip or tar upload is extracted into the folder. Contents are
+    deduplicated through the blob store, and hard-linked into the folder when
+    `link` is set, so the folder must not be modified in place by the job.
+    """
+    os.makedirs(blob_directory, exist_ok=True)
+    os.makedirs(folder_path, exist_ok=True)
+
+    if len(files) == 1 and is_archive(files[0][0]):
+        filename, fileobj = files[0]
+        fileobj.seek(0)
+        if filename.lower().endswith(".zip"):
+            _extract_zip(folder_path, fileobj, blob_directory, link)
+        else:
+            _extract_tar(folder_path, fileobj, blob_directory, link)
+        return
+
+    for filename, fileobj in files:
+        destination = os.path.join(folder_path, safe_relative_path(filename))
+        place_blob(store_blob(fileobj, blob_directory), destination, link)
+
+
+def prune_blobs(max_age=BLOB_MAX_AGE, blob_directory=BLOB_DIRECTORY):
+    """
+    Removes blobs that no job folder links to and that were not uploaded again
+    within `max_age` seconds. Returns the number of removed blobs.
+    """
+    if not os.path.isdir(blob_directory):
+        return 0
+    removed = 0
+    cutoff = time.time() - max_age
+    for entry in os.scandir(blob_directory):
+        stat = entry.stat()
+        if stat.st_nlink == 1 and stat.st_mtime < cutoff:
+            os.remove(entry.path)
+            removed += 1
+    return removed
@@ -1,188 +1,226 @@
-import csv
 import os
-import shutil
-import time
-from http.client import HTTPException
+import threading
 
-import docker
 from app.constants import MACHINES
-
-UPLOAD_DIRECTORY = "uploads"
-client = docker.from_env()
-
-
-def create_machine_config(machines_list):
-    """Filters machine configurations based on the provided list"""
+from app.docker_client import get_client
+from app.execution import TimedExecProcess, build_command
+from app.machines import expand_machines
+from app.pipeline import ReportWriter
+from app.pool import ContainerPool, pool
+from app.profiles import CpusetScheduler, pinned
+from app.runner import run_concurrently
+from app.sampler import collect_stats_to_csv
+from app.series import AGGREGATES
+from app.timing import summarize_timings, summary_file_for, write_summary_csv
+
+
+def create_machine_config(machines_list, language=None):
+    """Filters machine configurations based on the provided list, with the runtime versions of listed distros"""
     filtered_machines = [
-        machine for machine in MACHINES if machine["name"] in machines_list
+        machine
+        for machine in expand_machines(MACHINES, language)
+        if machine["name"] in machines_list or machine.get("distro") in machines_list
     ]
     return filtered_machines
 
 
-def run_code_in_container(machine_configs, folder_path, language, entryPoint):
-    """Run code inside a Docker container based on the machine's image"""
+def run_code_in_container(
+    machine_configs,
+    folder_path,
+    language,
+    entryPoint,
+    parallel=1,
+    isolated=False,
+    sample_interval=None,
+    sampler="auto",
+    runs=1,
+    warmup=0,
+    output_file="tin-report.csv",
+    cancel_event=None,
+    on_progress=None,
+    on_sample=None,
+    use_pool=True,
+    store=None,
+    run_id=None,
+    profile=None,
+    client=None,
+    container_pool=None,
+):
+    """
+    Run code inside a Docker container based on the machine's image.
+    `client` and `container_pool` default to the local Docker daemon and its
+    shared pool; a worker agent passes its own.
+    """
 
     abs_folder_path = os.path.abspath(folder_path)
+    client = client or get_client()
 
-    containers = []
+    try:
+        scheduler = CpusetScheduler.for_profile(client, profile)
+    except Exception as e:
+        print(f"Error applying profile: {str(e)}")
+        return str(e)
 
-    current_dir = os.path.dirname(__file__)
-    scripts_path = os.path.abspath(os.path.join(current_dir, "..", "scripts"))
+    leases = []
+    if not use_pool:
+        lease_pool = ContainerPool(client=client, max_size=0)
+    else:
+        lease_pool = pool if container_pool is None else container_pool
 
     for machine_config in machine_configs:
         try:
-            command = None
-            if machine_config["name"].startswith("AmazonLinux2"):
-                command = "bash /scripts/amazon_install.sh"
-            elif machine_config["name"].startswith("Oracle"):
-                command = "bash /scripts/oracle_install.sh"
-            else:
-                command = "bash /scripts/linux_install.sh"
-
-            container = client.containers.run(
-                machine_config["image"],
-                name=machine_config["name"],
-                command=command,
-                volumes={
-                    abs_folder_path: {"bind": "/app", "mode": "rw"},
-                    scripts_path: {"bind": "/scripts", "mode": "rw"},
-                },
-                working_dir="/app",
-                stdin_open=True,
-                tty=True,
-                detach=True,
+            # The folder may hard-link shared upload blobs, so containers that
+            # bind-mount it get a private copy
+            leases.append(
+                lease_pool.acquire(
+                    machine_config, abs_folder_path, profile=profile, private=True
+                )
             )
-
-            containers.append(container)
         except Exception as e:
             print(f"Error running container: {str(e)}")
+            release_all(lease_pool, leases)
             return str(e)
 
-    for container in containers:
-        code_execution_time = None
-        try:
-            start_exec_time = time.time()
-            if language == "python":
-                print(f"Running Python code in {container.name}...")
-                container.exec_run(f"python3 {entryPoint}", stdout=True, stderr=True)
-            elif language == "javascript":
-                print(f"Running JavaScript code in {container.name}...")
-                container.exec_run(f"node {entryPoint}", stdout=True, stderr=True)
-            code_execution_time = time.time() - start_exec_time
-        except Exception as e:
-            print(f"Error running code in container: {str(e)}")
-            return str(e)
+    completed = []
+    progress_lock = threading.Lock()
+    writer = ReportWriter(store, run_id).start() if store is not None else None
+
+    def run_one(lease, timed_section):
+        result = run_and_collect_stats(
+            lease,
+            language,
+            entryPoint,
+            timed_section,
+            sample_interval,
+            sampler,
+            runs,
+            warmup,
+            output_file,
+            cancel_event,
+            on_sample,
+            writer,
+            scheduler,
+            client,
+        )
+        if on_progress is not None:
+            with progress_lock:
+                completed.append(lease.machine_name)
+                on_progress(len(completed), len(leases))
+        return result
 
+    try:
         try:
-            collect_stats_to_csv(
-                container, "tin-report.csv", code_execution_time=code_execution_time
+            results = run_concurrently(
+                leases,
+                run_one,
+                parallel=parallel,
+                isolated=isolated,
+                cancel_event=cancel_event,
             )
-        except Exception as e:
-            print(f"Error collecting stats: {str(e)}")
-            return str(e)
-
-    for container in containers:
+        finally:
+            if writer is not None:
+                writer.close()
+        if store is not None:
+            store.add_summaries(run_id, results)
+            store.export_csv(run_id, output_file)
+        write_summary_csv(summary_file_for(output_file), results)
+    finally:
+        release_error = release_all(lease_pool, leases)
+
+    return next(
+        (result["error"] for result in results if result["error"]), release_error
+    )
+
+
+def release_all(lease_pool, leases):
+    """
+    Releases every lease, even when some of them fail.
+    Returns the errors joined into one message, or None.
+    """
+    errors = []
+    for lease in leases:
         try:
-            container.stop()
-            container.remove()
+            lease_pool.release(lease)
         except Exception as e:
             print(f"Error stopping container: {str(e)}")
-            return str(e)
-
-
-def save_uploaded_file(folder_path: str, file):
-    """Saves an uploaded file to the specified folder"""
-    try:
-        file_location = os.path.join(folder_path, file.filename)
-        os.makedirs(os.path.dirname(file_location), exist_ok=True)
-
-        with open(file_location, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-
-        return file_location
-
-    except Exception as e:
-        print(f"Error saving file {file.filename}: {e}")
-        raise HTTPException(
-            status_code=500, detail=f"Failed to save file {file.filename}: {str(e)}"
-        )
-
-
-def collect_stats_to_csv(
-    container, output_file, runtime_limit=500, code_execution_time=None
+            errors.append(f"{lease.machine_name}: {str(e)}")
+    return "; ".join(errors) or None
+
+
+def run_and_collect_stats(
+    lease,
+    language,
+    entryPoint,
+    timed_section,
+    sample_interval,
+    sampler,
+    runs,
+    warmup,
+    output_file,
+    cancel_event=None,
+    on_sample=None,
+    writer=None,
+    scheduler=None,
+    client=None,
 ):
-    """
-    Collects stats from a single container and writes them to a CSV file.
-    Stops after the specified runtime_limit (in seconds).
-    """
-    start_time = time.time()
-    write_headers = not os.path.exists(output_file)
-
-    with open(output_file, mode="a", newline="") as file:
-        writer = csv.writer(file)
-        if write_headers:
-            writer.writerow(
-                [
-                    "timestamp",
-                    "container_name",
-                    "cpu_usage_percentage",
-                    "memory_usage_mb",
-                    "network_received_mb",
-                    "network_sent_mb",
-                    "disk_read_mb",
-                    "disk_write_mb",
-                    "runtime_seconds",
-                    "code_execution_time_seconds",
-                ]
+    """Runs the entry point in a single leased container and collects its stats"""
+    container = lease.container
+    name = lease.machine_name
+    summary = {
+        "container": name,
+        "exit_code": None,
+        "error": None,
+        "status": "Failed",
+    }
+
+    if cancel_event is not None and cancel_event.is_set():
+        return {**summary, **summarize_timings([]), "error": "Cancelled"}
+
+    with pinned(scheduler, container), timed_section():
+        try:
+            print(f"Running {language} code in {name}...")
+            process = TimedExecProcess(
+                client or get_client(),
+                container,
+                build_command(language, entryPoint),
+                runs=runs,
+                warmup=warmup,
             )
+        except Exception as e:
+            print(f"Error running code in container: {str(e)}")
+            return {**summary, **summarize_timings([]), "error": str(e)}
 
-        while True:
-            stats = container.stats(stream=False)
-            cpu_usage_ns = stats["cpu_stats"]["cpu_usage"]["total_usage"]
-            system_cpu_usage_ns = stats["cpu_stats"]["system_cpu_usage"]
-            cpu_percentage = 0
-
-            if system_cpu_usage_ns > 0:
-                cpu_percentage = (cpu_usage_ns / system_cpu_usage_ns) * 100
-
-            memory_usage_bytes = stats["memory_stats"]["usage"]
-            memory_usage_mb = memory_usage_bytes / (1024 * 1024)
-
-            network_stats = stats["networks"]
-            network_in = 0
-            network_out = 0
-            for network in network_stats.values():
-                network_in += network["rx_bytes"]
-                network_out += network["tx_bytes"]
-
-            disk_read_mb = 0
-            disk_write_mb = 0
-            if "storage_stats" in stats:
-                disk_read = stats["storage_stats"].get("read", 0)
-                disk_write = stats["storage_stats"].get("write", 0)
-                disk_read_mb = disk_read / (1024 * 1024)
-                disk_write_mb = disk_write / (1024 * 1024)
-
-            runtime_seconds = time.time() - start_time
-
-            timestamp = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime())
-            writer.writerow(
-                [
-                    timestamp,
-                    container.name,
-                    round(cpu_percentage, 2),
-                    round(memory_usage_mb, 2),
-                    round(network_in / (1024 * 1024), 2),
-                    round(network_out / (1024 * 1024), 2),
-                    round(disk_read_mb, 2),
-                    round(disk_write_mb, 2),
-                    round(runtime_seconds, 2),
-                    round(code_execution_time, 2) if code_execution_time else None,
-                ]
+        try:
+            result = collect_stats_to_csv(
+                container,
+                output_file,
+                process,
+                interval=sample_interval,
+                sampler=sampler,
+                cancel_event=cancel_event,
+                on_sample=on_sample,
+                name=name,
+                writer=writer,
+                reused=lease.reused,
             )
-            file.flush()
-
-            if runtime_seconds >= runtime_limit or container.status != "running":
-                break
-
-            time.sleep(1)
+        except Exception as e:
+            print(f"Error collecting stats: {str(e)}")
+            return {**summary, **summarize_timings([]), "error": str(e)}
+
+    error = None
+    if result["exit_code"] != 0:
+        print(f"Code in {name} exited with code {result['exit_code']}")
+        if cancel_event is not None and cancel_event.is_set():
+            error = "Cancelled"
+        else:
+            error = f"{name}: exited with code {result['exit_code']}"
+
+    return {
+        **summary,
+        "error": error,
+        **summarize_timings(process.timings),
+        "exit_code": result["exit_code"],
+        "status": "Success" if result["exit_code"] == 0 else "Failed",
+        "timings": process.timings,
+        **{name: result[name] for name in AGGREGATES},
+    }
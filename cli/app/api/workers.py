@@ -0,0 +1,346 @@
+import os
+import shutil
+import threading
+import time
+import uuid
+
+from app.constants import REPORT_HEADERS
+from app.timing import summarize_timings, summary_file_for, write_summary_csv
+
+# Seconds without a poll after which a worker is considered gone
+WORKER_TIMEOUT = int(os.getenv("TIN_WORKER_TIMEOUT", "60"))
+
+# Seconds a task waits for a worker that already has its runtime image before
+# any worker may take it
+IMAGE_AFFINITY_WAIT = float(os.getenv("TIN_WORKER_IMAGE_WAIT", "10"))
+
+# Longest time a poll waits for a task before returning empty (in seconds)
+POLL_TIMEOUT = 20
+
+PENDING = "pending"
+ASSIGNED = "assigned"
+DONE = "done"
+
+
+class Worker:
+    """A `tin worker` agent registered with the backend"""
+
+    def __init__(self, name, capacity, images):
+        self.id = uuid.uuid4().hex
+        self.name = name
+        self.capacity = capacity
+        self.free = capacity
+        # Machines whose runtime image is already built on the worker's host
+        self.images = set(images)
+        self.last_seen = time.monotonic()
+        self.tasks = set()
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "name": self.name,
+            "capacity": self.capacity,
+            "free": self.free,
+            "images": sorted(self.images),
+            "tasks": len(self.tasks),
+            "idle_seconds": round(time.monotonic() - self.last_seen, 1),
+        }
+
+
+class Task:
+    """One machine of a job, run by a worker"""
+
+    def __init__(self, job_id, machine, archive, payload, on_rows, on_execution_time):
+        self.id = uuid.uuid4().hex
+        self.job_id = job_id
+        self.machine = machine
+        self.archive = archive
+        self.payload = payload
+        self.on_rows = on_rows
+        self.on_execution_time = on_execution_time
+        self.state = PENDING
+        self.worker_id = None
+        self.cancelled = False
+        self.result = None
+        self.created_at = time.monotonic()
+        self.done = threading.Event()
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "job_id": self.job_id,
+            "machine": self.machine,
+            **self.payload,
+        }
+
+
+def failed_result(machine_name, error):
+    return {
+        "container": machine_name,
+        "exit_code": None,
+        "error": error,
+        "status": "Failed",
+        **summarize_timings([]),
+    }
+
+
+class Dispatcher:
+    """
+    Hands the machines of upload jobs to registered workers.
+
+    Workers poll for tasks. A poll prefers tasks whose runtime image the worker
+    already has; other tasks are held back for up to IMAGE_AFFINITY_WAIT
+    seconds while another live worker has the image. Workers that stop polling
+    for WORKER_TIMEOUT seconds are dropped and their tasks fail.
+    """
+
+    def __init__(
+        self, worker_timeout=WORKER_TIMEOUT, affinity_wait=IMAGE_AFFINITY_WAIT
+    ):
+        self.worker_timeout = worker_timeout
+        self.affinity_wait = affinity_wait
+        self.workers = {}
+        self.tasks = {}
+        self.pending = []
+        self.condition = threading.Condition()
+
+    def register(self, name, capacity, images):
+        worker = Worker(name, capacity, images)
+        with self.condition:
+            self.workers[worker.id] = worker
+        return worker
+
+    def live_workers(self):
+        with self.condition:
+            self._expire_workers()
+            return list(self.workers.values())
+
+    def _expire_workers(self):
+        now = time.monotonic()
+        for worker in list(self.workers.values()):
+            if now - worker.last_seen < self.worker_timeout:
+                continue
+            del self.workers[worker.id]
+            for task_id in worker.tasks:
+                self._finish(
+                    self.tasks[task_id],
+                    [
+                        failed_result(
+                            self.tasks[task_id].machine["name"],
+                            f"Worker '{worker.name}' stopped responding",
+                        )
+                    ],
+                )
+        if not self.workers:
+            for task in list(self.pending):
+                self._finish(
+                    task, [failed_result(task.machine["name"], "No workers available")]
+                )
+
+    def _finish(self, task, results):
+        if task.state == DONE:
+            return
+        if task in self.pending:
+            self.pending.remove(task)
+        worker = self.workers.get(task.worker_id)
+        if worker is not None:
+            worker.tasks.discard(task.id)
+        task.state = DONE
+        task.result = results
+        task.done.set()
+
+    def submit(self, job_id, machine, archive, payload, on_rows, on_execution_time):
+        task = Task(job_id, machine, archive, payload, on_rows, on_execution_time)
+        with self.condition:
+            self.tasks[task.id] = task
+            self.pending.append(task)
+            self.condition.notify_all()
+        return task
+
+    def _pick(self, worker):
+        for task in self.pending:
+            if task.machine["name"] in worker.images:
+                return task
+        now = time.monotonic()
+        for task in self.pending:
+            waited = now - task.created_at >= self.affinity_wait
+            cached_elsewhere = any(
+                task.machine["name"] in other.images
+                for other in self.workers.values()
+                if other is not worker
+            )
+            if waited or not cached_elsewhere:
+                return task
+        return None
+
+    def poll(self, worker_id, free, images=None, timeout=POLL_TIMEOUT):
+        """
+        Records that a worker is alive and, when it has a free slot, waits up to
+        `timeout` seconds for a task. Returns the task (or None) and the ids of
+        the worker's tasks that were cancelled. Raises KeyError for an unknown
+        worker, which then has to register again.
+        """
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            while True:
+                worker = self.workers[worker_id]
+                worker.last_seen = time.monotonic()
+                worker.free = free
+                if images is not None:
+                    worker.images = set(images)
+                cancelled = [
+                    task_id for task_id in worker.tasks if self.tasks[task_id].cancelled
+                ]
+
+                task = self._pick(worker) if free > 0 else None
+                if task is not None:
+                    self.pending.remove(task)
+                    task.state = ASSIGNED
+                    task.worker_id = worker.id
+                    worker.tasks.add(task.id)
+                    return task, cancelled
+
+                remaining = deadline - time.monotonic()
+                if free <= 0 or cancelled or remaining <= 0:
+                    return None, cancelled
+                # Wake up regularly, as held back tasks become available over time
+                self.condition.wait(min(remaining, 1))
+
+    def task_for(self, worker_id, task_id):
+        """
+        Returns a task assigned to a worker. Raises KeyError otherwise.
+        """
+        task = self.tasks[task_id]
+        if task.worker_id != worker_id or task.state != ASSIGNED:
+            raise KeyError(task_id)
+        return task
+
+    def add_rows(self, worker_id, task_id, rows):
+        """
+        Passes report rows streamed by a worker on to the job.
+        Returns whether the task was cancelled meanwhile.
+        """
+        task = self.task_for(worker_id, task_id)
+        task.on_rows(rows)
+        return task.cancelled
+
+    def set_execution_time(self, worker_id, task_id, machine_name, execution_time):
+        task = self.task_for(worker_id, task_id)
+        task.on_execution_time(machine_name, execution_time)
+
+    def complete(self, worker_id, task_id, results, error=None):
+        with self.condition:
+            task = self.task_for(worker_id, task_id)
+            if not results:
+                results = [failed_result(task.machine["name"], error or "No results")]
+            self._finish(task, results)
+            self.condition.notify_all()
+
+    def cancel(self, tasks):
+        """
+        Drops tasks that were not picked up yet, and flags the others so their
+        workers stop them on their next poll.
+        """
+        with self.condition:
+            for task in tasks:
+                task.cancelled = True
+                if task.state == PENDING:
+                    self._finish(
+                        task, [failed_result(task.machine["name"], "Cancelled")]
+                    )
+            self.condition.notify_all()
+
+    def wait(self, tasks, cancel_event=None, on_done=None):
+        """
+        Waits until every task is finished, cancelling them when `cancel_event`
+        is set. Calls on_done(task) as each one finishes.
+        """
+        remaining = list(tasks)
+        while remaining:
+            if cancel_event is not None and cancel_event.is_set():
+                self.cancel(remaining)
+            with self.condition:
+                self._expire_workers()
+            for task in [task for task in remaining if task.done.is_set()]:
+                remaining.remove(task)
+                if on_done is not None:
+                    on_done(task)
+            if remaining:
+                time.sleep(0.2)
+
+    def forget(self, tasks):
+        with self.condition:
+            for task in tasks:
+                self.tasks.pop(task.id, None)
+
+
+def run_code_on_workers(
+    dispatcher,
+    job_id,
+    machine_configs,
+    folder_path,
+    language,
+    entryPoint,
+    store,
+    run_id,
+    output_file="tin-report.csv",
+    cancel_event=None,
+    on_progress=None,
+    on_sample=None,
+    parallel=1,
+    isolated=False,
+    **options,
+):
+    """
+    Runs every machine of a job on a registered worker instead of the local
+    Docker daemon. Workers stream their samples into the store as they run.
+    `parallel` and `isolated` only apply to a single host, so each worker runs
+    its machines with its own capacity.
+    """
+    archive = shutil.make_archive(
+        os.path.join(os.path.dirname(os.path.abspath(folder_path)), "files"),
+        "tar",
+        folder_path,
+    )
+
+    def add_rows(rows):
+        store.add_samples(run_id, rows)
+        if on_sample is not None:
+            for row in rows:
+                sample = dict(zip(REPORT_HEADERS, row))
+                on_sample(sample["container_name"], sample)
+
+    def set_execution_time(machine_name, execution_time):
+        store.set_execution_time(run_id, machine_name, execution_time)
+
+    tasks = [
+        dispatcher.submit(
+            job_id,
+            machine_config,
+            archive,
+            {"language": language, "entry_point": entryPoint, "options": options},
+            add_rows,
+            set_execution_time,
+        )
+        for machine_config in machine_configs
+    ]
+
+    completed = []
+
+    def task_done(task):
+        completed.append(task)
+        if on_progress is not None:
+            on_progress(len(completed), len(tasks))
+
+    try:
+        dispatcher.wait(tasks, cancel_event, task_done)
+    finally:
+        dispatcher.forget(tasks)
+        os.remove(archive)
+
+    results = [result for task in tasks for result in task.result]
+    store.add_summaries(run_id, results)
+    store.export_csv(run_id, output_file)
+    write_summary_csv(summary_file_for(output_file), results)
+
+    return next((result["error"] for result in results if result.get("error")), None)
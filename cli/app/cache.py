@@ -0,0 +1,73 @@
+import hashlib
+import json
+import os
+
+from app.constants import (
+    DIFF_FILE_NAME,
+    OUTPUT_FILE_NAME,
+    PROFILES_DIRECTORY_NAME,
+    SUMMARY_FILE_NAME,
+)
+from app.profiles import profile_key
+
+# Most cached machine results kept; the least recently used are evicted first
+CACHE_SIZE = int(os.getenv("TIN_CACHE_SIZE", "1000"))
+
+# Files and directories that do not change what the code does: tin's own
+# outputs (written next to the code when it runs from the code directory),
+# version control and bytecode caches
+IGNORED_NAMES = {
+    OUTPUT_FILE_NAME,
+    SUMMARY_FILE_NAME,
+    DIFF_FILE_NAME,
+    PROFILES_DIRECTORY_NAME,
+    ".git",
+    ".hg",
+    ".svn",
+    "__pycache__",
+}
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def hash_directory(directory):
+    """
+    Hashes the relative paths and contents of every file in a directory, in a
+    stable order, skipping IGNORED_NAMES.
+    """
+    digest = hashlib.sha256()
+    for root, directories, files in os.walk(directory):
+        directories[:] = sorted(
+            name for name in directories if name not in IGNORED_NAMES
+        )
+        for name in sorted(files):
+            if name in IGNORED_NAMES:
+                continue
+            path = os.path.join(root, name)
+            digest.update(os.path.relpath(path, directory).encode())
+            digest.update(b"\0")
+            with open(path, "rb") as file:
+                while chunk := file.read(CHUNK_SIZE):
+                    digest.update(chunk)
+            digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def cache_key(code_hash, entry_point, language, image_id, profile, **settings):
+    """
+    Identifies the results of one machine: the code, how it is run, the exact
+    runtime image and the measurement profile's limits. `settings` are the
+    other options that change the results, such as the number of runs.
+    """
+    encoded = json.dumps(
+        {
+            "code": code_hash,
+            "entry_point": entry_point,
+            "language": language,
+            "image": image_id,
+            "profile": profile_key(profile),
+            **settings,
+        },
+        sort_keys=True,
+    ).encode()
+    return hashlib.sha256(encoded).hexdigest()
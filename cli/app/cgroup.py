@@ -0,0 +1,154 @@
+import time
+from pathlib import Path
+
+from app.metrics import cgroup_metrics
+
+# Mount point of the unified (v2) cgroup hierarchy on the host
+CGROUP_ROOT = Path("/sys/fs/cgroup")
+
+# Host procfs, used for the container's network counters
+PROC_ROOT = Path("/proc")
+
+# Where Docker places container cgroups, for the systemd and cgroupfs drivers
+CGROUP_LAYOUTS = [
+    "system.slice/docker-{id}.scope",
+    "docker/{id}",
+    "docker.slice/docker-{id}.scope",
+]
+
+
+def find_container_cgroup(container_id, root=CGROUP_ROOT):
+    """
+    Returns the cgroup v2 directory of a container, or None when it cannot be read.
+    """
+    root = Path(root)
+    if not (root / "cgroup.controllers").exists():
+        return None
+    for layout in CGROUP_LAYOUTS:
+        path = root / layout.format(id=container_id)
+        if (path / "cpu.stat").exists():
+            return path
+    return None
+
+
+def _read_keyed(path):
+    """
+    Parses a flat keyed file such as cpu.stat into a dict of ints.
+    """
+    values = {}
+    for line in path.read_text().splitlines():
+        key, _, value = line.partition(" ")
+        if value.strip().isdigit():
+            values[key] = int(value)
+    return values
+
+
+def _read_int(path, default=0):
+    try:
+        return int(path.read_text().strip())
+    except (OSError, ValueError):
+        return default
+
+
+def read_cgroup_counters(path):
+    """
+    Reads the cumulative CPU, memory and I/O counters of a cgroup.
+    """
+    path = Path(path)
+    cpu = _read_keyed(path / "cpu.stat")
+
+    io_totals = {"rbytes": 0, "wbytes": 0, "rios": 0, "wios": 0}
+    try:
+        io_lines = (path / "io.stat").read_text().splitlines()
+    except OSError:
+        io_lines = []
+    for line in io_lines:
+        for field in line.split()[1:]:
+            key, _, value = field.partition("=")
+            if key in io_totals:
+                io_totals[key] += int(value)
+
+    return {
+        "cpu_usage_usec": cpu.get("usage_usec", 0),
+        "nr_periods": cpu.get("nr_periods", 0),
+        "nr_throttled": cpu.get("nr_throttled", 0),
+        "throttled_usec": cpu.get("throttled_usec", 0),
+        "memory_current": _read_int(path / "memory.current"),
+        "memory_peak": _read_int(path / "memory.peak"),
+        "io_read_bytes": io_totals["rbytes"],
+        "io_write_bytes": io_totals["wbytes"],
+        "io_read_ops": io_totals["rios"],
+        "io_write_ops": io_totals["wios"],
+    }
+
+
+def read_network_counters(pid, proc_root=PROC_ROOT):
+    """
+    Sums received and sent bytes over the non-loopback interfaces seen by a process.
+    """
+    try:
+        lines = (Path(proc_root) / str(pid) / "net" / "dev").read_text().splitlines()
+    except OSError:
+        return 0, 0
+
+    received = sent = 0
+    for line in lines[2:]:
+        interface, _, fields = line.partition(":")
+        if interface.strip() == "lo":
+            continue
+        fields = fields.split()
+        if len(fields) >= 9:
+            received += int(fields[0])
+            sent += int(fields[8])
+    return received, sent
+
+
+class CgroupReader:
+    """
+    Samples a container straight from its cgroup files.
+
+    Reading a handful of small files costs microseconds, so this can run at
+    10-100 Hz where the Docker stats API manages about one frame per second.
+    """
+
+    def __init__(self, path, pid=None, proc_root=PROC_ROOT):
+        self.path = Path(path)
+        self.pid = pid
+        self.proc_root = proc_root
+        self.previous = None
+
+    def read(self):
+        """
+        Returns the raw counters of the container at this instant.
+        """
+        counters = read_cgroup_counters(self.path)
+        counters["time"] = time.monotonic()
+        counters["network_rx_bytes"], counters["network_tx_bytes"] = (
+            read_network_counters(self.pid, self.proc_root) if self.pid else (0, 0)
+        )
+        return counters
+
+    def sample(self):
+        """
+        Returns report metrics, with CPU usage computed since the previous call.
+        """
+        counters = self.read()
+        metrics = cgroup_metrics(self.previous, counters)
+        self.previous = counters
+        return metrics
+
+
+def cgroup_reader_for(container, root=CGROUP_ROOT, proc_root=PROC_ROOT):
+    """
+    Returns a CgroupReader for a container, or None when cgroup v2 files are not
+    accessible from this process.
+    """
+    path = find_container_cgroup(container.id, root)
+    if path is None:
+        return None
+    try:
+        container.reload()
+        pid = container.attrs.get("State", {}).get("Pid")
+    except Exception:
+        pid = None
+    return CgroupReader(path, pid=pid, proc_root=proc_root)
@@ -12,6 +12,63 @@ DOCKER_COMPOSE_FILE = "tin-docker-compose.yml"
 # Name of the output file for the stats
 OUTPUT_FILE_NAME = "tin-report.csv"
 
+# Name of the output file for the per-machine timing summary
+SUMMARY_FILE_NAME = "tin-summary.csv"
+
+# Columns written to the report, in order
+REPORT_HEADERS = [
+    "timestamp",
+    "container_name",
+    "cpu_usage_percentage",
+    "memory_usage_mb",
+    "network_received_mb",
+    "network_sent_mb",
+    "disk_read_mb",
+    "disk_write_mb",
+    "runtime_seconds",
+    "code_execution_time_seconds",
+    "disk_read_iops",
+    "disk_write_iops",
+    "cpu_throttled_periods",
+]
+
+# Name of the JSON comparison with a baseline run
+DIFF_FILE_NAME = "tin-diff.json"
+
+# Slowdown of the median (as a fraction) beyond which a significantly slower
+# machine counts as a regression
+REGRESSION_THRESHOLD = 0.05
+
+# Directory where the raw CPU profiles of profiled runs are copied, per run
+PROFILES_DIRECTORY_NAME = "tin-profiles"
+
+# Repository used for the pre-baked runtime images
+RUNTIME_IMAGE_REPOSITORY = "tin-runtime"
+
+# Labels attached to the pre-baked runtime images
+RUNTIME_IMAGE_LABEL = "tin.runtime"
+RUNTIME_IMAGE_MACHINE_LABEL = "tin.machine"
+RUNTIME_IMAGE_KEY_LABEL = "tin.key"
+
+# Command that keeps a runtime container alive between exec calls. It runs as
+# PID 1 and exits on SIGTERM, and it outlives `kill -9 -1` from a released lease
+# by starting a new sleep whenever its current one is killed.
+CONTAINER_IDLE_COMMAND = [
+    "sh",
+    "-c",
+    "trap 'exit 0' TERM; while :; do sleep 3600 & wait $!; done",
+]
+
+# Built-in measurement profiles: resource limits applied to every container
+# of a run. `cpus` also pins each running machine to CPUs of its own.
+PROFILES = {
+    "default": {},
+    "pinned": {"cpus": 1, "mem_limit": "1g", "pids_limit": 512},
+}
+
+# Profile used when none is given on the command line or in the config file
+DEFAULT_PROFILE = "default"
+
 # Default machines to be used
 MACHINES = [
     {
@@ -0,0 +1,28 @@
+import os
+import threading
+
+from app.telemetry import instrument_docker
+
+# Maximum number of HTTP connections kept open to the Docker daemon. Each
+# machine sampled in parallel holds one for its stats stream.
+DOCKER_MAX_POOL_SIZE = int(os.getenv("TIN_DOCKER_MAX_POOL_SIZE", "32"))
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """
+    Returns the Docker client shared by the CLI and the API, connecting on
+    first use so commands that never talk to Docker do not need the daemon.
+    Every request it makes is timed for /metrics.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            import docker
+
+            _client = instrument_docker(
+                docker.from_env(max_pool_size=DOCKER_MAX_POOL_SIZE)
+            )
+        return _client
@@ -0,0 +1,171 @@
+import json
+import shlex
+import statistics
+import threading
+import time
+
+from app.telemetry import PHASE_DURATION
+
+# How often the exec process is polled for completion (in seconds)
+EXEC_POLL_INTERVAL = 0.02
+
+# Where the timing harness leaves its results inside the container
+TIMINGS_FILE = "/tmp/tin-timings.json"
+
+# Replaced in the command's arguments by the label of each run, `run-<n>` for
+# measured runs and `warmup-<n>` for warmup runs, so runs can write files of
+# their own
+RUN_PLACEHOLDER = "{run}"
+
+# Runs a command repeatedly inside the container and times each run with a
+# monotonic clock, so the docker exec round trip is not part of the timings.
+# Python 3 is present in every runtime image, whatever the benchmarked language.
+TIMING_HARNESS = """
+import json, subprocess, sys, time
+runs, warmup, output, command = int(sys.argv[1]), int(sys.argv[2]), sys.argv[3], sys.argv[4:]
+timings, exit_code = [], 0
+for index in range(warmup + runs):
+    label = "warmup-%d" % index if index < warmup else "run-%d" % (index - warmup)
+    arguments = [argument.replace("{run}", label) for argument in command]
+    start = time.perf_counter()
+    exit_code = subprocess.call(arguments)
+    elapsed = time.perf_counter() - start
+    if exit_code != 0:
+        break
+    if index >= warmup:
+        timings.append(elapsed)
+with open(output, "w") as f:
+    json.dump({"timings": timings, "exit_code": exit_code}, f)
+sys.exit(exit_code)
+"""
+
+
+def build_command(language, file):
+    """
+    Builds the command that runs the entry point for a language. The entry point
+    is quoted, so it stays one argument when the command is split.
+    """
+    if language == "python":
+        return f"python3 {shlex.quote(file)}"
+    if language == "javascript":
+        return f"node {shlex.quote(file)}"
+    raise ValueError(f"Unsupported language: {language}")
+
+
+class ExecProcess:
+    """
+    A command started detached inside a container.
+
+    A background thread polls `exec_inspect` so the end of the process is
+    detected within EXEC_POLL_INTERVAL, independently of how long a stats
+    sample takes.
+    """
+
+    def __init__(self, client, container, command, workdir="/app"):
+        self.client = client
+        self.container = container
+        self.command = command
+        self.exit_code = None
+        self.started_at = None
+        self.finished_at = None
+        self.finished = threading.Event()
+
+        self.exec_id = client.api.exec_create(
+            container.id, command, workdir=workdir, stdout=True, stderr=True
+        )["Id"]
+
+    def start(self):
+        """
+        Starts the command and begins watching for its completion.
+        """
+        self.started_at = time.monotonic()
+        self.client.api.exec_start(self.exec_id, detach=True)
+        threading.Thread(target=self._watch, daemon=True).start()
+        return self
+
+    def _watch(self):
+        try:
+            while True:
+                state = self.client.api.exec_inspect(self.exec_id)
+                if not state.get("Running"):
+                    self.finished_at = time.monotonic()
+                    self.exit_code = state.get("ExitCode")
+                    PHASE_DURATION.labels(phase="exec").observe(
+                        self.finished_at - self.started_at
+                    )
+                    self._on_finish()
+                    break
+                time.sleep(EXEC_POLL_INTERVAL)
+        finally:
+            self.finished.set()
+
+    def _on_finish(self):
+        """
+        Hook run by the watcher thread once the command has exited.
+        """
+
+    @property
+    def running(self):
+        return not self.finished.is_set()
+
+    @property
+    def duration(self):
+        """
+        Wall-clock duration of the command in seconds, or None while running.
+        """
+        if self.finished_at is None:
+            return None
+        return self.finished_at - self.started_at
+
+    def wait(self, timeout=None):
+        """
+        Blocks until the command finishes or the timeout expires.
+        """
+        return self.finished.wait(timeout)
+
+
+def timed_command(command, runs=1, warmup=0):
+    """
+    Wraps a command in the in-container timing harness.
+    """
+    return [
+        "python3",
+        "-c",
+        TIMING_HARNESS,
+        str(runs),
+        str(warmup),
+        TIMINGS_FILE,
+        *shlex.split(command),
+    ]
+
+
+class TimedExecProcess(ExecProcess):
+    """
+    Runs a command `warmup + runs` times in one exec and collects the timings
+    measured inside the container.
+    """
+
+    def __init__(self, client, container, command, runs=1, warmup=0, workdir="/app"):
+        super().__init__(
+            client, container, timed_command(command, runs, warmup), workdir=workdir
+        )
+        self.runs = runs
+        self.warmup = warmup
+        self.timings = []
+
+    def _on_finish(self):
+        try:
+            output = self.container.exec_run(["cat", TIMINGS_FILE]).output
+            self.timings = json.loads(output)["timings"]
+        except Exception:
+            self.timings = []
+
+    @property
+    def duration(self):
+        """
+        Median in-container run time, or the wall-clock duration of the exec when
+        the harness did not report any timings.
+        """
+        if self.timings:
+            return statistics.median(self.timings)
+        return super().duration
@@ -0,0 +1,239 @@
+import hashlib
+import io
+import shlex
+import tarfile
+from pathlib import Path
+
+from app.constants import (
+    RUNTIME_IMAGE_KEY_LABEL,
+    RUNTIME_IMAGE_LABEL,
+    RUNTIME_IMAGE_MACHINE_LABEL,
+    RUNTIME_IMAGE_REPOSITORY,
+)
+from app.machines import distro_machine
+from app.telemetry import timed_phase
+from rich.console import Console
+
+console = Console()
+
+SCRIPTS_DIRECTORY = Path(__file__).parent / "scripts"
+
+# Script that adds a runtime version on top of a distro's runtime image
+RUNTIME_VERSION_SCRIPT = "runtime_install.sh"
+
+# Build variables passed to RUNTIME_VERSION_SCRIPT per runtime
+RUNTIME_VERSION_VARIABLES = {"python": "PYTHON_VERSION", "node": "NODE_VERSION"}
+
+
+def install_script_for(machine):
+    """
+    Returns the name of the install script used to provision a machine.
+    """
+    if machine["name"].startswith("AmazonLinux2"):
+        return "amazon_install.sh"
+    if machine["name"].startswith("Oracle"):
+        return "oracle_install.sh"
+    return "linux_install.sh"
+
+
+def resolve_base_image(client, image, pull=False):
+    """
+    Returns the local base image, pulling it when missing or when asked to.
+    """
+    if not pull:
+        try:
+            return client.images.get(image)
+        except Exception:
+            pass
+    with timed_phase("pull"):
+        return client.images.pull(image)
+
+
+def runtime_image_key(base_image_id, script_contents):
+    """
+    Hashes the base image digest together with the install script contents.
+    """
+    digest = hashlib.sha256()
+    digest.update(base_image_id.encode())
+    digest.update(b"\0")
+    digest.update(script_contents)
+    return digest.hexdigest()[:16]
+
+
+def runtime_image_tag(machine, key):
+    """
+    Builds the tag of the pre-baked runtime image for a machine.
+    """
+    return f"{RUNTIME_IMAGE_REPOSITORY}:{machine['name'].lower()}-{key}"
+
+
+def runtime_variables(machine):
+    """
+    Returns the build variables that select a machine's runtime versions.
+    """
+    return {
+        RUNTIME_VERSION_VARIABLES[runtime]: version
+        for runtime, version in sorted(machine.get("runtime", {}).items())
+    }
+
+
+def _build_context(base_image_id, script_name, script_contents, variables=None):
+    """
+    Packs a Dockerfile and the install script into an in-memory tar archive.
+    `variables` are set for the install script only.
+    """
+    assignments = "".join(
+        f"{name}={shlex.quote(value)} " for name, value in (variables or {}).items()
+    )
+    dockerfile = (
+        f"FROM {base_image_id}\n"
+        f"COPY {script_name} /tmp/{script_name}\n"
+        f"RUN {assignments}bash /tmp/{script_name} && rm /tmp/{script_name}\n"
+        "WORKDIR /app\n"
+    ).encode()
+
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w") as tar:
+        for name, data in (("Dockerfile", dockerfile), (script_name, script_contents)):
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    buffer.seek(0)
+    return buffer
+
+
+def _runtime_image_source(client, machine, pull=False):
+    """
+    Returns the image a machine's runtime image is built from, its install
+    script and the script's variables. A machine with runtime versions is built
+    on top of its distro's runtime image, so every version shares the layers of
+    the distro's install and only adds its own interpreter.
+    """
+    if "runtime" in machine:
+        base_image_id = ensure_runtime_image(client, distro_machine(machine), pull)
+        return base_image_id, RUNTIME_VERSION_SCRIPT, runtime_variables(machine)
+    base_image = resolve_base_image(client, machine["image"], pull=pull)
+    return base_image.id, install_script_for(machine), {}
+
+
+def _variant_key(base_image_id, variables):
+    """
+    Identifies a base image together with the runtime versions built on it.
+    """
+    return base_image_id + "".join(
+        f"\0{name}={value}" for name, value in variables.items()
+    )
+
+
+def ensure_runtime_image(client, machine, pull=False):
+    """
+    Returns the tag of the runtime image for a machine, building it on a cache miss.
+    """
+    base_image_id, script_name, variables = _runtime_image_source(client, machine, pull)
+    script_contents = (SCRIPTS_DIRECTORY / script_name).read_bytes()
+    key = runtime_image_key(_variant_key(base_image_id, variables), script_contents)
+    tag = runtime_image_tag(machine, key)
+
+    try:
+        client.images.get(tag)
+        return tag
+    except Exception:
+        pass
+
+    console.print(f"🔨 [blue]Building runtime image '{tag}'...[/blue]")
+    with timed_phase("install"):
+        client.images.build(
+            fileobj=_build_context(
+                base_image_id, script_name, script_contents, variables
+            ),
+            custom_context=True,
+            tag=tag,
+            rm=True,
+            labels={
+                RUNTIME_IMAGE_LABEL: "true",
+                RUNTIME_IMAGE_MACHINE_LABEL: machine["name"],
+                RUNTIME_IMAGE_KEY_LABEL: key,
+            },
+        )
+    return tag
+
+
+def prepare_runtime_images(client, machines, pull=False):
+    """
+    Warms the runtime image cache for the given machines.
+    Returns a mapping of machine name to runtime image tag.
+    """
+    tags = {}
+    for machine in machines:
+        try:
+            tags[machine["name"]] = ensure_runtime_image(client, machine, pull=pull)
+            console.print(
+                f"✅ [green]Runtime image ready for '{machine['name']}'.[/green]"
+            )
+        except Exception as e:
+            console.print(
+                f"❌ [bold red]Error preparing image for '{machine['name']}': {e}[/bold red]"
+            )
+    return tags
+
+
+def _current_key(client, machine):
+    """
+    Returns the key a machine's runtime image has with the local base image and
+    the current scripts, or None when the base image is not available.
+    """
+    script_name = install_script_for(machine)
+    variables = {}
+    if "runtime" in machine:
+        distro_key = _current_key(client, distro_machine(machine))
+        if distro_key is None:
+            return None
+        base_image_id = runtime_image_tag(distro_machine(machine), distro_key)
+        script_name = RUNTIME_VERSION_SCRIPT
+        variables = runtime_variables(machine)
+    else:
+        try:
+            base_image_id = client.images.get(machine["image"]).id
+        except Exception:
+            return None
+    script_contents = (SCRIPTS_DIRECTORY / script_name).read_bytes()
+    return runtime_image_key(_variant_key(base_image_id, variables), script_contents)
+
+
+def prune_runtime_images(client, machines):
+    """
+    Removes runtime images that no longer match a machine's base image or script.
+    Returns the list of removed tags.
+    """
+    current_keys = set()
+    for machine in machines:
+        # Runtime versions are built on their distro's image, which stays too
+        for entry in (machine, distro_machine(machine)):
+            key = _current_key(client, entry)
+            if key is not None:
+                current_keys.add(key)
+
+    removed = []
+    for image in client.images.list(filters={"label": RUNTIME_IMAGE_LABEL}):
+        if image.labels.get(RUNTIME_IMAGE_KEY_LABEL) in current_keys:
+            continue
+        for tag in image.tags or [image.id]:
+            try:
+                client.images.remove(tag)
+                removed.append(tag)
+            except Exception as e:
+                console.print(f"❌ [bold red]Error removing '{tag}': {e}[/bold red]")
+    return removed
+
+
+def cached_runtime_machines(client):
+    """
+    Returns the names of the machines that have a runtime image built locally.
+    """
+    return sorted(
+        {
+            image.labels.get(RUNTIME_IMAGE_MACHINE_LABEL)
+            for image in client.images.list(filters={"label": RUNTIME_IMAGE_LABEL})
+            if image.labels.get(RUNTIME_IMAGE_MACHINE_LABEL)
+        }
+    )
@@ -0,0 +1,80 @@
+import re
+
+# Runtime axis of each language, and the key that lists its versions
+RUNTIMES = {"python": "python", "javascript": "node"}
+
+# Versions end up in image tags and in the build's shell command
+VERSION_PATTERN = re.compile(r"^[0-9][0-9A-Za-z.\-]*$")
+
+# Version that keeps the interpreter installed by the distro's install script
+DEFAULT_VERSION = "default"
+
+
+def machine_runtimes(language=None):
+    """
+    Returns the runtime axes relevant to a language, or all of them.
+    """
+    if language is None:
+        return list(RUNTIMES.values())
+    return [RUNTIMES[language]] if language in RUNTIMES else []
+
+
+def expand_machines(machines, language=None):
+    """
+    Expands machine entries into one machine per runtime version. An entry may
+    list versions per runtime next to its image:
+
+        {"name": "Ubuntu24.04", "image": "ubuntu:24.04", "python": ["default", "3.12"]}
+
+    Each version becomes a machine named after the distro and the version
+    ("Ubuntu24.04-python3.12"), and "default" keeps the distro's own
+    interpreter under the plain name.
+
+    Only the axis of `language` is expanded, since the other runtime does not
+    change the results; without a language, the versions of every axis are
+    listed (one after the other, not multiplied). Expanded machines keep the
+    entry's other keys, and record the `distro` they come from and their
+    `runtime`, e.g. {"python": "3.12"}. Raises ValueError for a version that
+    is neither "default" nor made of digits, letters, dots and dashes.
+    """
+    expanded = []
+    for machine in machines:
+        entry = {
+            key: value for key, value in machine.items() if key not in RUNTIMES.values()
+        }
+        variants = [
+            (runtime, str(version))
+            for runtime in machine_runtimes(language)
+            for version in machine.get(runtime) or []
+        ]
+        if not variants or any(version == DEFAULT_VERSION for _, version in variants):
+            expanded.append(entry)
+        for runtime, version in variants:
+            if version == DEFAULT_VERSION:
+                continue
+            if not VERSION_PATTERN.fullmatch(version):
+                raise ValueError(
+                    f"Invalid {runtime} version for '{machine['name']}': {version!r}"
+                )
+            expanded.append(
+                {
+                    **entry,
+                    "name": f"{machine['name']}-{runtime}{version}",
+                    "distro": machine["name"],
+                    "runtime": {runtime: version},
+                }
+            )
+    return expanded
+
+
+def distro_machine(machine):
+    """
+    Returns the machine an expanded machine was made from, without its runtime.
+    """
+    if "runtime" not in machine:
+        return machine
+    entry = {
+        key: value for key, value in machine.items() if key not in ("distro", "runtime")
+    }
+    entry["name"] = machine["distro"]
+    return entry
@@ -1,17 +1,22 @@
+import time
 from pathlib import Path
 from typing import Optional
 
 import toml
 import typer
-from app.constants import CONFIG_FILE_PATH, MACHINES, OUTPUT_FILE_NAME
-from app.utils import (
-    read_config,
-    run_docker_containers_and_collect_stats,
-    run_ui,
+from app.constants import (
+    CONFIG_FILE_PATH,
+    DEFAULT_PROFILE,
+    MACHINES,
+    OUTPUT_FILE_NAME,
+    PROFILES,
+    REGRESSION_THRESHOLD,
 )
 from rich.console import Console
 from typing_extensions import Annotated
 
+# Command modules are imported inside each command, so `tin --help` and the
+# config commands start without loading Docker, SQLite or the report code
 console = Console()
 app = typer.Typer(
     help="A powerful tool to test your code across multiple machines and gather comprehensive runtime statistics effortlessly ✨"
@@ -32,10 +37,103 @@ def benchmark(
         Optional[str],
         typer.Option("--language", "-l", help="Code language (python, javascript)"),
     ],
+    parallel: Annotated[
+        int,
+        typer.Option(
+            "--parallel", "-p", min=1, help="Number of machines to run at the same time"
+        ),
+    ] = 1,
+    isolated: Annotated[
+        bool,
+        typer.Option(
+            "--isolated",
+            help="Only measure one machine at a time when running in parallel",
+        ),
+    ] = False,
+    sample_interval: Annotated[
+        Optional[float],
+        typer.Option(
+            "--sample-interval",
+            min=0,
+            help="Seconds between two stats samples (defaults depend on the sampler)",
+        ),
+    ] = None,
+    sampler: Annotated[
+        str,
+        typer.Option(
+            "--sampler",
+            help="Stats backend: auto, docker or cgroup (cgroup falls back to docker)",
+        ),
+    ] = "auto",
+    runs: Annotated[
+        int,
+        typer.Option("--runs", "-n", min=1, help="Number of timed runs per machine"),
+    ] = 1,
+    warmup: Annotated[
+        int,
+        typer.Option(
+            "--warmup", "-w", min=0, help="Number of untimed warmup runs per machine"
+        ),
+    ] = 0,
+    use_pool: Annotated[
+        bool,
+        typer.Option(
+            "--pool/--no-pool",
+            help="Reuse warm containers between runs instead of creating fresh ones",
+        ),
+    ] = True,
+    profile: Annotated[
+        Optional[str],
+        typer.Option(
+            "--profile",
+            help="Measurement profile with the resource limits of the containers "
+            "(defaults to `profile` in the config file)",
+        ),
+    ] = None,
+    cpu_profile: Annotated[
+        bool,
+        typer.Option(
+            "--cpu-profile",
+            help="Run the code under cProfile or `node --cpu-prof` and compare "
+            "the hot functions of the machines",
+        ),
+    ] = False,
+    baseline: Annotated[
+        Optional[str],
+        typer.Option(
+            "--baseline",
+            help="Run id or `tin export --format json` file to compare the timings "
+            "with; exits with code 1 when a machine regressed",
+        ),
+    ] = None,
+    threshold: Annotated[
+        Optional[float],
+        typer.Option(
+            "--threshold",
+            min=0,
+            help="Slowdown of the median (0.05 = 5%) beyond which a significantly "
+            "slower machine fails (defaults to `regression_threshold` in the config "
+            "file)",
+        ),
+    ] = None,
+    force: Annotated[
+        bool,
+        typer.Option(
+            "--force",
+            help="Run every machine again instead of reusing cached results of "
+            "unchanged code",
+        ),
+    ] = False,
 ):
     """
     Test code in Docker containers on configured machines.
     """
+    from app.machines import expand_machines
+    from app.profiles import resolve_profile
+    from app.regression import MISSING, REGRESSED, load_baseline
+    from app.sampler import SAMPLERS
+    from app.utils import read_config, run_docker_containers_and_collect_stats
+
     if not CONFIG_FILE_PATH.exists():
         console.print("[bold red]No config file found.[/bold red]")
         console.print(
@@ -46,28 +144,356 @@ def benchmark(
     config = read_config(CONFIG_FILE_PATH)
     directory = Path(directory).expanduser()
 
-    enabled_machines = [
-        m for m in config.get("machines", []) if m.get("enabled", False)
-    ]
+    try:
+        enabled_machines = expand_machines(
+            [m for m in config.get("machines", []) if m.get("enabled", False)],
+            language,
+        )
+    except ValueError as e:
+        console.print(f"[bold red]{e}[/bold red]")
+        return
 
     if not enabled_machines:
         console.print("[bold red]No enabled machines in config.[/bold red]")
         return
 
+    if sampler not in SAMPLERS:
+        console.print(f"[bold red]Unknown sampler: {sampler}[/bold red]")
+        return
+
+    try:
+        measurement_profile = resolve_profile(
+            profile or config.get("profile", DEFAULT_PROFILE),
+            config.get("profiles"),
+        )
+    except ValueError as e:
+        console.print(f"[bold red]{e}[/bold red]")
+        return
+    console.print(
+        f"🎛️ [bold blue]Using profile '{measurement_profile['name']}'.[/bold blue]"
+    )
+
+    baseline_timings = None
+    if baseline is not None:
+        from app.store import default_store
+
+        try:
+            baseline_timings = {
+                "name": baseline,
+                "timings": load_baseline(baseline, default_store()),
+            }
+        except (ValueError, KeyError, OSError) as e:
+            console.print(f"[bold red]Invalid baseline: {e}[/bold red]")
+            raise typer.Exit(1)
+    if threshold is None:
+        threshold = config.get("regression_threshold", REGRESSION_THRESHOLD)
+
     try:
-        run_docker_containers_and_collect_stats(
-            enabled_machines, language, directory, file, OUTPUT_FILE_NAME
+        stats = run_docker_containers_and_collect_stats(
+            enabled_machines,
+            language,
+            directory,
+            file,
+            OUTPUT_FILE_NAME,
+            parallel=parallel,
+            isolated=isolated,
+            sample_interval=sample_interval,
+            sampler=sampler,
+            runs=runs,
+            warmup=warmup,
+            use_pool=use_pool,
+            profile=measurement_profile,
+            cpu_profile=cpu_profile,
+            baseline=baseline_timings,
+            threshold=threshold,
+            force=force,
         )
+    except KeyboardInterrupt:
+        console.print(
+            "[bold yellow]Interrupted. Collected samples were saved.[/bold yellow]"
+        )
+        raise typer.Exit(130)
+    except Exception as e:
+        console.print(f"[bold red]Error: {e}[/bold red]")
+        raise typer.Exit(1)
+
+    # A machine that failed or did not run has no timings to compare, so it
+    # fails the command like a regression does
+    failed = [result["container"] for result in stats if not result.get("success")]
+    statuses = [result.get("comparison", {}).get("status") for result in stats]
+    missing = [
+        result["container"]
+        for result, status in zip(stats, statuses)
+        if status == MISSING
+    ]
+    if baseline_timings is not None:
+        ran = {result["container"] for result in stats}
+        missing.extend(
+            machine for machine in baseline_timings["timings"] if machine not in ran
+        )
+
+    if failed:
+        console.print(
+            f"\n[bold red]Execution failed on {', '.join(failed)}.[/bold red]"
+        )
+    else:
         console.print("\n[bold green]Execution successful.[/bold green]")
+    if missing:
+        console.print(
+            f"[bold red]Missing from the run or the baseline: "
+            f"{', '.join(missing)}.[/bold red]"
+        )
+    if REGRESSED in statuses:
+        console.print("[bold red]Regressions compared with the baseline.[/bold red]")
+    if failed or missing or REGRESSED in statuses:
+        raise typer.Exit(1)
+
+
+@app.command()
+def runs(
+    limit: Annotated[
+        int, typer.Option("--limit", min=1, help="Number of runs to list")
+    ] = 20,
+):
+    """
+    List the most recent benchmark runs.
+    """
+    from app.store import default_store
+
+    for run in default_store().runs(limit):
+        created_at = time.strftime(
+            "%Y-%m-%d %H:%M:%S", time.localtime(run["created_at"])
+        )
+        console.print(
+            f"[bold]{run['id']}[/bold]  {created_at}  {run['status']}  "
+            f"{run['language'] or '-'}  {run['entry_point'] or '-'}  "
+            f"{run['profile'] or '-'}  ({run['source']})"
+            + (f"  vs {run['baseline']}" if run["baseline"] else "")
+        )
+
+
+@app.command()
+def show(run_id: Annotated[str, typer.Argument(help="Id of the run to show")]):
+    """
+    Show the results of a past run.
+    """
+    from app.store import default_store
+    from app.utils import format_table
+
+    summaries = default_store().summaries(run_id)
+    if not summaries:
+        console.print(f"[bold red]No results for run '{run_id}'.[/bold red]")
+        return
+    format_table(summaries)
+
+
+@app.command()
+def hot_functions(
+    run_id: Annotated[str, typer.Argument(help="Id of a run made with --cpu-profile")],
+    baseline: Annotated[
+        Optional[str],
+        typer.Option(
+            "--baseline",
+            "-b",
+            help="Machine to compare the others with (defaults to the fastest)",
+        ),
+    ] = None,
+    limit: Annotated[
+        int, typer.Option("--limit", min=1, help="Number of functions per machine")
+    ] = 10,
+):
+    """
+    Show the hot functions of a profiled run and which got slower on which machine.
+    """
+    from app.store import default_store
+    from app.utils import print_hot_functions, print_profile_diff
+
+    profiles = default_store().profiles(run_id)
+    if not profiles:
+        console.print(f"[bold red]No profiles for run '{run_id}'.[/bold red]")
+        return
+    if baseline is not None and baseline not in profiles:
+        console.print(f"[bold red]No profile of '{baseline}' in the run.[/bold red]")
+        return
+    print_hot_functions(profiles, limit)
+    print_profile_diff(profiles, baseline)
+
+
+@app.command()
+def export(
+    run_id: Annotated[str, typer.Argument(help="Id of the run to export")],
+    output: Annotated[
+        Path, typer.Option("--output", "-o", help="File to write the samples to")
+    ] = Path(OUTPUT_FILE_NAME),
+    export_format: Annotated[
+        str,
+        typer.Option(
+            "--format",
+            help="Export format: csv or parquet (samples), or json (timings, "
+            "usable as a --baseline)",
+        ),
+    ] = "csv",
+    points: Annotated[
+        Optional[int],
+        typer.Option(
+            "--points",
+            help="Most samples per machine, keeping the series' shape and peaks "
+            "(0 for every sample; default TIN_SERIES_POINTS)",
+        ),
+    ] = None,
+):
+    """
+    Export the samples of a past run, and its summary when exporting CSV.
+    """
+    from app.series import SERIES_POINT_BUDGET
+    from app.store import default_store
+    from app.timing import summary_file_for
+
+    store = default_store()
+    if store.run(run_id) is None:
+        console.print(f"[bold red]No run '{run_id}'.[/bold red]")
+        return
+
+    budget = SERIES_POINT_BUDGET if points is None else points
+    try:
+        if export_format == "csv":
+            store.export_csv(run_id, output, budget)
+            store.export_summary_csv(run_id, summary_file_for(str(output)))
+        elif export_format == "parquet":
+            store.export_parquet(run_id, output, budget)
+        elif export_format == "json":
+            store.export_json(run_id, output)
+        else:
+            console.print(f"[bold red]Unknown format: {export_format}[/bold red]")
+            return
+        console.print(f"[bold green]Exported run '{run_id}' to {output}[/bold green]")
     except Exception as e:
         console.print(f"[bold red]Error: {e}[/bold red]")
 
 
+def _configured_machines(enabled_only=True):
+    """
+    Returns the machines from the config file, or the defaults, with one
+    machine per runtime version.
+    """
+    from app.machines import expand_machines
+    from app.utils import read_config
+
+    machines = MACHINES
+    if CONFIG_FILE_PATH.exists():
+        machines = read_config(CONFIG_FILE_PATH).get("machines", [])
+    if enabled_only:
+        machines = [m for m in machines if m.get("enabled", False)]
+    return expand_machines(machines)
+
+
+@app.command()
+def prepare(
+    pull: Annotated[
+        bool,
+        typer.Option("--pull", help="Pull the latest base images before building"),
+    ] = False,
+):
+    """
+    Build and cache the runtime images for the enabled machines.
+    """
+    from app.docker_client import get_client
+    from app.images import prepare_runtime_images
+
+    try:
+        machines = _configured_machines()
+    except ValueError as e:
+        console.print(f"[bold red]{e}[/bold red]")
+        return
+    if not machines:
+        console.print("[bold red]No enabled machines in config.[/bold red]")
+        return
+
+    console.print("📦 [bold blue]Preparing runtime images...[/bold blue]")
+    tags = prepare_runtime_images(get_client(), machines, pull=pull)
+    console.print(
+        f"\n[bold green]{len(tags)}/{len(machines)} runtime images ready.[/bold green]"
+    )
+
+
+@app.command()
+def prune_images():
+    """
+    Remove runtime images that are stale for the configured machines.
+    """
+    from app.docker_client import get_client
+    from app.images import prune_runtime_images
+
+    try:
+        machines = _configured_machines(enabled_only=False)
+    except ValueError as e:
+        console.print(f"[bold red]{e}[/bold red]")
+        return
+    removed = prune_runtime_images(get_client(), machines)
+    for tag in removed:
+        console.print(f"🗑️ [yellow]Removed '{tag}'.[/yellow]")
+    console.print(f"[bold green]Removed {len(removed)} stale images.[/bold green]")
+
+
+@app.command()
+def drain_pool():
+    """
+    Remove the warm containers kept between benchmark runs.
+    """
+    from app.pool import pool
+
+    removed = pool.drain()
+    for name in removed:
+        console.print(f"🗑️ [yellow]Removed '{name}'.[/yellow]")
+    console.print(f"[bold green]Removed {len(removed)} pooled containers.[/bold green]")
+
+
+@app.command()
+def worker(
+    server: Annotated[
+        str, typer.Option("--server", "-s", help="URL of the tin backend")
+    ] = "http://localhost:8000",
+    name: Annotated[
+        Optional[str],
+        typer.Option("--name", help="Name of this worker (defaults to the hostname)"),
+    ] = None,
+    capacity: Annotated[
+        int,
+        typer.Option(
+            "--capacity", "-c", min=1, help="Number of machines to run at the same time"
+        ),
+    ] = 1,
+):
+    """
+    Run machines of uploaded jobs on this host's Docker daemon for a backend.
+    """
+    from app.worker import WorkerAgent
+
+    console.print(f"🛠️ [bold blue]Starting worker for {server}...[/bold blue]")
+    try:
+        WorkerAgent(server, name=name, capacity=capacity).run()
+    except KeyboardInterrupt:
+        console.print("[bold yellow]Worker stopped.[/bold yellow]")
+
+
+@app.command()
+def clear_cache():
+    """
+    Forget the cached results, so the next benchmark runs every machine.
+    """
+    from app.store import default_store
+
+    removed = default_store().clear_cache()
+    console.print(f"[bold green]Removed {removed} cached results.[/bold green]")
+
+
 @app.command()
 def studio():
     """
     Launch the UI version of the tool.
     """
+    from app.utils import run_ui
+
     console.print("[bold]Starting the UI...[/bold]")
     run_ui()
 
@@ -77,6 +503,8 @@ def create_config():
     """
     Generate the config file.
     """
+    from app.machines import machine_runtimes
+
     if CONFIG_FILE_PATH.exists():
         if not typer.confirm("A configuration file already exists. Overwrite?"):
             console.print("[bold red]Canceled.[/bold red]")
@@ -84,9 +512,15 @@ def create_config():
 
     config_data = {
         "machines": [
-            {"name": m["name"], "image": m["image"], "enabled": m["enabled"]}
+            {
+                key: m[key]
+                for key in ("name", "image", "enabled", *machine_runtimes())
+                if key in m
+            }
             for m in MACHINES
-        ]
+        ],
+        "profile": DEFAULT_PROFILE,
+        "profiles": PROFILES,
     }
 
     try:
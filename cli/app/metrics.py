@@ -0,0 +1,136 @@
+BYTES_PER_MB = 1024 * 1024
+
+# Metrics that keep growing for the lifetime of a container
+CUMULATIVE_METRICS = (
+    "network_received_mb",
+    "network_sent_mb",
+    "disk_read_mb",
+    "disk_write_mb",
+    "disk_read_ops",
+    "disk_write_ops",
+    "cpu_throttled_periods",
+    "cpu_throttled_seconds",
+)
+
+
+def cpu_percentage(stats):
+    """
+    CPU usage over the interval between `precpu_stats` and `cpu_stats`.
+    Follows the `docker stats` convention where 100% is one fully used core.
+    """
+    cpu_stats = stats.get("cpu_stats", {})
+    precpu_stats = stats.get("precpu_stats", {})
+
+    cpu_delta = cpu_stats.get("cpu_usage", {}).get("total_usage", 0) - (
+        precpu_stats.get("cpu_usage", {}).get("total_usage", 0)
+    )
+    system_delta = cpu_stats.get("system_cpu_usage", 0) - precpu_stats.get(
+        "system_cpu_usage", 0
+    )
+    online_cpus = cpu_stats.get("online_cpus") or len(
+        cpu_stats.get("cpu_usage", {}).get("percpu_usage") or []
+    )
+
+    if cpu_delta <= 0 or system_delta <= 0 or not precpu_stats.get("system_cpu_usage"):
+        return 0
+    return cpu_delta / system_delta * (online_cpus or 1) * 100
+
+
+def blkio_totals(stats):
+    """
+    Sums the cumulative block I/O bytes and operations of a container.
+    """
+    blkio_stats = stats.get("blkio_stats") or {}
+    totals = {"read_bytes": 0, "write_bytes": 0, "read_ops": 0, "write_ops": 0}
+
+    for key, suffix in (
+        ("io_service_bytes_recursive", "bytes"),
+        ("io_serviced_recursive", "ops"),
+    ):
+        for entry in blkio_stats.get(key) or []:
+            op = entry.get("op", "").lower()
+            if op in ("read", "write"):
+                totals[f"{op}_{suffix}"] += entry.get("value", 0)
+    return totals
+
+
+def docker_stats_metrics(stats):
+    """
+    Converts a raw Docker stats frame into report metrics.
+    """
+    memory_stats = stats.get("memory_stats", {})
+    network_stats = stats.get("networks") or {}
+    throttling = stats.get("cpu_stats", {}).get("throttling_data", {})
+    io = blkio_totals(stats)
+
+    return {
+        "cpu_usage_percentage": cpu_percentage(stats),
+        "memory_usage_mb": memory_stats.get("usage", 0) / BYTES_PER_MB,
+        "memory_peak_mb": memory_stats.get("max_usage", 0) / BYTES_PER_MB,
+        "network_received_mb": sum(n["rx_bytes"] for n in network_stats.values())
+        / BYTES_PER_MB,
+        "network_sent_mb": sum(n["tx_bytes"] for n in network_stats.values())
+        / BYTES_PER_MB,
+        "disk_read_mb": io["read_bytes"] / BYTES_PER_MB,
+        "disk_write_mb": io["write_bytes"] / BYTES_PER_MB,
+        "disk_read_ops": io["read_ops"],
+        "disk_write_ops": io["write_ops"],
+        "cpu_throttled_periods": throttling.get("throttled_periods", 0),
+        "cpu_throttled_seconds": throttling.get("throttled_time", 0) / 1e9,
+    }
+
+
+def cgroup_metrics(previous, counters):
+    """
+    Converts raw cgroup v2 counters into report metrics.
+    CPU usage is computed against the `previous` counters, using the same
+    one-core-is-100% convention as `cpu_percentage`.
+    """
+    cpu_usage = 0
+    if previous is not None:
+        elapsed_usec = (counters["time"] - previous["time"]) * 1_000_000
+        used_usec = counters["cpu_usage_usec"] - previous["cpu_usage_usec"]
+        if elapsed_usec > 0:
+            cpu_usage = used_usec / elapsed_usec * 100
+
+    return {
+        "cpu_usage_percentage": cpu_usage,
+        "memory_usage_mb": counters["memory_current"] / BYTES_PER_MB,
+        "memory_peak_mb": counters["memory_peak"] / BYTES_PER_MB,
+        "network_received_mb": counters["network_rx_bytes"] / BYTES_PER_MB,
+        "network_sent_mb": counters["network_tx_bytes"] / BYTES_PER_MB,
+        "disk_read_mb": counters["io_read_bytes"] / BYTES_PER_MB,
+        "disk_write_mb": counters["io_write_bytes"] / BYTES_PER_MB,
+        "disk_read_ops": counters["io_read_ops"],
+        "disk_write_ops": counters["io_write_ops"],
+        "cpu_throttled_periods": counters["nr_throttled"],
+        "cpu_throttled_seconds": counters["throttled_usec"] / 1e6,
+    }
+
+
+def add_io_rate(sample, previous):
+    """
+    Sets read and write IOPS on a sample from the operation counters of the
+    previous sample. Without a previous sample there is no interval and both are 0.
+    """
+    sample["disk_read_iops"] = sample["disk_write_iops"] = 0
+    if previous is not None:
+        elapsed = sample["monotonic"] - previous["monotonic"]
+        if elapsed > 0:
+            sample["disk_read_iops"] = (
+                sample["disk_read_ops"] - previous["disk_read_ops"]
+            ) / elapsed
+            sample["disk_write_iops"] = (
+                sample["disk_write_ops"] - previous["disk_write_ops"]
+            ) / elapsed
+    return sample
+
+
+def subtract_baseline(sample, baseline):
+    """
+    Makes the cumulative metrics of a sample relative to a baseline taken before
+    the run, so a reused container only reports what this run did.
+    """
+    for key in CUMULATIVE_METRICS:
+        sample[key] = max(sample[key] - baseline[key], 0)
+    return sample
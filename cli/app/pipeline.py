@@ -0,0 +1,142 @@
+import queue
+import threading
+import time
+
+# Maximum number of records waiting for the writer; samplers block when it is full
+REPORT_QUEUE_SIZE = 10_000
+
+# Number of rows written to the store in one transaction
+REPORT_BATCH_SIZE = 500
+
+# Longest time a row waits in the queue before it is written (in seconds)
+REPORT_FLUSH_INTERVAL = 0.5
+
+_STOP = object()
+
+
+class ReportWriter:
+    """
+    The single writer of a run's samples.
+
+    Samplers of every machine push report rows into a bounded queue, and one
+    thread writes them to the results store in batches of REPORT_BATCH_SIZE
+    rows, or after REPORT_FLUSH_INTERVAL seconds, whichever comes first.
+    Closing the writer flushes everything still queued.
+    """
+
+    def __init__(
+        self,
+        store,
+        run_id,
+        queue_size=REPORT_QUEUE_SIZE,
+        batch_size=REPORT_BATCH_SIZE,
+        flush_interval=REPORT_FLUSH_INTERVAL,
+    ):
+        self.store = store
+        self.run_id = run_id
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.error = None
+        self.blocked_lock = threading.Lock()
+        self.stats = {
+            "rows": 0,
+            "batches": 0,
+            "write_seconds": 0.0,
+            "blocked_seconds": 0.0,
+            "max_queue_depth": 0,
+        }
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def put(self, row):
+        """
+        Queues a report row, blocking while the queue is full.
+        """
+        self._enqueue(("row", row))
+
+    def set_execution_time(self, machine_name, execution_time):
+        """
+        Fills in a machine's execution time once its rows are written.
+        """
+        self._enqueue(("execution_time", (machine_name, execution_time)))
+
+    def _enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            started = time.perf_counter()
+            self.queue.put(record)
+            with self.blocked_lock:
+                self.stats["blocked_seconds"] += time.perf_counter() - started
+
+    def close(self):
+        """
+        Writes everything still queued and stops the writer thread.
+        Raises the first error the writer ran into.
+        """
+        if self.thread.is_alive():
+            self.queue.put(_STOP)
+            self.thread.join()
+        if self.error is not None:
+            raise self.error
+        return self.stats
+
+    def _write(self, rows):
+        if not rows or self.error is not None:
+            return
+        started = time.perf_counter()
+        try:
+            self.store.add_samples(self.run_id, rows)
+        except Exception as e:
+            # Keep draining the queue so samplers never block on a dead writer
+            self.error = e
+        self.stats["write_seconds"] += time.perf_counter() - started
+        self.stats["rows"] += len(rows)
+        self.stats["batches"] += 1
+
+    def _run(self):
+        rows = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+            try:
+                record = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                self._write(rows)
+                rows, deadline = [], None
+                continue
+
+            self.stats["max_queue_depth"] = max(
+                self.stats["max_queue_depth"], self.queue.qsize() + 1
+            )
+            if record is _STOP:
+                self._write(rows)
+                return
+
+            kind, value = record
+            if kind == "row":
+                rows.append(value)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+                if len(rows) >= self.batch_size:
+                    self._write(rows)
+                    rows, deadline = [], None
+            else:
+                # Rows of the machine must be in the store before they are updated
+                self._write(rows)
+                rows, deadline = [], None
+                if self.error is None:
+                    try:
+                        self.store.set_execution_time(self.run_id, *value)
+                    except Exception as e:
+                        self.error = e
@@ -0,0 +1,279 @@
+import io
+import os
+import shutil
+import tarfile
+import tempfile
+import threading
+import time
+import uuid
+
+from app.constants import CONTAINER_IDLE_COMMAND
+from app.docker_client import get_client
+from app.execution import TIMINGS_FILE
+from app.images import ensure_runtime_image
+from app.profiles import container_limits, profile_key
+from app.telemetry import timed_phase
+
+# Labels that identify pooled containers and what they were created from
+POOL_LABEL = "tin.pool"
+POOL_MACHINE_LABEL = "tin.pool.machine"
+POOL_IMAGE_LABEL = "tin.pool.image"
+POOL_PROFILE_LABEL = "tin.pool.profile"
+
+# Maximum number of pooled containers kept alive
+POOL_MAX_SIZE = int(os.getenv("TIN_POOL_MAX_SIZE", "16"))
+
+# Seconds after which an unused pooled container is removed
+POOL_IDLE_TIMEOUT = int(os.getenv("TIN_POOL_IDLE_TIMEOUT", "1800"))
+
+# `mkdir` is atomic, so this directory doubles as a lease that works across
+# processes sharing the same Docker daemon
+LEASE_DIRECTORY = "/tmp/tin-lease"
+
+# Seconds after which a lease is considered abandoned by a crashed run
+POOL_LEASE_TIMEOUT = int(os.getenv("TIN_POOL_LEASE_TIMEOUT", "3600"))
+
+# Touched when a lease is released, to track how long a container has been idle
+IDLE_MARKER = "/tmp/tin-idle"
+
+WORKSPACE = "/app"
+
+
+class Lease:
+    """A container leased to run one machine of a benchmark"""
+
+    def __init__(self, container, machine_name, pooled, copy=None, reused=False):
+        self.container = container
+        self.machine_name = machine_name
+        self.pooled = pooled
+        # Private copy of the code bind-mounted into the container, if any
+        self.copy = copy
+        # Whether the container ran code of earlier leases, so its lifetime
+        # counters, such as memory.peak, do not describe this run alone
+        self.reused = reused
+
+
+def container_name_for(machine):
+    """
+    Returns a unique container name for a machine, so concurrent runs do not collide.
+    """
+    return f"tin-{machine['name'].lower()}-{uuid.uuid4().hex[:8]}"
+
+
+def _directory_archive(directory):
+    """
+    Packs the contents of a directory into an in-memory tar archive.
+    """
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w") as tar:
+        tar.add(directory, arcname=".")
+    buffer.seek(0)
+    return buffer.getvalue()
+
+
+def _private_copy(directory):
+    """
+    Copies a directory next to itself, with files of its own, for a container
+    that bind-mounts the code and may change it in place.
+    """
+    parent, name = os.path.split(os.path.abspath(directory))
+    copy = tempfile.mkdtemp(prefix=f"{name}-", dir=parent)
+    shutil.copytree(directory, copy, dirs_exist_ok=True)
+    return copy
+
+
+class ContainerPool:
+    """
+    Keeps ready containers per machine alive between benchmark runs.
+
+    A leased container gets a fresh copy of the code in /app. When the pool is
+    full, containers are created outside of it, bind-mount the code like before,
+    and are removed when released.
+    """
+
+    def __init__(
+        self, client=None, max_size=POOL_MAX_SIZE, idle_timeout=POOL_IDLE_TIMEOUT
+    ):
+        self._client = client
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.lock = threading.Lock()
+
+    @property
+    def client(self):
+        return self._client or get_client()
+
+    def pooled_containers(self, machine_name=None):
+        """
+        Lists pooled containers, optionally only those of one machine.
+        """
+        labels = [f"{POOL_LABEL}=true"]
+        if machine_name is not None:
+            labels.append(f"{POOL_MACHINE_LABEL}={machine_name}")
+        return self.client.containers.list(all=True, filters={"label": labels})
+
+    def _try_lease(self, container):
+        return container.exec_run(["mkdir", LEASE_DIRECTORY]).exit_code == 0
+
+    def _create(self, machine, image, directory, pooled, profile=None):
+        options = {
+            **container_limits(profile),
+            "name": container_name_for(machine),
+            "command": CONTAINER_IDLE_COMMAND,
+            "working_dir": WORKSPACE,
+            "stdin_open": True,
+            "tty": True,
+            "detach": True,
+        }
+        if pooled:
+            options["labels"] = {
+                POOL_LABEL: "true",
+                POOL_MACHINE_LABEL: machine["name"],
+                POOL_IMAGE_LABEL: image,
+                POOL_PROFILE_LABEL: profile_key(profile),
+            }
+        else:
+            options["volumes"] = {
+                os.path.abspath(directory): {"bind": WORKSPACE, "mode": "rw"}
+            }
+        with timed_phase("create"):
+            return self.client.containers.run(image, **options)
+
+    def _load_workspace(self, container, directory):
+        """
+        Replaces the container's /app with the contents of `directory` and clears
+        what the previous run left behind.
+        """
+        container.exec_run(
+            ["sh", "-c", f"rm -rf {WORKSPACE} {TIMINGS_FILE} && mkdir -p {WORKSPACE}"]
+        )
+        container.put_archive(WORKSPACE, _directory_archive(directory))
+
+    def acquire(self, machine, directory, image=None, profile=None, private=False):
+        """
+        Leases a ready container for a machine, loaded with the code in `directory`.
+        Containers are created with the resource limits of the measurement
+        `profile`, and only reused by runs with the same limits.
+        With `private`, `directory` must not be changed by the run (its files
+        may be shared, like hard-linked uploads), so a container outside the
+        pool bind-mounts a copy of it instead.
+        """
+        image = image or ensure_runtime_image(self.client, machine)
+        key = profile_key(profile)
+
+        with self.lock:
+            container = None
+            reused = False
+            for candidate in self.pooled_containers(machine["name"]):
+                if candidate.labels.get(POOL_IMAGE_LABEL) != image:
+                    continue
+                if candidate.labels.get(POOL_PROFILE_LABEL, "") != key:
+                    continue
+                if candidate.status != "running":
+                    candidate.remove(force=True)
+                    continue
+                if self._try_lease(candidate):
+                    container = candidate
+                    reused = True
+                    break
+
+            pooled = True
+            copy = None
+            if container is None:
+                self.evict_idle()
+                pooled = len(self.pooled_containers()) < self.max_size
+                if not pooled and private:
+                    copy = _private_copy(directory)
+                try:
+                    container = self._create(
+                        machine, image, copy or directory, pooled, profile
+                    )
+                except BaseException:
+                    if copy is not None:
+                        shutil.rmtree(copy, ignore_errors=True)
+                    raise
+                if pooled:
+                    self._try_lease(container)
+
+        if pooled:
+            self._load_workspace(container, directory)
+        return Lease(container, machine["name"], pooled, copy, reused)
+
+    def release(self, lease):
+        """
+        Returns a leased container to the pool, or removes it if it is not pooled.
+
+        Whatever the run left behind is killed first, such as code that outlived
+        a cancel or the runtime limit, so it cannot share the container with the
+        next run. A container that cannot be cleaned up is removed instead.
+        """
+        with timed_phase("teardown"):
+            if not lease.pooled:
+                try:
+                    # Nothing in the container needs a graceful shutdown
+                    lease.container.remove(force=True)
+                finally:
+                    if lease.copy is not None:
+                        shutil.rmtree(lease.copy, ignore_errors=True)
+                return
+            # kill -1 signals every process but PID 1, the idle command, and
+            # itself; the idle command starts a new sleep in place of the killed one
+            result = lease.container.exec_run(
+                [
+                    "sh",
+                    "-c",
+                    f"kill -9 -1 2>/dev/null; "
+                    f"rm -rf {LEASE_DIRECTORY} && touch {IDLE_MARKER}",
+                ]
+            )
+            if result.exit_code != 0:
+                lease.container.remove(force=True)
+
+    def _idle_seconds(self, container):
+        """
+        Returns how long a container has been idle, or None while it is leased.
+        """
+        result = container.exec_run(
+            [
+                "sh",
+                "-c",
+                f"if test -d {LEASE_DIRECTORY}; "
+                f"then echo leased $(stat -c %Y {LEASE_DIRECTORY}); "
+                f"else echo idle $(stat -c %Y {IDLE_MARKER}); fi",
+            ]
+        )
+        state, _, since = result.output.decode().strip().partition(" ")
+        if not since.isdigit():
+            return float("inf")
+        elapsed = time.time() - int(since)
+        if state == "leased":
+            return (
+                elapsed - POOL_LEASE_TIMEOUT if elapsed > POOL_LEASE_TIMEOUT else None
+            )
+        return elapsed
+
+    def evict_idle(self, idle_timeout=None):
+        """
+        Removes pooled containers that are stopped or idle for longer than the timeout.
+        Returns the names of the removed containers.
+        """
+        idle_timeout = self.idle_timeout if idle_timeout is None else idle_timeout
+        removed = []
+        for container in self.pooled_containers():
+            if container.status == "running":
+                idle_seconds = self._idle_seconds(container)
+                if idle_seconds is None or idle_seconds < idle_timeout:
+                    continue
+            container.remove(force=True)
+            removed.append(container.name)
+        return removed
+
+    def drain(self):
+        """
+        Removes every pooled container that is not currently leased.
+        """
+        return self.evict_idle(idle_timeout=0)
+
+
+# Shared by the CLI and the API; connects to Docker on first use
+pool = ContainerPool()
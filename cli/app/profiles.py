@@ -0,0 +1,171 @@
+import hashlib
+import json
+import math
+import threading
+from contextlib import contextmanager, nullcontext
+
+from app.constants import PROFILES
+
+# Resource limits a measurement profile can set on its containers
+PROFILE_OPTIONS = ("cpus", "cpuset", "mem_limit", "pids_limit")
+
+
+def parse_cpuset(cpuset):
+    """
+    Expands a cpuset such as "0-3,8" into a sorted list of CPU numbers.
+    """
+    cpus = set()
+    for part in str(cpuset).split(","):
+        part = part.strip()
+        if not part:
+            continue
+        first, dash, last = part.partition("-")
+        if not first.isdigit() or (dash and not last.isdigit()):
+            raise ValueError(f"Invalid cpuset: {cpuset}")
+        if dash and int(last) < int(first):
+            raise ValueError(f"Invalid cpuset: {cpuset}")
+        cpus.update(range(int(first), int(last or first) + 1))
+    if not cpus:
+        raise ValueError(f"Invalid cpuset: {cpuset}")
+    return sorted(cpus)
+
+
+def format_cpuset(cpus):
+    return ",".join(str(cpu) for cpu in cpus)
+
+
+def resolve_profile(name, profiles=None):
+    """
+    Looks up a measurement profile by name and checks its options.
+    Profiles from the config file take precedence over the built-in ones.
+    Returns the profile's options with its name under "name".
+    """
+    profiles = {**PROFILES, **(profiles or {})}
+    if name not in profiles:
+        raise ValueError(
+            f"Unknown profile '{name}' (available: {', '.join(sorted(profiles))})"
+        )
+
+    options = dict(profiles[name])
+    unknown = set(options) - set(PROFILE_OPTIONS)
+    if unknown:
+        raise ValueError(
+            f"Unknown options in profile '{name}': {', '.join(sorted(unknown))}"
+        )
+    if "cpus" in options and not float(options["cpus"]) > 0:
+        raise ValueError(f"Profile '{name}': cpus must be positive")
+    if "cpuset" in options:
+        parse_cpuset(options["cpuset"])
+    if "pids_limit" in options and not int(options["pids_limit"]) > 0:
+        raise ValueError(f"Profile '{name}': pids_limit must be positive")
+    return {"name": name, **options}
+
+
+def profile_key(profile):
+    """
+    Hashes a profile's limits, so pooled containers are only reused by runs
+    with the same limits. Runs without limits share the empty key.
+    """
+    options = {
+        option: profile[option]
+        for option in PROFILE_OPTIONS
+        if profile and option in profile
+    }
+    if not options:
+        return ""
+    encoded = json.dumps(options, sort_keys=True).encode()
+    return hashlib.sha256(encoded).hexdigest()[:16]
+
+
+def container_limits(profile):
+    """
+    Translates a profile into `containers.run` options.
+    """
+    if not profile:
+        return {}
+    limits = {}
+    if "cpus" in profile:
+        limits["nano_cpus"] = int(float(profile["cpus"]) * 1e9)
+    if "cpuset" in profile:
+        limits["cpuset_cpus"] = format_cpuset(parse_cpuset(profile["cpuset"]))
+    if "mem_limit" in profile:
+        limits["mem_limit"] = profile["mem_limit"]
+        # Same as the memory limit, so the container cannot swap
+        limits["memswap_limit"] = profile["mem_limit"]
+    if "pids_limit" in profile:
+        limits["pids_limit"] = int(profile["pids_limit"])
+    return limits
+
+
+class CpusetScheduler:
+    """
+    Hands out disjoint sets of CPUs to the machines running at the same time.
+
+    Each machine is pinned to `width` CPUs of its own while it runs, and put
+    back on all of the profile's CPUs afterwards. When every CPU is taken,
+    the next machine waits for one to run to finish.
+    """
+
+    def __init__(self, cpus, width):
+        if width > len(cpus):
+            raise ValueError(
+                f"Cannot pin machines to {width} CPUs, only {len(cpus)} are available"
+            )
+        self.cpus = list(cpus)
+        self.width = width
+        self.free = list(cpus)
+        self.condition = threading.Condition()
+
+    @classmethod
+    def for_profile(cls, client, profile):
+        """
+        Returns a scheduler for a profile that sets `cpus`, or None.
+        The CPUs are the profile's cpuset, or every CPU of the Docker host.
+        """
+        if not profile or "cpus" not in profile:
+            return None
+        if "cpuset" in profile:
+            cpus = parse_cpuset(profile["cpuset"])
+        else:
+            cpus = list(range(client.info()["NCPU"]))
+        return cls(cpus, math.ceil(float(profile["cpus"])))
+
+    @property
+    def slots(self):
+        return len(self.cpus) // self.width
+
+    def _take(self):
+        with self.condition:
+            while len(self.free) < self.width:
+                self.condition.wait()
+            taken, self.free = self.free[: self.width], self.free[self.width :]
+            return taken
+
+    def _give(self, cpus):
+        with self.condition:
+            self.free = sorted(self.free + cpus)
+            self.condition.notify()
+
+    @contextmanager
+    def pinned(self, container):
+        """
+        Pins a container to CPUs no other running machine uses.
+        """
+        cpus = self._take()
+        try:
+            container.update(cpuset_cpus=format_cpuset(cpus))
+            yield cpus
+        finally:
+            try:
+                container.update(cpuset_cpus=format_cpuset(self.cpus))
+            finally:
+                self._give(cpus)
+
+
+def pinned(scheduler, container):
+    """
+    Pins a container with the scheduler, if there is one.
+    """
+    if scheduler is None:
+        return nullcontext()
+    return scheduler.pinned(container)
@@ -0,0 +1,235 @@
+import io
+import json
+import re
+import shlex
+import tarfile
+from collections import defaultdict
+from pathlib import Path
+
+from app.execution import RUN_PLACEHOLDER
+
+# Where profilers write inside the container
+PROFILE_DIRECTORY = "/tmp/tin-profile"
+
+# Profiles of measured runs are named after the run; warmup runs write theirs
+# too, but they are left out of the results
+MEASURED_PROFILE_PREFIX = "run-"
+
+# Converts cProfile output to JSON inside the container, with the container's own
+# Python, because the pstats format depends on the Python version that wrote it
+PSTATS_TO_JSON = """
+import glob, json, pstats, sys
+directory = sys.argv[1]
+profiles = []
+for path in sorted(glob.glob(directory + "/run-*.prof")):
+    profiles.append([
+        [file, name, calls, self_time, cumulative_time]
+        for (file, line, name), (_, calls, self_time, cumulative_time, _)
+        in pstats.Stats(path).stats.items()
+    ])
+with open(directory + "/pstats.json", "w") as f:
+    json.dump(profiles, f)
+"""
+
+# Pseudo-frames of V8 profiles that are not functions of the program
+IGNORED_FRAMES = {"(root)", "(idle)", "(program)"}
+
+# Prefixes of the interpreter's own library paths, which differ between distros
+LIBRARY_PATH = re.compile(r".*/lib(?:64)?/(?:python3[\d.]*|node)/")
+
+
+def profiled_command(language, file):
+    """
+    Builds the command that runs the entry point under the language's profiler.
+    Every run writes a profile of its own, named after the run.
+    """
+    if language == "python":
+        return (
+            f"python3 -m cProfile -o {PROFILE_DIRECTORY}/{RUN_PLACEHOLDER}.prof "
+            f"{shlex.quote(file)}"
+        )
+    if language == "javascript":
+        return (
+            f"node --cpu-prof --cpu-prof-dir={PROFILE_DIRECTORY} "
+            f"--cpu-prof-name={RUN_PLACEHOLDER}.cpuprofile {shlex.quote(file)}"
+        )
+    raise ValueError(f"Unsupported language: {language}")
+
+
+def prepare_profile_directory(container):
+    """
+    Clears what an earlier run left in the container's profile directory.
+    """
+    container.exec_run(
+        ["sh", "-c", f"rm -rf {PROFILE_DIRECTORY} && mkdir -p {PROFILE_DIRECTORY}"]
+    )
+
+
+def short_path(path, workspace="/app"):
+    """
+    Shortens a source path so the same function has the same name on every
+    distro: relative to the workspace, or to the interpreter's library.
+    """
+    path = path.removeprefix("file://")
+    if path.startswith(f"{workspace}/"):
+        return path[len(workspace) + 1 :]
+    return LIBRARY_PATH.sub("", path)
+
+
+def function_label(name, path):
+    if not path or path == "~":
+        return name
+    return f"{name} ({short_path(path)})"
+
+
+def parse_pstats(profile):
+    """
+    Reads one profile converted by PSTATS_TO_JSON into per-function stats.
+    """
+    functions = {}
+    for path, name, calls, self_time, cumulative_time in profile:
+        label = function_label(name, path)
+        stats = functions.setdefault(
+            label, {"calls": 0, "self_seconds": 0.0, "cumulative_seconds": 0.0}
+        )
+        stats["calls"] += calls
+        stats["self_seconds"] += self_time
+        stats["cumulative_seconds"] += cumulative_time
+    return functions
+
+
+def parse_cpuprofile(profile):
+    """
+    Reads a V8 .cpuprofile into per-function stats. Sampled profiles have no
+    call counts, and a function's cumulative time counts each sample once even
+    when the function is on the stack several times.
+    """
+    parents = {}
+    labels = {}
+    for node in profile["nodes"]:
+        frame = node["callFrame"]
+        name = frame["functionName"] or "(anonymous)"
+        labels[node["id"]] = (
+            None if name in IGNORED_FRAMES else function_label(name, frame["url"])
+        )
+        for child in node.get("children", []):
+            parents[child] = node["id"]
+
+    functions = defaultdict(
+        lambda: {"calls": None, "self_seconds": 0.0, "cumulative_seconds": 0.0}
+    )
+    for node_id, delta in zip(profile["samples"], profile["timeDeltas"]):
+        seconds = delta / 1e6
+        if labels[node_id] is not None:
+            functions[labels[node_id]]["self_seconds"] += seconds
+        on_stack = set()
+        while node_id is not None:
+            label = labels[node_id]
+            if label is not None and label not in on_stack:
+                on_stack.add(label)
+                functions[label]["cumulative_seconds"] += seconds
+            node_id = parents.get(node_id)
+    return dict(functions)
+
+
+def average_profiles(profiles):
+    """
+    Averages the per-function stats of several runs.
+    """
+    totals = defaultdict(
+        lambda: {"calls": None, "self_seconds": 0.0, "cumulative_seconds": 0.0}
+    )
+    for functions in profiles:
+        for label, stats in functions.items():
+            total = totals[label]
+            if stats["calls"] is not None:
+                total["calls"] = (total["calls"] or 0) + stats["calls"]
+            total["self_seconds"] += stats["self_seconds"]
+            total["cumulative_seconds"] += stats["cumulative_seconds"]
+
+    count = len(profiles) or 1
+    return {
+        label: {
+            "calls": (
+                round(total["calls"] / count) if total["calls"] is not None else None
+            ),
+            "self_seconds": total["self_seconds"] / count,
+            "cumulative_seconds": total["cumulative_seconds"] / count,
+        }
+        for label, total in totals.items()
+    }
+
+
+def collect_profiles(container, language, destination=None):
+    """
+    Copies the profiles of a run out of the container with `get_archive` and
+    returns the per-function stats, averaged over the measured runs. The raw
+    profiles of those runs are also extracted into `destination` when it is
+    given.
+    """
+    if language == "python":
+        container.exec_run(["python3", "-c", PSTATS_TO_JSON, PROFILE_DIRECTORY])
+
+    bits, _ = container.get_archive(PROFILE_DIRECTORY)
+    archive = io.BytesIO(b"".join(bits))
+
+    profiles = []
+    with tarfile.open(fileobj=archive) as tar:
+        for member in tar.getmembers():
+            if not member.isfile():
+                continue
+            data = tar.extractfile(member).read()
+            name = Path(member.name).name
+            if name != "pstats.json" and not name.startswith(MEASURED_PROFILE_PREFIX):
+                continue
+            if destination is not None:
+                Path(destination).mkdir(parents=True, exist_ok=True)
+                (Path(destination) / name).write_bytes(data)
+            if name == "pstats.json":
+                profiles.extend(parse_pstats(profile) for profile in json.loads(data))
+            elif name.endswith(".cpuprofile"):
+                profiles.append(parse_cpuprofile(json.loads(data)))
+    return average_profiles(profiles)
+
+
+def hot_functions(functions, limit=10):
+    """
+    Returns the functions with the most self time, as (label, stats) pairs.
+    """
+    ranked = sorted(
+        functions.items(), key=lambda item: item[1]["self_seconds"], reverse=True
+    )
+    return ranked[:limit]
+
+
+def profile_diff(profiles, baseline=None, limit=5, threshold=0.1):
+    """
+    Compares each machine's functions with the baseline machine (by default
+    the one with the least total self time). Returns the baseline's name and,
+    per machine, the functions whose self time grew by more than `threshold`,
+    as (label, baseline seconds, seconds) tuples, largest increase first.
+    """
+    if not profiles:
+        return None, {}
+    if baseline is None:
+        baseline = min(
+            profiles,
+            key=lambda machine: sum(
+                stats["self_seconds"] for stats in profiles[machine].values()
+            ),
+        )
+    reference = profiles[baseline]
+
+    slower = {}
+    for machine, functions in profiles.items():
+        if machine == baseline:
+            continue
+        changes = []
+        for label, stats in functions.items():
+            before = reference.get(label, {}).get("self_seconds", 0.0)
+            after = stats["self_seconds"]
+            if after - before > 0 and (not before or after / before - 1 > threshold):
+                changes.append((label, before, after))
+        changes.sort(key=lambda change: change[2] - change[1], reverse=True)
+        slower[machine] = changes[:limit]
+    return baseline, slower
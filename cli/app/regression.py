@@ -0,0 +1,221 @@
+import json
+import math
+import os
+import random
+import statistics
+from functools import lru_cache
+
+# Significance level of the Mann-Whitney test
+ALPHA = 0.05
+
+# Bootstrap resamples drawn for the confidence interval of a change
+BOOTSTRAP_RESAMPLES = 2000
+
+# Largest sample sizes (together) for which exact p-values are computed
+EXACT_LIMIT = 40
+
+REGRESSED = "regressed"
+IMPROVED = "improved"
+UNCHANGED = "unchanged"
+INSUFFICIENT = "insufficient"
+MISSING = "missing"
+
+
+def load_baseline(reference, store):
+    """
+    Returns the timings per machine of a baseline, given as the id of a stored
+    run or the path of a file written by `tin export --format json`.
+    Raises ValueError when the baseline cannot be found.
+    """
+    if os.path.isfile(reference):
+        with open(reference) as file:
+            data = json.load(file)
+        return {
+            machine["container"]: machine["timings"] for machine in data["machines"]
+        }
+
+    if store.run(reference) is None:
+        raise ValueError(f"No baseline run or file '{reference}'.")
+    return {
+        summary["container"]: summary["timings"]
+        for summary in store.summaries(reference)
+    }
+
+
+@lru_cache(maxsize=None)
+def _arrangements(n, m, u):
+    """
+    Counts the orderings of n and m distinct values whose U statistic is u.
+    """
+    if u < 0 or u > n * m:
+        return 0
+    if n == 0 or m == 0:
+        return 1 if u == 0 else 0
+    return _arrangements(n - 1, m, u - m) + _arrangements(n, m - 1, u)
+
+
+def _tied_tail(ranks, n, rank_sum):
+    """
+    Exact probability that n of the `ranks` drawn at random, without
+    replacement, sum to at least `rank_sum`. Ranks of tied values are averages,
+    so they are doubled to count sums in integers.
+    """
+    doubled = [round(rank * 2) for rank in ranks]
+    # counts[k][s]: subsets of k ranks whose doubled sum is s
+    counts = [{} for _ in range(n + 1)]
+    counts[0][0] = 1
+    for rank in doubled:
+        for k in range(n, 0, -1):
+            for total, count in counts[k - 1].items():
+                counts[k][total + rank] = counts[k].get(total + rank, 0) + count
+    target = round(rank_sum * 2)
+    tail = sum(count for total, count in counts[n].items() if total >= target)
+    return tail / math.comb(len(ranks), n)
+
+
+def mann_whitney(baseline, current):
+    """
+    One-sided Mann-Whitney U test that `current` tends to be larger (slower)
+    than `baseline`. Returns the p-value: exact for small samples, over the
+    observed ranks when there are ties, and from the normal approximation with
+    tie and continuity corrections otherwise.
+    """
+    n, m = len(current), len(baseline)
+    values = sorted(
+        [(value, 0) for value in baseline] + [(value, 1) for value in current]
+    )
+
+    # Average ranks, shared by tied values
+    ranks = [0.0] * len(values)
+    ties = []
+    start = 0
+    while start < len(values):
+        end = start
+        while end + 1 < len(values) and values[end + 1][0] == values[start][0]:
+            end += 1
+        for index in range(start, end + 1):
+            ranks[index] = (start + end) / 2 + 1
+        ties.append(end - start + 1)
+        start = end + 1
+
+    rank_sum = sum(rank for rank, (_, group) in zip(ranks, values) if group == 1)
+    u = rank_sum - n * (n + 1) / 2
+
+    if n + m <= EXACT_LIMIT:
+        if any(count > 1 for count in ties):
+            return _tied_tail(ranks, n, rank_sum)
+        total = math.comb(n + m, n)
+        return sum(_arrangements(n, m, k) for k in range(int(u), n * m + 1)) / total
+
+    mean = n * m / 2
+    tie_term = sum(count**3 - count for count in ties) / ((n + m) * (n + m - 1))
+    variance = n * m / 12 * ((n + m + 1) - tie_term)
+    if variance <= 0:
+        return 1.0
+    z = (u - mean - 0.5) / math.sqrt(variance)
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+
+def bootstrap_change(baseline, current, resamples=BOOTSTRAP_RESAMPLES, seed=0):
+    """
+    95% bootstrap confidence interval of the relative change of the median,
+    with a fixed seed so the same timings always give the same interval.
+    """
+    rng = random.Random(seed)
+    changes = []
+    for _ in range(resamples):
+        before = statistics.median(rng.choices(baseline, k=len(baseline)))
+        after = statistics.median(rng.choices(current, k=len(current)))
+        if before > 0:
+            changes.append(after / before - 1)
+    if not changes:
+        return None, None
+    changes.sort()
+    return (
+        changes[int(0.025 * (len(changes) - 1))],
+        changes[int(0.975 * (len(changes) - 1))],
+    )
+
+
+def compare_machine(machine, baseline, current, threshold, alpha=ALPHA):
+    """
+    Compares the timings of one machine with its baseline timings. The machine
+    regressed when it is significantly slower and its median grew by more than
+    `threshold` (a fraction); it improved in the opposite case.
+    """
+    comparison = {
+        "machine": machine,
+        "status": MISSING,
+        "baseline_runs": len(baseline or []),
+        "runs": len(current or []),
+        "baseline_median": statistics.median(baseline) if baseline else None,
+        "median": statistics.median(current) if current else None,
+        "change": None,
+        "change_ci_low": None,
+        "change_ci_high": None,
+        "p_value": None,
+    }
+    if not baseline or not current:
+        return comparison
+
+    before, after = comparison["baseline_median"], comparison["median"]
+    comparison["change"] = after / before - 1 if before else None
+    if len(baseline) < 2 or len(current) < 2:
+        comparison["status"] = INSUFFICIENT
+        return comparison
+
+    low, high = bootstrap_change(baseline, current)
+    slower = mann_whitney(baseline, current)
+    faster = mann_whitney(current, baseline)
+    comparison.update(change_ci_low=low, change_ci_high=high)
+
+    if slower < faster:
+        comparison["p_value"] = slower
+        significant = slower < alpha and comparison["change"] > threshold
+        comparison["status"] = REGRESSED if significant else UNCHANGED
+    else:
+        comparison["p_value"] = faster
+        significant = faster < alpha and comparison["change"] < -threshold
+        comparison["status"] = IMPROVED if significant else UNCHANGED
+    return comparison
+
+
+def compare_runs(baseline, results, threshold, alpha=ALPHA):
+    """
+    Compares the results of a benchmark with baseline timings per machine.
+    Machines of the baseline that did not run are reported as missing.
+    """
+    comparisons = [
+        compare_machine(
+            result["container"],
+            baseline.get(result["container"]),
+            result["timings"],
+            threshold,
+            alpha,
+        )
+        for result in results
+    ]
+    ran = {result["container"] for result in results}
+    comparisons.extend(
+        compare_machine(machine, timings, None, threshold, alpha)
+        for machine, timings in baseline.items()
+        if machine not in ran
+    )
+    return comparisons
+
+
+def write_diff(output_file, reference, run_id, comparisons, threshold, alpha=ALPHA):
+    """
+    Writes the comparison with a baseline as JSON, for CI to gate on.
+    """
+    diff = {
+        "baseline": reference,
+        "run_id": run_id,
+        "threshold": threshold,
+        "alpha": alpha,
+        "regressed": any(c["status"] == REGRESSED for c in comparisons),
+        "machines": comparisons,
+    }
+    with open(output_file, "w") as file:
+        json.dump(diff, file, indent=2)
+    return diff
@@ -0,0 +1,35 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+
+def run_concurrently(items, task, parallel=1, isolated=False, cancel_event=None):
+    """
+    Runs task(item, timed_section) for every item using up to `parallel` threads.
+
+    `timed_section` is a context manager the task wraps around the part that is
+    being measured. In isolated mode it is a shared lock, so only one machine is
+    measured at a time while setup and teardown still overlap.
+    Results are returned in the same order as `items`.
+
+    If waiting is interrupted (for example by Ctrl-C), `cancel_event` is set so
+    running tasks can wind down before the interruption is raised.
+    """
+    lock = threading.Lock() if isolated else None
+
+    def timed_section():
+        return lock if lock is not None else nullcontext()
+
+    if parallel <= 1 or len(items) <= 1:
+        return [task(item, timed_section) for item in items]
+
+    with ThreadPoolExecutor(max_workers=min(parallel, len(items))) as executor:
+        futures = [executor.submit(task, item, timed_section) for item in items]
+        try:
+            return [future.result() for future in futures]
+        except BaseException:
+            if cancel_event is not None:
+                cancel_event.set()
+            for future in futures:
+                future.cancel()
+            raise
@@ -0,0 +1,257 @@
+import csv
+import threading
+import time
+
+from app.cgroup import cgroup_reader_for
+from app.constants import REPORT_HEADERS
+from app.metrics import add_io_rate, docker_stats_metrics, subtract_baseline
+from app.series import RunningAggregates
+from app.telemetry import PHASE_DURATION, forget_machine, observe_sample
+
+# Available sampling backends
+SAMPLERS = ("auto", "docker", "cgroup")
+
+# Default minimum spacing between two kept samples (in seconds)
+DEFAULT_SAMPLE_INTERVAL = 0.5
+
+# Default spacing between two cgroup reads (in seconds)
+DEFAULT_CGROUP_SAMPLE_INTERVAL = 0.05
+
+# How long to wait for the stats stream to notice the end of a run (in seconds)
+STREAM_JOIN_TIMEOUT = 3
+
+# How often a running process is checked for cancellation (in seconds)
+CANCEL_CHECK_INTERVAL = 0.1
+
+# Serializes appends to the report when several machines are sampled at once
+_report_lock = threading.Lock()
+
+
+def write_report_rows(output_file, rows):
+    """
+    Appends rows to the report, writing the header when the file is new.
+    """
+    with _report_lock, open(output_file, mode="a", newline="") as file:
+        writer = csv.writer(file)
+        if file.tell() == 0:
+            writer.writerow(REPORT_HEADERS)
+        writer.writerows(rows)
+
+
+def report_row(container_name, sample, code_execution_time):
+    """
+    Formats a sample as a report row.
+    """
+    return [
+        sample["timestamp"],
+        container_name,
+        round(sample["cpu_usage_percentage"], 2),
+        round(sample["memory_usage_mb"], 2),
+        round(sample["network_received_mb"], 2),
+        round(sample["network_sent_mb"], 2),
+        round(sample["disk_read_mb"], 2),
+        round(sample["disk_write_mb"], 2),
+        round(sample["runtime_seconds"], 2),
+        round(code_execution_time, 2) if code_execution_time else None,
+        round(sample["disk_read_iops"], 2),
+        round(sample["disk_write_iops"], 2),
+        sample["cpu_throttled_periods"],
+    ]
+
+
+def _tag_sample(sample, start_time):
+    """
+    Stamps a sample with its wall-clock and monotonic time.
+    """
+    now = time.monotonic()
+    sample["monotonic"] = now
+    sample["timestamp"] = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime())
+    sample["runtime_seconds"] = now - start_time
+    return sample
+
+
+def stream_samples(container, record, stop, start_time, interval, runtime_limit):
+    """
+    Decodes frames from the Docker stats stream as they arrive and passes them to
+    `record` with the time processing started, keeping at most one frame per
+    `interval` seconds. Runs until `stop` is set or `runtime_limit` is reached.
+    The stream is closed however sampling ends, so its connection is not left
+    open in the client's pool.
+    """
+    last_sample = None
+    stream = container.stats(stream=True, decode=True)
+    try:
+        for stats in stream:
+            if stop.is_set():
+                break
+            now = time.monotonic()
+            if last_sample is None or now - last_sample >= interval:
+                started = time.perf_counter()
+                record(_tag_sample(docker_stats_metrics(stats), start_time), started)
+                last_sample = now
+            if now - start_time >= runtime_limit:
+                break
+    finally:
+        stream.close()
+
+
+def poll_cgroup(reader, record, stop, start_time, interval):
+    """
+    Reads the container's cgroup files every `interval` seconds until `stop` is set,
+    then takes a final sample so totals cover the whole run.
+    """
+    while not stop.is_set():
+        started = time.perf_counter()
+        record(_tag_sample(reader.sample(), start_time), started)
+        stop.wait(interval)
+    started = time.perf_counter()
+    record(_tag_sample(reader.sample(), start_time), started)
+
+
+def collect_stats_to_csv(
+    container,
+    output_file,
+    process,
+    runtime_limit=500,
+    interval=None,
+    sampler="auto",
+    cancel_event=None,
+    on_sample=None,
+    name=None,
+    writer=None,
+    reused=True,
+    run_id=None,
+):
+    """
+    Samples a container while `process` is running and writes the samples to a CSV file.
+    Stops as soon as the process exits or after `runtime_limit` seconds.
+
+    The "cgroup" and "auto" samplers read the container's cgroup v2 files directly
+    and fall back to the Docker stats stream when those files are not accessible.
+    Setting `cancel_event` stops sampling early, and `on_sample` is called with
+    the machine name and each sample as soon as it is taken. Rows are reported
+    under `name`, which defaults to the container name. With a `writer`, each row
+    is queued to it as soon as it is sampled; otherwise all rows are appended to
+    `output_file` once the process exits. The live metrics of the machine are
+    labelled with `run_id`, which defaults to the run of `writer`.
+
+    When `process` has not been started yet, it is started here after a baseline
+    sample, and cumulative counters are reported relative to that baseline so a
+    reused container does not carry over the totals of earlier runs. The
+    container's own peak memory only counts towards the peak when it was not
+    `reused`, since it covers the container's whole life.
+    Returns the exit code and measured duration of the process, the exact
+    running aggregates of every sample (peaks, CPU time and I/O totals, see
+    AGGREGATES), and how long the sampler spent on the samples.
+    """
+    name = name or container.name
+    if run_id is None:
+        run_id = writer.run_id if writer is not None else ""
+    samples = []
+    stop = threading.Event()
+    baseline = None
+    aggregates = RunningAggregates()
+    totals = {"sampler_seconds": 0.0, "previous": None}
+
+    def record(sample, started):
+        if baseline is not None:
+            subtract_baseline(sample, baseline)
+        previous = totals["previous"]
+        add_io_rate(sample, previous)
+        aggregates.add(sample, previous, reused=reused)
+        totals["previous"] = sample
+        if writer is not None:
+            writer.put(report_row(name, sample, None))
+        else:
+            samples.append(sample)
+        if on_sample is not None:
+            on_sample(name, sample)
+        elapsed = time.perf_counter() - started
+        totals["sampler_seconds"] += elapsed
+        lag = None
+        if previous is not None:
+            lag = sample["monotonic"] - previous["monotonic"] - sample_interval
+        observe_sample(name, run_id, sample, source, lag, elapsed)
+
+    cgroup_reader = None
+    if sampler in ("auto", "cgroup"):
+        cgroup_reader = cgroup_reader_for(container)
+    if cgroup_reader is not None:
+        source, sample_interval = "cgroup", interval or DEFAULT_CGROUP_SAMPLE_INTERVAL
+    else:
+        source, sample_interval = "docker", interval or DEFAULT_SAMPLE_INTERVAL
+
+    if process.started_at is None:
+        if cgroup_reader is not None:
+            baseline = cgroup_reader.sample()
+        else:
+            baseline = docker_stats_metrics(container.stats(stream=False))
+
+    start_time = time.monotonic()
+
+    if cgroup_reader is not None:
+        reader = threading.Thread(
+            target=poll_cgroup,
+            args=(
+                cgroup_reader,
+                record,
+                stop,
+                start_time,
+                sample_interval,
+            ),
+            daemon=True,
+        )
+    else:
+        reader = threading.Thread(
+            target=stream_samples,
+            args=(
+                container,
+                record,
+                stop,
+                start_time,
+                sample_interval,
+                runtime_limit,
+            ),
+            daemon=True,
+        )
+    reader.start()
+    if process.started_at is None:
+        process.start()
+    try:
+        while not process.wait(CANCEL_CHECK_INTERVAL):
+            if time.monotonic() - start_time >= runtime_limit:
+                break
+            if cancel_event is not None and cancel_event.is_set():
+                break
+    finally:
+        stop.set()
+    # The stream yields about once per second, so the reader notices the stop
+    # on its next frame. A process that ends before the first frame still gets
+    # a single one-shot sample.
+    reader.join(timeout=STREAM_JOIN_TIMEOUT)
+    if not aggregates["samples"]:
+        started = time.perf_counter()
+        record(
+            _tag_sample(
+                docker_stats_metrics(container.stats(stream=False)), start_time
+            ),
+            started,
+        )
+    PHASE_DURATION.labels(phase="sample").observe(time.monotonic() - start_time)
+    forget_machine(name, run_id)
+
+    code_execution_time = process.duration
+    if writer is not None:
+        writer.set_execution_time(name, code_execution_time)
+    else:
+        write_report_rows(
+            output_file,
+            [report_row(name, sample, code_execution_time) for sample in samples],
+        )
+
+    return {
+        "exit_code": process.exit_code,
+        "execution_time": code_execution_time,
+        **aggregates.to_dict(),
+        "sampler_seconds": totals["sampler_seconds"],
+    }
@@ -2,7 +2,7 @@
 
 dnf update -y
 dnf install nodejs -y
-dnf install python3 python-pip
+dnf install python3 python-pip -y
 
 # Verify installations
 node -v
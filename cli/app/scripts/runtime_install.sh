@@ -0,0 +1,52 @@
+#!/bin/bash
+
+# This script installs one extra Python or Node.js version on top of a distro's runtime image.
+# It only adds the requested interpreter, so every version shares the distro's base layers.
+# Python builds come from python-build-standalone (through uv) and Node.js builds from nodejs.org.
+# The interpreter is linked into /usr/local/bin, which comes before the distro's own in PATH.
+
+set -e
+
+# Make sure the archives can be unpacked on minimal images
+if ! command -v tar > /dev/null || ! command -v gzip > /dev/null; then
+    if command -v apt > /dev/null; then
+        apt install -y tar gzip
+    elif command -v dnf > /dev/null; then
+        dnf install -y tar gzip
+    else
+        yum install -y tar gzip
+    fi
+fi
+
+case "$(uname -m)" in
+    x86_64) NODE_ARCH="x64" ;;
+    aarch64) NODE_ARCH="arm64" ;;
+    *) NODE_ARCH="$(uname -m)" ;;
+esac
+
+if [ -n "$PYTHON_VERSION" ]; then
+    echo "Installing Python $PYTHON_VERSION..."
+    export UV_INSTALL_DIR=/opt/uv UV_PYTHON_INSTALL_DIR=/opt/python UV_PYTHON_PREFERENCE=only-managed UV_NO_MODIFY_PATH=1
+    curl -LsSf https://astral.sh/uv/install.sh | sh
+    /opt/uv/uv python install "$PYTHON_VERSION"
+    ln -sf "$(/opt/uv/uv python find "$PYTHON_VERSION")" /usr/local/bin/python3
+    rm -rf /opt/uv /root/.cache/uv
+fi
+
+if [ -n "$NODE_VERSION" ]; then
+    echo "Installing Node.js $NODE_VERSION..."
+    case "$NODE_VERSION" in
+        *.*) NODE_RELEASE="v$NODE_VERSION" ;;
+        *) NODE_RELEASE="latest-v$NODE_VERSION.x" ;;
+    esac
+    NODE_URL="https://nodejs.org/dist/$NODE_RELEASE"
+    NODE_ARCHIVE="$(curl -fsSL "$NODE_URL/SHASUMS256.txt" | grep -o "node-v[0-9.]*-linux-$NODE_ARCH.tar.gz" | head -n 1)"
+    mkdir -p /opt/node
+    curl -fsSL "$NODE_URL/$NODE_ARCHIVE" | tar -xz -C /opt/node --strip-components=1
+    ln -sf /opt/node/bin/node /usr/local/bin/node
+    ln -sf /opt/node/bin/npm /usr/local/bin/npm
+fi
+
+# Verify installations
+python3 --version
+node -v
@@ -0,0 +1,188 @@
+import os
+from array import array
+
+# Most points per machine in exported and served series (0 keeps every sample)
+SERIES_POINT_BUDGET = int(os.getenv("TIN_SERIES_POINTS", "500"))
+
+# Report columns whose shape is preserved when a series is downsampled
+SERIES_COLUMNS = (
+    "cpu_usage_percentage",
+    "memory_usage_mb",
+    "network_received_mb",
+    "network_sent_mb",
+    "disk_read_mb",
+    "disk_write_mb",
+    "disk_read_iops",
+    "disk_write_iops",
+    "cpu_throttled_periods",
+)
+
+# Running aggregates of a sampled machine, in buffer order. Peaks are maxima,
+# totals are the latest value of a cumulative counter, and cpu_seconds is the
+# CPU time integrated over the samples
+AGGREGATES = (
+    "samples",
+    "peak_cpu",
+    "peak_memory_mb",
+    "cpu_seconds",
+    "network_received_mb",
+    "network_sent_mb",
+    "disk_read_mb",
+    "disk_write_mb",
+    "peak_disk_read_iops",
+    "peak_disk_write_iops",
+)
+
+_INDEX = {name: index for index, name in enumerate(AGGREGATES)}
+
+# Positions of the aggregates updated with every sample
+_SAMPLES = _INDEX["samples"]
+_PEAK_CPU = _INDEX["peak_cpu"]
+_PEAK_MEMORY = _INDEX["peak_memory_mb"]
+_CPU_SECONDS = _INDEX["cpu_seconds"]
+
+# Aggregates that are the maximum of a sample column: peaks, and cumulative
+# counters whose latest value is the total
+_MAXIMA = tuple(
+    (_INDEX[name], column)
+    for name, column in (
+        ("network_received_mb", "network_received_mb"),
+        ("network_sent_mb", "network_sent_mb"),
+        ("disk_read_mb", "disk_read_mb"),
+        ("disk_write_mb", "disk_write_mb"),
+        ("peak_disk_read_iops", "disk_read_iops"),
+        ("peak_disk_write_iops", "disk_write_iops"),
+    )
+)
+
+
+class RunningAggregates:
+    """
+    Exact aggregates of every sample of a machine, updated as samples arrive.
+
+    The values live in one flat array of doubles, so keeping them costs the
+    same for a run of a second and a run of hours, and they stay exact however
+    much the stored series is downsampled later.
+    """
+
+    __slots__ = ("values",)
+
+    def __init__(self):
+        self.values = array("d", bytes(8 * len(AGGREGATES)))
+
+    def add(self, sample, previous=None, reused=False):
+        """
+        Folds a sample in. `previous` is the sample before it, used to integrate
+        CPU time. memory.peak covers the container's whole life, so it is only
+        used for a container that was not `reused`.
+        """
+        values = self.values
+        values[_SAMPLES] += 1
+        cpu = sample["cpu_usage_percentage"]
+        if cpu > values[_PEAK_CPU]:
+            values[_PEAK_CPU] = cpu
+        memory = sample["memory_usage_mb"]
+        if not reused and sample["memory_peak_mb"] > memory:
+            memory = sample["memory_peak_mb"]
+        if memory > values[_PEAK_MEMORY]:
+            values[_PEAK_MEMORY] = memory
+        if previous is not None:
+            elapsed = sample["monotonic"] - previous["monotonic"]
+            if elapsed > 0:
+                values[_CPU_SECONDS] += cpu / 100 * elapsed
+        for index, column in _MAXIMA:
+            if sample[column] > values[index]:
+                values[index] = sample[column]
+
+    def __getitem__(self, name):
+        return self.values[_INDEX[name]]
+
+    def to_dict(self):
+        aggregates = dict(zip(AGGREGATES, self.values))
+        aggregates["samples"] = int(aggregates["samples"])
+        return aggregates
+
+
+def lttb(xs, ys, budget):
+    """
+    Largest-Triangle-Three-Buckets: picks `budget` indices of a series that
+    preserve its visual shape. The first and last points are always kept.
+    """
+    count = len(xs)
+    if budget >= count:
+        return list(range(count))
+    budget = max(budget, 3)
+
+    selected = [0]
+    bucket_size = (count - 2) / (budget - 2)
+    anchor = 0
+    for bucket in range(budget - 2):
+        start = int(bucket * bucket_size) + 1
+        end = int((bucket + 1) * bucket_size) + 1
+
+        # Average of the next bucket, or the last point for the last bucket
+        next_end = min(int((bucket + 2) * bucket_size) + 1, count)
+        if end < next_end:
+            average_x = sum(xs[end:next_end]) / (next_end - end)
+            average_y = sum(ys[end:next_end]) / (next_end - end)
+        else:
+            average_x, average_y = xs[-1], ys[-1]
+
+        chosen, largest = start, -1.0
+        for index in range(start, end):
+            area = abs(
+                (xs[anchor] - average_x) * (ys[index] - ys[anchor])
+                - (xs[anchor] - xs[index]) * (average_y - ys[anchor])
+            )
+            if area > largest:
+                chosen, largest = index, area
+        selected.append(chosen)
+        anchor = chosen
+    selected.append(count - 1)
+    return selected
+
+
+def downsample(rows, budget, x="runtime_seconds", columns=SERIES_COLUMNS):
+    """
+    Reduces the rows of one machine to at most `budget` rows, in order.
+
+    The first and last rows and the rows holding each column's maximum and
+    minimum are kept first, so peaks stay exact; the rest of the budget is
+    shared equally between the columns for LTTB. A budget smaller than the
+    number of those rows keeps the first and last rows, then the maxima, then
+    the minima, in column order.
+    """
+    if not budget or len(rows) <= budget:
+        return rows
+
+    xs = [row[x] or 0 for row in rows]
+    series = [[row[column] or 0 for row in rows] for column in columns]
+    extrema = [0, len(rows) - 1]
+    extrema.extend(max(range(len(ys)), key=ys.__getitem__) for ys in series)
+    extrema.extend(min(range(len(ys)), key=ys.__getitem__) for ys in series)
+    kept = list(dict.fromkeys(extrema))[:budget]
+
+    # LTTB always picks the first and last rows, which are already kept
+    share = (budget - len(kept)) // len(columns) + 2
+    if share >= 3:
+        picked = set(kept)
+        for ys in series:
+            picked.update(lttb(xs, ys, share))
+        kept = picked
+    return [rows[index] for index in sorted(kept)]
+
+
+def downsample_by_machine(rows, budget, machine="container_name"):
+    """
+    Downsamples report rows of several machines, each to `budget` rows.
+    Rows of a machine are expected to be contiguous and in time order.
+    """
+    if not budget:
+        return rows
+    reduced = []
+    start = 0
+    for index in range(1, len(rows) + 1):
+        if index == len(rows) or rows[index][machine] != rows[start][machine]:
+            reduced.extend(downsample(rows[start:index], budget))
+            start = index
+    return reduced
@@ -0,0 +1,487 @@
+import csv
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from app.constants import REPORT_HEADERS
+from app.series import SERIES_POINT_BUDGET, downsample_by_machine
+from app.timing import write_summary_csv
+
+# Where benchmark results are kept (in the user's home directory by default)
+RESULTS_DB_PATH = Path(os.getenv("TIN_RESULTS_DB", Path.home() / ".tin-results.db"))
+
+# Sample metrics stored per row, in report order
+SAMPLE_COLUMNS = [
+    header for header in REPORT_HEADERS if header not in ("timestamp", "container_name")
+]
+
+# Per-machine summary values stored per run
+SUMMARY_COLUMNS = [
+    "runs",
+    "mean",
+    "median",
+    "p95",
+    "stddev",
+    "ci_low",
+    "ci_high",
+    "exit_code",
+    "peak_cpu",
+    "peak_memory_mb",
+    "status",
+    "cpu_seconds",
+    "network_received_mb",
+    "network_sent_mb",
+    "disk_read_mb",
+    "disk_write_mb",
+]
+
+# Columns added to tables after their first version
+ADDED_COLUMNS = {
+    "runs": ["profile", "baseline"],
+    "summaries": [
+        "cpu_seconds",
+        "network_received_mb",
+        "network_sent_mb",
+        "disk_read_mb",
+        "disk_write_mb",
+    ],
+}
+
+SAMPLE_COLUMN_TYPES = {"cpu_throttled_periods": "INTEGER"}
+SUMMARY_COLUMN_TYPES = {"runs": "INTEGER", "exit_code": "INTEGER", "status": "TEXT"}
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS runs (
+    id TEXT PRIMARY KEY,
+    created_at REAL NOT NULL,
+    finished_at REAL,
+    status TEXT NOT NULL,
+    language TEXT,
+    entry_point TEXT,
+    source TEXT,
+    profile TEXT,
+    baseline TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_created_at ON runs (created_at);
+
+CREATE TABLE IF NOT EXISTS machines (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS samples (
+    run_id TEXT NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    machine_id INTEGER NOT NULL REFERENCES machines (id),
+    timestamp TEXT NOT NULL,
+    {", ".join(f"{column} {SAMPLE_COLUMN_TYPES.get(column, 'REAL')}" for column in SAMPLE_COLUMNS)}
+);
+CREATE INDEX IF NOT EXISTS samples_run_machine
+    ON samples (run_id, machine_id, runtime_seconds);
+CREATE INDEX IF NOT EXISTS samples_timestamp ON samples (timestamp);
+
+CREATE TABLE IF NOT EXISTS summaries (
+    run_id TEXT NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    machine_id INTEGER NOT NULL REFERENCES machines (id),
+    {", ".join(f"{column} {SUMMARY_COLUMN_TYPES.get(column, 'REAL')}" for column in SUMMARY_COLUMNS)},
+    timings TEXT,
+    PRIMARY KEY (run_id, machine_id)
+);
+
+CREATE TABLE IF NOT EXISTS profiles (
+    run_id TEXT NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    machine_id INTEGER NOT NULL REFERENCES machines (id),
+    function TEXT NOT NULL,
+    calls INTEGER,
+    self_seconds REAL,
+    cumulative_seconds REAL,
+    PRIMARY KEY (run_id, machine_id, function)
+);
+
+CREATE TABLE IF NOT EXISTS cache (
+    key TEXT PRIMARY KEY,
+    run_id TEXT NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    machine_id INTEGER NOT NULL REFERENCES machines (id),
+    used_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cache_used_at ON cache (used_at);
+"""
+
+
+class ResultsStore:
+    """
+    Benchmark results in SQLite, one row per run, machine, sample and summary.
+
+    The database runs in WAL mode so the dashboard can read while a benchmark
+    writes. A single connection is shared between threads behind a lock.
+    """
+
+    def __init__(self, path=RESULTS_DB_PATH):
+        self.path = str(path)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(
+            self.path, check_same_thread=False, isolation_level=None
+        )
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("PRAGMA foreign_keys=ON")
+        self.connection.executescript(SCHEMA)
+        self._migrate()
+        self.machine_ids = {}
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+    def _migrate(self):
+        """
+        Adds the columns introduced after a database was created.
+        """
+        for table, added in ADDED_COLUMNS.items():
+            columns = {
+                row["name"]
+                for row in self.connection.execute(f"PRAGMA table_info({table})")
+            }
+            for column in added:
+                if column not in columns:
+                    column_type = (
+                        "TEXT"
+                        if table == "runs"
+                        else SUMMARY_COLUMN_TYPES.get(column, "REAL")
+                    )
+                    self.connection.execute(
+                        f"ALTER TABLE {table} ADD COLUMN {column} {column_type}"
+                    )
+
+    def _machine_id(self, name):
+        if name not in self.machine_ids:
+            self.connection.execute(
+                "INSERT OR IGNORE INTO machines (name) VALUES (?)", (name,)
+            )
+            self.machine_ids[name] = self.connection.execute(
+                "SELECT id FROM machines WHERE name = ?", (name,)
+            ).fetchone()[0]
+        return self.machine_ids[name]
+
+    def create_run(
+        self,
+        language=None,
+        entry_point=None,
+        source="cli",
+        run_id=None,
+        profile=None,
+        baseline=None,
+    ):
+        """
+        Starts a new run and returns its id. `profile` is the name of the
+        measurement profile the run used, and `baseline` the run or file it
+        was compared with.
+        """
+        run_id = run_id or uuid.uuid4().hex
+        with self.lock:
+            self.connection.execute(
+                "INSERT INTO runs (id, created_at, status, language, entry_point,"
+                " source, profile, baseline) VALUES (?, ?, 'running', ?, ?, ?, ?, ?)",
+                (run_id, time.time(), language, entry_point, source, profile, baseline),
+            )
+        return run_id
+
+    def finish_run(self, run_id, status="completed"):
+        with self.lock:
+            self.connection.execute(
+                "UPDATE runs SET status = ?, finished_at = ? WHERE id = ?",
+                (status, time.time(), run_id),
+            )
+
+    def add_samples(self, run_id, rows):
+        """
+        Inserts a batch of report rows, of any machines, in a single transaction.
+        """
+        placeholders = ", ".join("?" * (len(SAMPLE_COLUMNS) + 3))
+        with self.lock:
+            samples = [dict(zip(REPORT_HEADERS, row)) for row in rows]
+            values = [
+                (
+                    run_id,
+                    self._machine_id(sample["container_name"]),
+                    sample["timestamp"],
+                    *(sample[column] for column in SAMPLE_COLUMNS),
+                )
+                for sample in samples
+            ]
+            with self.connection:
+                self.connection.execute("BEGIN")
+                self.connection.executemany(
+                    f"INSERT INTO samples (run_id, machine_id, timestamp, "
+                    f"{', '.join(SAMPLE_COLUMNS)}) VALUES ({placeholders})",
+                    values,
+                )
+
+    def set_execution_time(self, run_id, machine_name, execution_time):
+        """
+        Sets the execution time on every sample of a machine in a run.
+        """
+        with self.lock:
+            machine_id = self._machine_id(machine_name)
+            with self.connection:
+                self.connection.execute("BEGIN")
+                self.connection.execute(
+                    "UPDATE samples SET code_execution_time_seconds = ? "
+                    "WHERE run_id = ? AND machine_id = ?",
+                    (
+                        (
+                            round(execution_time, 2)
+                            if execution_time is not None
+                            else None
+                        ),
+                        run_id,
+                        machine_id,
+                    ),
+                )
+
+    def add_summaries(self, run_id, summaries):
+        """
+        Stores the per-machine results returned by a benchmark.
+        """
+        placeholders = ", ".join("?" * (len(SUMMARY_COLUMNS) + 3))
+        with self.lock:
+            rows = [
+                (
+                    run_id,
+                    self._machine_id(summary["container"]),
+                    *(summary.get(column) for column in SUMMARY_COLUMNS),
+                    json.dumps(summary.get("timings", [])),
+                )
+                for summary in summaries
+            ]
+            with self.connection:
+                self.connection.execute("BEGIN")
+                self.connection.executemany(
+                    f"INSERT OR REPLACE INTO summaries (run_id, machine_id, "
+                    f"{', '.join(SUMMARY_COLUMNS)}, timings) VALUES ({placeholders})",
+                    rows,
+                )
+
+    def add_profile(self, run_id, machine_name, functions):
+        """
+        Stores the per-function stats of a machine's profiled runs.
+        """
+        with self.lock:
+            machine_id = self._machine_id(machine_name)
+            rows = [
+                (
+                    run_id,
+                    machine_id,
+                    function,
+                    stats["calls"],
+                    stats["self_seconds"],
+                    stats["cumulative_seconds"],
+                )
+                for function, stats in functions.items()
+            ]
+            with self.connection:
+                self.connection.execute("BEGIN")
+                self.connection.executemany(
+                    "INSERT OR REPLACE INTO profiles (run_id, machine_id, function, "
+                    "calls, self_seconds, cumulative_seconds) VALUES (?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+
+    def cached_run(self, key):
+        """
+        Returns the id of the run whose results a cache key points to, or None,
+        and marks the entry as used.
+        """
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT run_id FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self.connection.execute(
+                "UPDATE cache SET used_at = ? WHERE key = ?", (time.time(), key)
+            )
+        return row["run_id"]
+
+    def add_cache_entry(self, key, run_id, machine_name, limit):
+        """
+        Points a cache key at a machine's results in a run, and evicts the
+        least recently used entries beyond `limit`.
+        """
+        with self.lock:
+            machine_id = self._machine_id(machine_name)
+            with self.connection:
+                self.connection.execute("BEGIN")
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO cache (key, run_id, machine_id, used_at)"
+                    " VALUES (?, ?, ?, ?)",
+                    (key, run_id, machine_id, time.time()),
+                )
+                self.connection.execute(
+                    "DELETE FROM cache WHERE key NOT IN "
+                    "(SELECT key FROM cache ORDER BY used_at DESC LIMIT ?)",
+                    (limit,),
+                )
+
+    def clear_cache(self):
+        """
+        Forgets every cached result. Returns the number of entries removed.
+        """
+        with self.lock:
+            return self.connection.execute("DELETE FROM cache").rowcount
+
+    def copy_machine_results(self, source_run_id, run_id, machine_name):
+        """
+        Copies the samples and summary of a machine from an earlier run into a
+        run, so the run is complete without executing the machine again.
+        """
+        columns = ", ".join(SAMPLE_COLUMNS)
+        summary_columns = ", ".join(SUMMARY_COLUMNS)
+        with self.lock:
+            machine_id = self._machine_id(machine_name)
+            with self.connection:
+                self.connection.execute("BEGIN")
+                self.connection.execute(
+                    f"INSERT INTO samples (run_id, machine_id, timestamp, {columns}) "
+                    f"SELECT ?, machine_id, timestamp, {columns} FROM samples "
+                    "WHERE run_id = ? AND machine_id = ?",
+                    (run_id, source_run_id, machine_id),
+                )
+                self.connection.execute(
+                    f"INSERT OR REPLACE INTO summaries (run_id, machine_id, "
+                    f"{summary_columns}, timings) SELECT ?, machine_id, "
+                    f"{summary_columns}, timings FROM summaries "
+                    "WHERE run_id = ? AND machine_id = ?",
+                    (run_id, source_run_id, machine_id),
+                )
+
+    def runs(self, limit=20):
+        """
+        Lists the most recent runs.
+        """
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT * FROM runs ORDER BY created_at DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def run(self, run_id):
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT * FROM runs WHERE id = ?", (run_id,)
+            ).fetchone()
+        return dict(row) if row is not None else None
+
+    def samples(self, run_id, budget=None):
+        """
+        Returns a run's samples in report order, with the machine name as
+        `container_name`. With a `budget`, each machine's series is downsampled
+        to about that many points; all samples stay stored.
+        """
+        with self.lock:
+            rows = self.connection.execute(
+                f"SELECT samples.timestamp, machines.name AS container_name, "
+                f"{', '.join(f'samples.{column}' for column in SAMPLE_COLUMNS)} "
+                "FROM samples JOIN machines ON machines.id = samples.machine_id "
+                "WHERE samples.run_id = ? "
+                "ORDER BY samples.machine_id, samples.runtime_seconds",
+                (run_id,),
+            ).fetchall()
+        return downsample_by_machine([dict(row) for row in rows], budget)
+
+    def summaries(self, run_id):
+        """
+        Returns a run's per-machine results in the shape `format_table` expects.
+        """
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT machines.name AS container, summaries.* FROM summaries "
+                "JOIN machines ON machines.id = summaries.machine_id "
+                "WHERE summaries.run_id = ?",
+                (run_id,),
+            ).fetchall()
+        summaries = []
+        for row in rows:
+            summary = dict(row)
+            summary["timings"] = json.loads(summary["timings"] or "[]")
+            summary["success"] = summary["status"] == "Success"
+            summaries.append(summary)
+        return summaries
+
+    def profiles(self, run_id):
+        """
+        Returns a run's per-function stats by machine name, in the shape
+        `collect_profiles` returns them.
+        """
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT machines.name AS machine, profiles.function, profiles.calls, "
+                "profiles.self_seconds, profiles.cumulative_seconds FROM profiles "
+                "JOIN machines ON machines.id = profiles.machine_id "
+                "WHERE profiles.run_id = ?",
+                (run_id,),
+            ).fetchall()
+        profiles = {}
+        for row in rows:
+            profiles.setdefault(row["machine"], {})[row["function"]] = {
+                "calls": row["calls"],
+                "self_seconds": row["self_seconds"],
+                "cumulative_seconds": row["cumulative_seconds"],
+            }
+        return profiles
+
+    def export_csv(self, run_id, output_file, budget=SERIES_POINT_BUDGET):
+        """
+        Writes a run's samples in the tin-report.csv format, with at most about
+        `budget` points per machine (0 or None writes every sample).
+        """
+        with open(output_file, mode="w", newline="") as file:
+            writer = csv.DictWriter(file, fieldnames=REPORT_HEADERS)
+            writer.writeheader()
+            writer.writerows(self.samples(run_id, budget))
+
+    def export_summary_csv(self, run_id, output_file):
+        """
+        Writes a run's per-machine summary in the tin-summary.csv format.
+        """
+        write_summary_csv(output_file, self.summaries(run_id))
+
+    def export_json(self, run_id, output_file):
+        """
+        Writes a run's per-machine results with their timings as JSON, in the
+        format `tin benchmark --baseline` reads.
+        """
+        with open(output_file, "w") as file:
+            json.dump(
+                {"run_id": run_id, "machines": self.summaries(run_id)}, file, indent=2
+            )
+
+    def export_parquet(self, run_id, output_file, budget=SERIES_POINT_BUDGET):
+        """
+        Writes a run's samples as Parquet, downsampled like `export_csv`.
+        Needs pandas with pyarrow or fastparquet.
+        """
+        import pandas as pd
+
+        pd.DataFrame(self.samples(run_id, budget), columns=REPORT_HEADERS).to_parquet(
+            output_file, index=False
+        )
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def default_store():
+    """
+    Returns the store at RESULTS_DB_PATH, opening it on first use.
+    """
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = ResultsStore(RESULTS_DB_PATH)
+        return _default_store
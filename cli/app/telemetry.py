@@ -0,0 +1,194 @@
+import re
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client.core import GaugeMetricFamily
+
+# Content type of the Prometheus text exposition format
+CONTENT_TYPE = CONTENT_TYPE_LATEST
+
+# Upper bounds (in seconds) of the buckets of short operations, such as Docker
+# API requests and sampler lag
+FAST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Upper bounds (in seconds) of the buckets of benchmark phases, from creating a
+# container to building a runtime image
+PHASE_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+
+class SampleGauges:
+    """
+    Gauges of the latest sample of each machine being sampled, by run, so
+    concurrent runs of the same machine keep series of their own. Sampling only
+    keeps a reference to the sample; the gauges are read from it on a scrape.
+    """
+
+    def __init__(self, gauges):
+        # (sample column, metric name, documentation) of each gauge
+        self.gauges = gauges
+        self.samples = {}
+
+    def update(self, machine, run, sample):
+        self.samples[(machine, run)] = sample
+
+    def remove(self, machine, run):
+        self.samples.pop((machine, run), None)
+
+    def collect(self):
+        samples = sorted(dict(self.samples).items())
+        for column, name, documentation in self.gauges:
+            family = GaugeMetricFamily(name, documentation, labels=["machine", "run"])
+            for labels, sample in samples:
+                family.add_metric(labels, sample[column])
+            yield family
+
+
+# Shared by the CLI and the API; served by the API at /metrics
+registry = CollectorRegistry()
+
+PHASE_DURATION = Histogram(
+    "tin_phase_duration_seconds",
+    "Duration of each phase of running code on a machine",
+    ["phase"],
+    buckets=PHASE_BUCKETS,
+    registry=registry,
+)
+DOCKER_REQUEST_DURATION = Histogram(
+    "tin_docker_request_duration_seconds",
+    "Time until the Docker daemon answered an API request",
+    ["method", "endpoint"],
+    buckets=FAST_BUCKETS,
+    registry=registry,
+)
+DOCKER_REQUEST_ERRORS = Counter(
+    "tin_docker_request_errors_total",
+    "Docker API requests answered with an error status",
+    ["method", "endpoint"],
+    registry=registry,
+)
+SAMPLER_LAG = Histogram(
+    "tin_sampler_lag_seconds",
+    "Time between two samples of a container beyond the sampling interval",
+    ["sampler"],
+    buckets=FAST_BUCKETS,
+    registry=registry,
+)
+SAMPLE_PROCESSING = Histogram(
+    "tin_sample_processing_seconds",
+    "Time the sampler spent decoding and recording a sample",
+    ["sampler"],
+    buckets=FAST_BUCKETS,
+    registry=registry,
+)
+JOBS_QUEUED = Gauge("tin_jobs_queued", "Jobs waiting for a worker", registry=registry)
+JOBS_RUNNING = Gauge("tin_jobs_running", "Jobs running", registry=registry)
+JOBS_FINISHED = Counter(
+    "tin_jobs_finished_total",
+    "Jobs finished, by final status",
+    ["status"],
+    registry=registry,
+)
+WORKER_TASKS_QUEUED = Gauge(
+    "tin_worker_tasks_queued",
+    "Machine tasks waiting for a remote worker",
+    registry=registry,
+)
+WORKERS = Gauge("tin_workers", "Live remote workers", registry=registry)
+
+# Live resource usage of the containers being sampled, from the latest sample
+CONTAINER_GAUGES = SampleGauges(
+    [
+        ("cpu_usage_percentage", "tin_container_cpu_percent", "CPU usage"),
+        ("memory_usage_mb", "tin_container_memory_mb", "Memory usage"),
+        ("network_received_mb", "tin_container_network_received_mb", "Data received"),
+        ("network_sent_mb", "tin_container_network_sent_mb", "Data sent"),
+        ("disk_read_mb", "tin_container_disk_read_mb", "Data read from disk"),
+        ("disk_write_mb", "tin_container_disk_write_mb", "Data written to disk"),
+        ("disk_read_iops", "tin_container_disk_read_iops", "Disk reads per second"),
+        ("disk_write_iops", "tin_container_disk_write_iops", "Disk writes per second"),
+    ]
+)
+registry.register(CONTAINER_GAUGES)
+
+
+def render_metrics():
+    """
+    Returns every metric of the registry in the Prometheus text exposition format.
+    """
+    return generate_latest(registry)
+
+
+@contextmanager
+def timed_phase(phase):
+    """
+    Records how long the body takes as a phase duration, even when it fails.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        PHASE_DURATION.labels(phase=phase).observe(time.perf_counter() - started)
+
+
+def observe_sample(machine, run, sample, sampler, lag, processing_seconds):
+    """
+    Updates the live gauges of a machine in a run with its latest sample. `lag`
+    is the time since the previous sample beyond the interval, or None for the
+    first.
+    """
+    SAMPLE_PROCESSING.labels(sampler=sampler).observe(processing_seconds)
+    if lag is not None:
+        SAMPLER_LAG.labels(sampler=sampler).observe(max(lag, 0.0))
+    CONTAINER_GAUGES.update(machine, run, sample)
+
+
+def forget_machine(machine, run):
+    """
+    Drops the live gauges of a machine in a run once it is no longer sampled.
+    """
+    CONTAINER_GAUGES.remove(machine, run)
+
+
+def docker_endpoint(method, url):
+    """
+    Reduces a Docker API URL to its endpoint, without the API version and with
+    ids and image names replaced by {id}, so it is usable as a label.
+    """
+    parts = [part for part in urlparse(url).path.split("/") if part]
+    if parts and re.fullmatch(r"v\d+(\.\d+)?", parts[0]):
+        parts = parts[1:]
+    if len(parts) >= 3:
+        return f"/{parts[0]}/{{id}}/{parts[-1]}"
+    if len(parts) == 2 and method == "DELETE":
+        return f"/{parts[0]}/{{id}}"
+    return "/" + "/".join(parts)
+
+
+def _record_docker_response(response, *args, **kwargs):
+    method = response.request.method
+    endpoint = docker_endpoint(method, response.request.url)
+    DOCKER_REQUEST_DURATION.labels(method=method, endpoint=endpoint).observe(
+        response.elapsed.total_seconds()
+    )
+    if response.status_code >= 400:
+        DOCKER_REQUEST_ERRORS.labels(method=method, endpoint=endpoint).inc()
+
+
+def instrument_docker(client):
+    """
+    Times every request of a Docker client. For streams, such as stats, the
+    time until the daemon sent the response headers is recorded.
+    """
+    hooks = getattr(getattr(client, "api", None), "hooks", None)
+    if hooks is not None:
+        hooks.setdefault("response", []).append(_record_docker_response)
+    return client
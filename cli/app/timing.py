@@ -0,0 +1,133 @@
+import csv
+import math
+import os
+import statistics
+
+from app.constants import SUMMARY_FILE_NAME
+
+# Two-sided 95% Student's t critical values by degrees of freedom
+T_CRITICAL_95 = {
+    1: 12.706,
+    2: 4.303,
+    3: 3.182,
+    4: 2.776,
+    5: 2.571,
+    6: 2.447,
+    7: 2.365,
+    8: 2.306,
+    9: 2.262,
+    10: 2.228,
+    12: 2.179,
+    15: 2.131,
+    20: 2.086,
+    25: 2.060,
+    30: 2.042,
+    40: 2.021,
+    60: 2.000,
+    120: 1.980,
+}
+
+# Columns written to the per-machine summary
+SUMMARY_HEADERS = [
+    "container_name",
+    "runs",
+    "mean_seconds",
+    "median_seconds",
+    "p95_seconds",
+    "stddev_seconds",
+    "ci_low_seconds",
+    "ci_high_seconds",
+    "exit_code",
+]
+
+
+def t_critical(degrees_of_freedom):
+    """
+    Returns the 95% t critical value, rounding the degrees of freedom down to the
+    nearest tabulated value.
+    """
+    if degrees_of_freedom < 1:
+        return 0
+    eligible = [df for df in T_CRITICAL_95 if df <= degrees_of_freedom]
+    if degrees_of_freedom > max(T_CRITICAL_95):
+        return 1.960
+    return T_CRITICAL_95[max(eligible)]
+
+
+def percentile(values, fraction):
+    """
+    Linear-interpolated percentile of a list of values.
+    """
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    position = (len(ordered) - 1) * fraction
+    lower = math.floor(position)
+    upper = math.ceil(position)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize_timings(timings):
+    """
+    Summarizes repeated run timings with mean, median, p95, standard deviation
+    and a 95% confidence interval for the mean.
+    """
+    if not timings:
+        return {
+            "runs": 0,
+            "mean": None,
+            "median": None,
+            "p95": None,
+            "stddev": None,
+            "ci_low": None,
+            "ci_high": None,
+        }
+
+    mean = statistics.fmean(timings)
+    stddev = statistics.stdev(timings) if len(timings) > 1 else 0.0
+    half_width = t_critical(len(timings) - 1) * stddev / math.sqrt(len(timings))
+
+    return {
+        "runs": len(timings),
+        "mean": mean,
+        "median": statistics.median(timings),
+        "p95": percentile(timings, 0.95),
+        "stddev": stddev,
+        "ci_low": mean - half_width,
+        "ci_high": mean + half_width,
+    }
+
+
+def summary_file_for(output_file):
+    """
+    Returns the summary path that sits next to a report.
+    """
+    return os.path.join(os.path.dirname(output_file), SUMMARY_FILE_NAME)
+
+
+def write_summary_csv(output_file, summaries):
+    """
+    Writes one summary row per machine, replacing any previous summary.
+    """
+    with open(output_file, mode="w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(SUMMARY_HEADERS)
+        for summary in summaries:
+            writer.writerow(
+                [
+                    summary["container"],
+                    summary["runs"],
+                    *(
+                        round(summary[key], 6) if summary[key] is not None else None
+                        for key in (
+                            "mean",
+                            "median",
+                            "p95",
+                            "stddev",
+                            "ci_low",
+                            "ci_high",
+                        )
+                    ),
+                    summary["exit_code"],
+                ]
+            )
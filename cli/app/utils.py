@@ -1,18 +1,35 @@
-import csv
 import os
 import subprocess
+import threading
 import time
 import webbrowser
 from pathlib import Path
 
-import docker
 import toml
-from colorama import Fore, init
+from app.cache import CACHE_SIZE, cache_key, hash_directory
+from app.constants import DIFF_FILE_NAME, PROFILES_DIRECTORY_NAME, REGRESSION_THRESHOLD
+from app.docker_client import get_client
+from app.execution import TimedExecProcess, build_command
+from app.images import ensure_runtime_image
+from app.pipeline import ReportWriter
+from app.pool import ContainerPool, pool
+from app.profiles import CpusetScheduler, pinned
+from app.profiling import (
+    collect_profiles,
+    hot_functions,
+    prepare_profile_directory,
+    profile_diff,
+    profiled_command,
+)
+from app.regression import IMPROVED, REGRESSED, compare_runs, write_diff
+from app.runner import run_concurrently
+from app.sampler import collect_stats_to_csv
+from app.series import AGGREGATES, RunningAggregates
+from app.store import default_store
+from app.timing import summarize_timings, summary_file_for, write_summary_csv
 from rich.console import Console
-from tabulate import tabulate
 
 console = Console()
-client = docker.from_env()
 
 
 def read_config(config_path: Path):
@@ -27,81 +44,12 @@ def read_config(config_path: Path):
         raise
 
 
-def collect_stats_to_csv(
-    container, output_file, runtime_limit=500, code_execution_time=None
-):
-    """
-    Collects stats from a Docker container and writes them to a CSV file.
-    """
-    start_time = time.time()
-    write_headers = not os.path.exists(output_file)
-
-    with open(output_file, mode="a", newline="") as file:
-        writer = csv.writer(file)
-        if write_headers:
-            writer.writerow(
-                [
-                    "timestamp",
-                    "container_name",
-                    "cpu_usage_percentage",
-                    "memory_usage_mb",
-                    "network_received_mb",
-                    "network_sent_mb",
-                    "disk_read_mb",
-                    "disk_write_mb",
-                    "runtime_seconds",
-                    "code_execution_time_seconds",
-                ]
-            )
-
-        while True:
-            stats = container.stats(stream=False)
-            cpu_usage_ns = stats["cpu_stats"]["cpu_usage"]["total_usage"]
-            system_cpu_usage_ns = stats["cpu_stats"].get("system_cpu_usage", 0)
-            cpu_percentage = (
-                (cpu_usage_ns / system_cpu_usage_ns) * 100
-                if system_cpu_usage_ns > 0
-                else 0
-            )
-            memory_usage_mb = stats["memory_stats"].get("usage", 0) / (1024 * 1024)
-            network_stats = stats["networks"]
-            network_in = sum(network["rx_bytes"] for network in network_stats.values())
-            network_out = sum(network["tx_bytes"] for network in network_stats.values())
-            disk_read_mb = stats.get("storage_stats", {}).get("read", 0) / (1024 * 1024)
-            disk_write_mb = stats.get("storage_stats", {}).get("write", 0) / (
-                1024 * 1024
-            )
-            runtime_seconds = time.time() - start_time
-            timestamp = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime())
-
-            writer.writerow(
-                [
-                    timestamp,
-                    container.name,
-                    round(cpu_percentage, 2),
-                    round(memory_usage_mb, 2),
-                    round(network_in / (1024 * 1024), 2),
-                    round(network_out / (1024 * 1024), 2),
-                    round(disk_read_mb, 2),
-                    round(disk_write_mb, 2),
-                    round(runtime_seconds, 2),
-                    round(code_execution_time, 2) if code_execution_time else None,
-                ]
-            )
-            file.flush()
-
-            if runtime_seconds >= runtime_limit or container.status != "running":
-                break
-
-            time.sleep(1)
-
-
 def stop_containers_on_port(port):
     """
     Stops any containers that are using the specified port.
     """
     try:
-        containers = client.containers.list(all=True)
+        containers = get_client().containers.list(all=True)
 
         for container in containers:
             container_info = container.attrs
@@ -147,7 +95,7 @@ def run_ui():
         time.sleep(5)
         stop_containers_on_port(3000)
 
-        container = client.containers.run(
+        container = get_client().containers.run(
             "tin-ui",  # Replace with your UI image name
             name="tin-ui",
             ports={"3000/tcp": 3000},
@@ -169,11 +117,150 @@ def run_ui():
         console.print(f"[bold red]Error opening browser: {e}[/bold red]")
 
 
+def execute_and_collect_stats(
+    lease,
+    language,
+    file,
+    output_file,
+    timed_section,
+    sample_interval,
+    sampler,
+    runs,
+    warmup,
+    writer=None,
+    cancel_event=None,
+    scheduler=None,
+    profile_directory=None,
+):
+    """
+    Executes code in a single leased container and collects its stats.
+    With a `scheduler`, the container is pinned to CPUs of its own meanwhile.
+    With a `profile_directory`, the code runs under the language's profiler and
+    the raw profiles are copied there, under the machine's name.
+    """
+    container = lease.container
+    name = lease.machine_name
+    code_execution_time = None
+    exit_code = None
+    success = True
+    result = {**RunningAggregates().to_dict(), "sampler_seconds": 0}
+    process = None
+    functions = None
+
+    if profile_directory is not None:
+        command = profiled_command(language, file)
+    else:
+        command = build_command(language, file)
+
+    with pinned(scheduler, container), timed_section():
+        try:
+            if profile_directory is not None:
+                prepare_profile_directory(container)
+            process = TimedExecProcess(
+                get_client(),
+                container,
+                command,
+                runs=runs,
+                warmup=warmup,
+            )
+        except Exception as e:
+            console.print(
+                f"❌ [bold red]Error executing code in '{name}': {e}[/bold red]"
+            )
+            success = False
+
+        if process is not None:
+            try:
+                result = collect_stats_to_csv(
+                    container,
+                    output_file,
+                    process,
+                    interval=sample_interval,
+                    sampler=sampler,
+                    name=name,
+                    writer=writer,
+                    cancel_event=cancel_event,
+                    reused=lease.reused,
+                )
+                code_execution_time = result["execution_time"]
+                exit_code = result["exit_code"]
+                if exit_code == 0:
+                    console.print(f"✅ [green]Executed code in '{name}'.[/green]")
+                else:
+                    console.print(
+                        f"❌ [bold red]Code in '{name}' exited with code {exit_code}.[/bold red]"
+                    )
+                    success = False
+            except Exception as e:
+                console.print(
+                    f"❌ [bold red]Error collecting stats for '{name}': {e}[/bold red]"
+                )
+                success = False
+
+    if profile_directory is not None and success:
+        try:
+            functions = collect_profiles(
+                container, language, os.path.join(profile_directory, name)
+            )
+        except Exception as e:
+            console.print(
+                f"❌ [bold red]Error collecting the profile of '{name}': {e}[/bold red]"
+            )
+
+    timings = process.timings if process is not None and success else []
+    return {
+        "container": name,
+        "status": "Success" if success else "Failed",
+        "execution_time": code_execution_time if success else None,
+        "exit_code": exit_code,
+        "success": success,
+        "timings": timings,
+        **{name: result[name] for name in AGGREGATES},
+        "sampler_seconds": result["sampler_seconds"],
+        "functions": functions,
+        **summarize_timings(timings),
+    }
+
+
 def run_docker_containers_and_collect_stats(
-    machines, language, directory, file, output_file
+    machines,
+    language,
+    directory,
+    file,
+    output_file,
+    parallel=1,
+    isolated=False,
+    sample_interval=None,
+    sampler="auto",
+    runs=1,
+    warmup=0,
+    use_pool=True,
+    store=None,
+    profile=None,
+    cpu_profile=False,
+    baseline=None,
+    threshold=REGRESSION_THRESHOLD,
+    force=False,
 ):
     """
     Runs Docker containers for the specified machines, executes code, and collects stats.
+    Up to `parallel` machines are executed at the same time; `isolated` only lets one
+    machine run its timed section at a time. Each machine runs the code `warmup`
+    times untimed, then `runs` timed times. With `use_pool`, warm containers are
+    reused from earlier runs instead of being created and removed every time.
+    Containers get the resource limits of the measurement `profile`, and when it
+    sets `cpus`, every running machine is pinned to CPUs of its own.
+    With `cpu_profile`, the code runs under cProfile or `node --cpu-prof`, and
+    the hot functions of every machine are stored with the run and compared.
+    With a `baseline` (its `name` and the `timings` from `load_baseline`), the
+    timings of every machine are compared with the baseline's and the diff is
+    written next to `output_file`. Each result then has a `comparison`.
+    Machines whose code, runtime image, profile and settings did not change
+    since a successful run reuse that run's results instead of executing again,
+    unless `force` is set. Profiled runs always execute.
+    Results are saved as a new run in the results store, and the run is exported
+    to `output_file` and its summary next to it. On Ctrl-C, the samples collected
+    so far are still saved.
     """
     absolute_directory_path = os.path.abspath(directory)
 
@@ -185,140 +272,487 @@ def run_docker_containers_and_collect_stats(
             f"The directory {absolute_directory_path} does not exist."
         )
 
-    containers = []
-    stats = []
+    store = store or default_store()
+    cache_keys, cached_runs, images = _look_up_cache(
+        store,
+        machines,
+        absolute_directory_path,
+        language,
+        file,
+        profile,
+        force,
+        runs=runs,
+        warmup=warmup,
+        sampler=sampler,
+        sample_interval=sample_interval,
+        # Machines measured side by side compete for the host, so their
+        # results differ from those of machines measured alone
+        parallel=parallel,
+        isolated=isolated,
+        cpu_profile=cpu_profile,
+    )
+    machines_to_run = [m for m in machines if m["name"] not in cached_runs]
+
+    scheduler = CpusetScheduler.for_profile(get_client(), profile)
+    if scheduler is not None and scheduler.slots < min(parallel, len(machines_to_run)):
+        console.print(
+            f"⚠️ [yellow]Only {scheduler.slots} machines fit on their own CPUs, "
+            f"the others wait for a turn.[/yellow]"
+        )
+
+    leases = []
+    unstarted = []
+    lease_pool = pool if use_pool else ContainerPool(max_size=0)
 
     console.print("🔧 [bold blue]Setting up containers...[/bold blue]")
-    for machine in machines:
+    for machine in machines_to_run:
         try:
-            command = None
-
-            if machine["name"].startswith("AmazonLinux2"):
-                command = "bash /scripts/amazon_install.sh"
-            elif machine["name"].startswith("Oracle"):
-                command = "bash /scripts/oracle_install.sh"
-            else:
-                command = "bash /scripts/linux_install.sh"
-
-            container = client.containers.run(
-                machine["image"],
-                name=machine["name"],
-                command=command,
-                volumes={
-                    absolute_directory_path: {"bind": "/app", "mode": "rw"},
-                    os.path.join(os.path.dirname(__file__), "scripts"): {
-                        "bind": "/scripts",
-                        "mode": "rw",
-                    },
-                },
-                working_dir="/app",
-                stdin_open=True,
-                tty=True,
-                detach=True,
+            lease = lease_pool.acquire(
+                machine,
+                absolute_directory_path,
+                image=images.get(machine["name"]),
+                profile=profile,
             )
-            containers.append(container)
-            console.print(f"✅ [green]Started container '{container.name}'.[/green]")
+            leases.append(lease)
+            if lease.pooled:
+                console.print(
+                    f"✅ [green]Leased container '{lease.container.name}' for '{lease.machine_name}'.[/green]"
+                )
+            else:
+                console.print(
+                    f"✅ [green]Started container '{lease.container.name}' for '{lease.machine_name}'.[/green]"
+                )
         except Exception as e:
             console.print(
                 f"❌ [bold red]Error starting container for '{machine['name']}': {e}[/bold red]"
             )
-
-    console.print("⚙️ [bold blue]Executing code in containers...[/bold blue]")
-    for container in containers:
-        code_execution_time = None
-        success = True
-        try:
-            start_exec_time = time.time()
-            if language == "python":
-                container.exec_run(f"python3 {file}", stdout=True, stderr=True)
-            elif language == "javascript":
-                container.exec_run(f"node {file}", stdout=True, stderr=True)
-            code_execution_time = time.time() - start_exec_time
-            console.print(f"✅ [green]Executed code in '{container.name}'.[/green]")
-        except Exception as e:
+            unstarted.append(machine["name"])
+
+    run_id = None
+    writer = None
+    writer_stats = None
+    status = "failed"
+    # Leases are released however the run ends, so their containers do not
+    # stay leased and exhaust the pool for later runs. The writer is closed and
+    # the run finished the same way, so it does not stay "running".
+    try:
+        run_id = store.create_run(
+            language=language,
+            entry_point=file,
+            profile=profile["name"] if profile else None,
+            baseline=baseline["name"] if baseline else None,
+        )
+        for name, source_run_id in cached_runs.items():
+            store.copy_machine_results(source_run_id, run_id, name)
             console.print(
-                f"❌ [bold red]Error executing code in '{container.name}': {e}[/bold red]"
+                f"♻️ [green]Reusing the results of '{name}' from run '{source_run_id}'.[/green]"
             )
-            success = False
+        writer = ReportWriter(store, run_id).start()
+        cancel_event = threading.Event()
+        profile_directory = (
+            os.path.join(
+                os.path.dirname(os.path.abspath(output_file)),
+                PROFILES_DIRECTORY_NAME,
+                run_id,
+            )
+            if cpu_profile
+            else None
+        )
 
+        console.print("⚙️ [bold blue]Executing code in containers...[/bold blue]")
         try:
-            collect_stats_to_csv(
-                container, output_file, code_execution_time=code_execution_time
+            stats = run_concurrently(
+                leases,
+                lambda lease, timed_section: execute_and_collect_stats(
+                    lease,
+                    language,
+                    file,
+                    output_file,
+                    timed_section,
+                    sample_interval,
+                    sampler,
+                    runs,
+                    warmup,
+                    writer,
+                    cancel_event,
+                    scheduler,
+                    profile_directory,
+                ),
+                parallel=parallel,
+                isolated=isolated,
+                cancel_event=cancel_event,
             )
-        except Exception as e:
+        except KeyboardInterrupt:
             console.print(
-                f"❌ [bold red]Error collecting stats for '{container.name}': {e}[/bold red]"
+                "🛑 [bold yellow]Interrupted, saving the samples collected so far...[/bold yellow]"
             )
-            success = False
+            status = "interrupted"
+            raise
+        writer_stats = writer.close()
+        stats.extend(_unstarted_result(name) for name in unstarted)
+
+        store.add_summaries(run_id, stats)
+        for result in stats:
+            if result["functions"]:
+                store.add_profile(run_id, result["container"], result["functions"])
+            if result["success"] and result["container"] in cache_keys:
+                store.add_cache_entry(
+                    cache_keys[result["container"]],
+                    run_id,
+                    result["container"],
+                    CACHE_SIZE,
+                )
+        stats = _with_cached_results(store, run_id, machines, stats, cached_runs)
+        if all(result["success"] for result in stats):
+            status = "completed"
+        store.export_csv(run_id, output_file)
+        write_summary_csv(summary_file_for(output_file), stats)
+        console.print(f"📁 [bold blue]Saved results as run '{run_id}'.[/bold blue]")
+
+        console.print("🚀 [bold blue]Docker Execution Summary[/bold blue]")
+        format_table(stats)
+        print_sampler_overhead(stats, writer_stats)
+        if cpu_profile:
+            profiles = store.profiles(run_id)
+            print_hot_functions(profiles)
+            print_profile_diff(profiles)
+            console.print(
+                f"📁 [dim]Raw profiles saved in {profile_directory}. Timings of "
+                "profiled runs include the profiler's overhead.[/dim]"
+            )
+        if baseline is not None:
+            comparisons = compare_runs(baseline["timings"], stats, threshold)
+            for result, comparison in zip(stats, comparisons):
+                result["comparison"] = comparison
+            diff_file = os.path.join(
+                os.path.dirname(os.path.abspath(output_file)), DIFF_FILE_NAME
+            )
+            write_diff(diff_file, baseline["name"], run_id, comparisons, threshold)
+            print_comparison(baseline["name"], comparisons)
+            console.print(f"📁 [dim]Saved the comparison in {diff_file}.[/dim]")
+        return stats
+    finally:
+        try:
+            if writer is not None and writer_stats is None:
+                _close_writer(writer)
+            if run_id is not None:
+                store.finish_run(run_id, status)
+        finally:
+            release_leases(lease_pool, leases)
+
 
-        stats.append(
-            {
-                "container": container.name,
-                "status": "Success" if success else "Failed",
-                "execution_time": code_execution_time if success else None,
-                "success": success,
+def _close_writer(writer):
+    """
+    Saves the samples still queued of a run that ended early, without hiding
+    the error that ended it.
+    """
+    try:
+        writer.close()
+    except Exception as e:
+        console.print(f"❌ [bold red]Error saving the samples: {e}[/bold red]")
+
+
+def _look_up_cache(
+    store,
+    machines,
+    directory,
+    language,
+    file,
+    profile,
+    force,
+    cpu_profile=False,
+    **settings,
+):
+    """
+    Computes the cache key of every machine and finds the runs whose results can
+    be reused. Returns the keys and the cached run ids by machine name, and the
+    runtime images that were resolved on the way.
+    """
+    cache_keys, cached_runs, images = {}, {}, {}
+    if cpu_profile:
+        return cache_keys, cached_runs, images
+
+    client = get_client()
+    code_hash = hash_directory(directory)
+    for machine in machines:
+        try:
+            image = ensure_runtime_image(client, machine)
+            image_id = client.images.get(image).id
+        except Exception:
+            # Reported when the machine's container cannot be started
+            continue
+        images[machine["name"]] = image
+        key = cache_key(code_hash, file, language, image_id, profile, **settings)
+        cache_keys[machine["name"]] = key
+        source_run_id = None if force else store.cached_run(key)
+        if source_run_id is not None:
+            cached_runs[machine["name"]] = source_run_id
+    return cache_keys, cached_runs, images
+
+
+def _unstarted_result(name):
+    """
+    The result of a machine whose container could not be started.
+    """
+    return {
+        "container": name,
+        "status": "Failed",
+        "execution_time": None,
+        "exit_code": None,
+        "success": False,
+        "timings": [],
+        **RunningAggregates().to_dict(),
+        "sampler_seconds": 0,
+        "functions": None,
+        **summarize_timings([]),
+    }
+
+
+def _with_cached_results(store, run_id, machines, stats, cached_runs):
+    """
+    Adds the results copied from the cache to those of the executed machines,
+    in the order of `machines`.
+    """
+    results = {result["container"]: result for result in stats}
+    for summary in store.summaries(run_id):
+        if summary["container"] in cached_runs:
+            results[summary["container"]] = {
+                **summary,
+                "execution_time": None,
+                "samples": 0,
+                "sampler_seconds": 0,
+                "functions": None,
+                "cached": True,
             }
-        )
+    return [results[m["name"]] for m in machines if m["name"] in results]
 
-    console.print("🚀 [bold blue]Docker Execution Summary[/bold blue]")
-    format_table()
 
+def print_sampler_overhead(results, writer_stats):
+    """
+    Prints how much time sampling and writing the report took.
+    """
+    samples = sum(result["samples"] for result in results)
+    sampler_seconds = sum(result["sampler_seconds"] for result in results)
+    per_sample = sampler_seconds / samples * 1e6 if samples else 0
+    console.print(
+        f"📊 [dim]Sampler: {samples} samples in {sampler_seconds * 1000:.1f} ms "
+        f"({per_sample:.0f} µs/sample). Writer: {writer_stats['rows']} rows in "
+        f"{writer_stats['batches']} batches, {writer_stats['write_seconds'] * 1000:.1f} ms "
+        f"writing, {writer_stats['blocked_seconds'] * 1000:.1f} ms blocked, "
+        f"max queue depth {writer_stats['max_queue_depth']}.[/dim]"
+    )
+
+
+def release_leases(lease_pool, leases):
+    """
+    Returns leased containers to the pool, or removes them.
+    """
     console.print("🧹 [bold blue]Cleaning up containers...[/bold blue]")
-    for container in containers:
+    for lease in leases:
         try:
-            container.stop()
-            container.remove()
-            console.print(f"🗑️ [yellow]Stopped and removed '{container.name}'.[/yellow]")
+            lease_pool.release(lease)
+            if lease.pooled:
+                console.print(
+                    f"♻️ [yellow]Returned '{lease.container.name}' to the pool.[/yellow]"
+                )
+            else:
+                console.print(
+                    f"🗑️ [yellow]Stopped and removed '{lease.container.name}'.[/yellow]"
+                )
         except Exception as e:
             console.print(
-                f"❌ [bold red]Error removing container '{container.name}': {e}[/bold red]"
+                f"❌ [bold red]Error releasing container '{lease.container.name}': {e}[/bold red]"
             )
 
 
-def format_table():
+def _error_bar(mean, half_width, slowest, width=20):
     """
-    Formats and prints a summary table from the collected CSV data.
+    Draws a bar proportional to the mean with the half-width of its 95%
+    confidence interval.
     """
+    filled = round(mean / slowest * width) if slowest else 0
+    return "█" * filled + f" ±{half_width:.4f}"
+
+
+def format_table(results):
+    """
+    Prints the machines ranked by median execution time, with error bars of
+    the mean.
+    """
+    from colorama import Fore, init
+    from tabulate import tabulate
+
     init(autoreset=True)
-    csv_file = "tin-report.csv"
-    rows = []
 
-    with open(csv_file, newline="") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            rows.append(row)
+    ranked = sorted(
+        results,
+        key=lambda result: (
+            result["median"] is None,
+            result["median"] if result["median"] is not None else 0,
+        ),
+    )
+    slowest = max((r["mean"] for r in ranked if r["mean"] is not None), default=0)
 
     headers = [
-        "Timestamp",
+        "Rank",
         "Container",
-        "CPU (%)",
-        "Memory (MB)",
-        "Network Received (MB)",
-        "Network Sent (MB)",
-        "Disk Read (MB)",
-        "Disk Write (MB)",
-        "Runtime (s)",
-        "Execution Time (s)",
+        "Median (s)",
+        "Mean (s)",
+        "p95 (s)",
+        "Stddev (s)",
+        "Runs",
+        "Mean ± 95% CI",
+        "Peak CPU (%)",
+        "Peak Memory (MB)",
+        "Status",
     ]
 
+    table_data = []
+    for rank, result in enumerate(ranked, start=1):
+        if result["median"] is None:
+            table_data.append(
+                [
+                    Fore.RED + "-",
+                    Fore.WHITE + result["container"],
+                    *[Fore.RED + "-"] * 8,
+                    Fore.RED + result["status"],
+                ]
+            )
+            continue
+
+        half_width = (result["ci_high"] - result["ci_low"]) / 2
+        table_data.append(
+            [
+                (Fore.GREEN if rank == 1 else Fore.WHITE) + str(rank),
+                Fore.WHITE + result["container"],
+                Fore.CYAN + f"{result['median']:.4f}",
+                Fore.WHITE + f"{result['mean']:.4f}",
+                Fore.WHITE + f"{result['p95']:.4f}",
+                Fore.WHITE + f"{result['stddev']:.4f}",
+                Fore.WHITE + str(result["runs"]),
+                Fore.YELLOW + _error_bar(result["mean"], half_width, slowest),
+                (Fore.RED if result["peak_cpu"] > 50 else Fore.GREEN)
+                + f"{result['peak_cpu']:.2f}",
+                (Fore.RED if result["peak_memory_mb"] > 100 else Fore.GREEN)
+                + f"{result['peak_memory_mb']:.2f}",
+                (Fore.GREEN if result["success"] else Fore.RED) + result["status"],
+            ]
+        )
+
+    print(tabulate(table_data, headers=headers, tablefmt="fancy_grid"))
+
+
+def print_hot_functions(profiles, limit=10):
+    """
+    Prints the functions with the most self time on every machine.
+    """
+    from tabulate import tabulate
+
+    for machine, functions in sorted(profiles.items()):
+        total = sum(stats["self_seconds"] for stats in functions.values())
+        console.print(f"🔥 [bold blue]Hot functions on '{machine}'[/bold blue]")
+        table_data = [
+            [
+                function,
+                stats["calls"] if stats["calls"] is not None else "-",
+                f"{stats['self_seconds']:.4f}",
+                f"{stats['self_seconds'] / total * 100:.1f}" if total else "-",
+                f"{stats['cumulative_seconds']:.4f}",
+            ]
+            for function, stats in hot_functions(functions, limit)
+        ]
+        print(
+            tabulate(
+                table_data,
+                headers=["Function", "Calls", "Self (s)", "Self (%)", "Cumulative (s)"],
+                tablefmt="fancy_grid",
+            )
+        )
+
+
+def print_profile_diff(profiles, baseline=None, limit=5):
+    """
+    Prints which functions got slower on which machine, compared with the
+    baseline machine (by default the fastest one).
+    """
+    if len(profiles) < 2:
+        return
+    baseline, slower = profile_diff(profiles, baseline, limit)
+    console.print(f"🔍 [bold blue]Functions slower than on '{baseline}'[/bold blue]")
+    for machine, changes in sorted(slower.items()):
+        if not changes:
+            console.print(f"  [green]{machine}: no function slower.[/green]")
+            continue
+        console.print(f"  [bold]{machine}[/bold]")
+        for function, before, after in changes:
+            change = f"+{(after / before - 1) * 100:.0f}%" if before else "new"
+            console.print(
+                f"    [yellow]{function}[/yellow]: {before:.4f}s → {after:.4f}s "
+                f"([red]{change}[/red])"
+            )
+
+
+def _percent(value):
+    return f"{value * 100:+.1f}%" if value is not None else "-"
+
+
+def print_comparison(baseline, comparisons):
+    """
+    Prints how the timings of every machine changed compared with a baseline.
+    """
+    from colorama import Fore, init
+    from tabulate import tabulate
+
+    init(autoreset=True)
+
+    colors = {REGRESSED: Fore.RED, IMPROVED: Fore.GREEN}
     table_data = [
         [
-            Fore.WHITE + row["timestamp"],
-            Fore.WHITE + row["container_name"],
-            Fore.RED
-            if float(row["cpu_usage_percentage"]) > 50
-            else Fore.GREEN + row["cpu_usage_percentage"],
-            Fore.RED
-            if float(row["memory_usage_mb"]) > 100
-            else Fore.GREEN + row["memory_usage_mb"],
-            Fore.CYAN + row["network_received_mb"],
-            Fore.CYAN + row["network_sent_mb"],
-            Fore.YELLOW + row["disk_read_mb"],
-            Fore.YELLOW + row["disk_write_mb"],
-            Fore.WHITE + row["runtime_seconds"],
-            Fore.WHITE + row["code_execution_time_seconds"],
+            Fore.WHITE + comparison["machine"],
+            Fore.WHITE
+            + (
+                f"{comparison['baseline_median']:.4f}"
+                if comparison["baseline_median"] is not None
+                else "-"
+            ),
+            Fore.WHITE
+            + (
+                f"{comparison['median']:.4f}"
+                if comparison["median"] is not None
+                else "-"
+            ),
+            Fore.CYAN + _percent(comparison["change"]),
+            Fore.YELLOW
+            + (
+                f"{_percent(comparison['change_ci_low'])} .. "
+                f"{_percent(comparison['change_ci_high'])}"
+                if comparison["change_ci_low"] is not None
+                else "-"
+            ),
+            Fore.WHITE
+            + (
+                f"{comparison['p_value']:.4f}"
+                if comparison["p_value"] is not None
+                else "-"
+            ),
+            colors.get(comparison["status"], Fore.WHITE) + comparison["status"],
         ]
-        for row in rows
+        for comparison in comparisons
     ]
 
-    print(tabulate(table_data, headers=headers, tablefmt="fancy_grid"))
+    console.print(f"⚖️ [bold blue]Compared with '{baseline}'[/bold blue]")
+    print(
+        tabulate(
+            table_data,
+            headers=[
+                "Container",
+                "Baseline median (s)",
+                "Median (s)",
+                "Change",
+                "Change 95% CI",
+                "p-value",
+                "Status",
+            ],
+            tablefmt="fancy_grid",
+        )
+    )
@@ -0,0 +1,246 @@
+import json
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from app.api.uploads import save_uploads
+from app.api.utils import run_code_in_container
+from app.constants import OUTPUT_FILE_NAME
+from app.docker_client import get_client
+from app.images import cached_runtime_machines
+from app.pool import ContainerPool, pool
+from rich.console import Console
+
+console = Console()
+
+# Seconds to wait before trying again when the backend cannot be reached
+RETRY_INTERVAL = 5
+
+# Seconds between heartbeats while every slot is busy
+HEARTBEAT_INTERVAL = 5
+
+# Timeout of a single request to the backend; longer than its poll timeout
+REQUEST_TIMEOUT = 60
+
+
+class RemoteStore:
+    """
+    Stands in for the results store while a worker runs a task.
+
+    The report writer's batches of samples are posted to the backend as they
+    are written, and the backend stores them under the job's run. When the
+    backend answers that the task was cancelled, the run is stopped.
+    """
+
+    def __init__(self, agent, task_id, cancel_event):
+        self.agent = agent
+        self.task_id = task_id
+        self.cancel_event = cancel_event
+        self.summaries = []
+
+    def add_samples(self, run_id, rows):
+        response = self.agent.request(
+            "POST", f"{self.agent.task_path(self.task_id)}/samples", {"rows": rows}
+        )
+        if response.get("cancelled"):
+            self.cancel_event.set()
+
+    def set_execution_time(self, run_id, machine_name, execution_time):
+        self.agent.request(
+            "POST",
+            f"{self.agent.task_path(self.task_id)}/execution-time",
+            {"machine_name": machine_name, "execution_time": execution_time},
+        )
+
+    def add_summaries(self, run_id, summaries):
+        # Sent with the task's result once the run is over
+        self.summaries = summaries
+
+    def export_csv(self, run_id, output_file):
+        # The backend exports the report of the whole job
+        pass
+
+
+class WorkerAgent:
+    """
+    Runs the machines of upload jobs on this host's Docker daemon for a backend.
+
+    The agent registers with the backend and advertises its capacity and the
+    machines whose runtime images it already has. It then polls for tasks, runs
+    up to `capacity` of them at the same time, and streams their samples back.
+    """
+
+    def __init__(self, server, name=None, capacity=1, client=None):
+        self.server = server.rstrip("/")
+        self.name = name or socket.gethostname()
+        self.capacity = capacity
+        self._client = client
+        # An injected client gets a pool of its own, so its containers are not
+        # leased from another daemon's pool
+        self.pool = pool if client is None else ContainerPool(client=client)
+        self.worker_id = None
+        self.running = {}
+        self.lock = threading.Lock()
+        self.slot_freed = threading.Event()
+        self.executor = ThreadPoolExecutor(max_workers=capacity)
+
+    @property
+    def client(self):
+        return self._client or get_client()
+
+    def request(self, method, path, payload=None):
+        """
+        Sends a JSON request to the backend and returns the decoded response.
+        """
+        data = json.dumps(payload).encode() if payload is not None else None
+        request = urllib.request.Request(
+            f"{self.server}{path}",
+            data=data,
+            method=method,
+            headers={"Content-Type": "application/json"},
+        )
+        with urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT) as response:
+            return json.loads(response.read() or b"{}")
+
+    def task_path(self, task_id):
+        return f"/workers/{self.worker_id}/tasks/{task_id}"
+
+    def images(self):
+        try:
+            return cached_runtime_machines(self.client)
+        except Exception as e:
+            console.print(f"❌ [bold red]Error listing runtime images: {e}[/bold red]")
+            return []
+
+    def register(self):
+        response = self.request(
+            "POST",
+            "/workers",
+            {"name": self.name, "capacity": self.capacity, "images": self.images()},
+        )
+        self.worker_id = response["worker_id"]
+        console.print(
+            f"🤝 [bold green]Registered with {self.server} as '{self.name}' "
+            f"({self.capacity} slots).[/bold green]"
+        )
+
+    def run(self, stop_event=None):
+        """
+        Polls for tasks until `stop_event` is set, then waits for the running ones.
+        """
+        stop_event = stop_event or threading.Event()
+        try:
+            while not stop_event.is_set():
+                try:
+                    if self.worker_id is None:
+                        self.register()
+                    self._poll()
+                except urllib.error.HTTPError as e:
+                    if e.code == 404:
+                        # The backend restarted or dropped this worker
+                        self.worker_id = None
+                        continue
+                    console.print(f"❌ [bold red]Backend error: {e}[/bold red]")
+                    stop_event.wait(RETRY_INTERVAL)
+                except OSError as e:
+                    console.print(
+                        f"❌ [bold red]Cannot reach {self.server}: {e}[/bold red]"
+                    )
+                    stop_event.wait(RETRY_INTERVAL)
+        finally:
+            with self.lock:
+                for cancel_event in self.running.values():
+                    cancel_event.set()
+            self.executor.shutdown(wait=True)
+
+    def _poll(self):
+        with self.lock:
+            free = self.capacity - len(self.running)
+        response = self.request(
+            "POST",
+            f"/workers/{self.worker_id}/poll",
+            {"free": free, "images": self.images()},
+        )
+
+        with self.lock:
+            for task_id in response.get("cancelled", []):
+                if task_id in self.running:
+                    self.running[task_id].set()
+
+        task = response.get("task")
+        if task is not None:
+            with self.lock:
+                self.running[task["id"]] = threading.Event()
+            console.print(
+                f"📥 [blue]Running '{task['machine']['name']}' for job "
+                f"'{task['job_id']}'...[/blue]"
+            )
+            self.executor.submit(self._run_task, task)
+        elif free <= 0:
+            self.slot_freed.wait(HEARTBEAT_INTERVAL)
+            self.slot_freed.clear()
+
+    def _run_task(self, task):
+        cancel_event = self.running[task["id"]]
+        workspace = tempfile.mkdtemp(prefix="tin-worker-")
+        store = RemoteStore(self, task["id"], cancel_event)
+        error = None
+        try:
+            archive_path = os.path.join(workspace, "files.tar")
+            request = urllib.request.Request(
+                f"{self.server}{self.task_path(task['id'])}/files"
+            )
+            with urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT) as response:
+                with open(archive_path, "wb") as archive:
+                    shutil.copyfileobj(response, archive)
+            folder_path = os.path.join(workspace, "files")
+            with open(archive_path, "rb") as archive:
+                save_uploads(
+                    folder_path,
+                    [("files.tar", archive)],
+                    blob_directory=os.path.join(workspace, "blobs"),
+                )
+
+            error = run_code_in_container(
+                [task["machine"]],
+                folder_path,
+                task["language"],
+                task["entry_point"],
+                output_file=os.path.join(workspace, OUTPUT_FILE_NAME),
+                cancel_event=cancel_event,
+                store=store,
+                run_id=task["id"],
+                client=self.client,
+                container_pool=self.pool,
+                **task["options"],
+            )
+        except Exception as e:
+            error = str(e)
+        finally:
+            shutil.rmtree(workspace, ignore_errors=True)
+
+        try:
+            self.request(
+                "POST",
+                f"{self.task_path(task['id'])}/result",
+                {"results": store.summaries, "error": error},
+            )
+            if error:
+                console.print(
+                    f"❌ [bold red]'{task['machine']['name']}' failed: {error}[/bold red]"
+                )
+            else:
+                console.print(
+                    f"✅ [green]Finished '{task['machine']['name']}'.[/green]"
+                )
+        except Exception as e:
+            console.print(f"❌ [bold red]Error sending results: {e}[/bold red]")
+        finally:
+            with self.lock:
+                del self.running[task["id"]]
+            self.slot_freed.set()
@@ -0,0 +1,295 @@
+"""
+An in-process stand-in for the Docker SDK client, for benchmarking tin itself.
+
+It implements the parts of `docker.DockerClient` tin uses: images, containers,
+the low-level exec API and streamed stats. Stats frames are synthetic but shaped
+like the daemon's, with growing CPU, network, block I/O and throttling counters,
+so they go through the same decoding as real ones. Execs "run" for a fixed time
+or until a container has streamed a given number of frames.
+"""
+
+import hashlib
+import itertools
+import json
+import os
+import threading
+import time
+import types
+import uuid
+
+from app.execution import TIMINGS_FILE
+from app.pool import IDLE_MARKER, LEASE_DIRECTORY
+
+BYTES_PER_MB = 1024 * 1024
+
+
+def _matches(labels, filters):
+    """
+    Checks labels against Docker-style "key" or "key=value" filters.
+    """
+    wanted = (filters or {}).get("label") or []
+    if isinstance(wanted, str):
+        wanted = [wanted]
+    for label in wanted:
+        key, _, value = label.partition("=")
+        if key not in labels or (value and labels[key] != value):
+            return False
+    return True
+
+
+class FakeImage:
+    def __init__(self, tags, labels=None):
+        self.id = "sha256:" + hashlib.sha256("".join(tags).encode()).hexdigest()
+        self.tags = list(tags)
+        self.labels = labels or {}
+
+
+class FakeImages:
+    def __init__(self):
+        self.images = {}
+
+    def get(self, name):
+        if name not in self.images:
+            raise LookupError(f"No such image: {name}")
+        return self.images[name]
+
+    def pull(self, name):
+        self.images[name] = FakeImage([name])
+        return self.images[name]
+
+    def build(self, fileobj=None, tag=None, labels=None, **kwargs):
+        if fileobj is not None:
+            fileobj.read()
+        self.images[tag] = FakeImage([tag], labels)
+        return self.images[tag], []
+
+    def list(self, filters=None):
+        unique = {image.id: image for image in self.images.values()}
+        return [image for image in unique.values() if _matches(image.labels, filters)]
+
+    def remove(self, tag):
+        del self.images[tag]
+
+
+class FakeContainer:
+    """
+    A running container whose stats stream yields a synthetic frame every
+    `frame_interval` seconds.
+    """
+
+    def __init__(self, client, image, name=None, labels=None, **options):
+        self.client = client
+        self.image = image
+        self.id = uuid.uuid4().hex
+        self.name = name or self.id[:12]
+        self.labels = labels or {}
+        self.options = options
+        self.status = "running"
+        self.attrs = {"NetworkSettings": {"Ports": {}}}
+        self.files = {}
+        self.frames = 0
+        self.lock = threading.Lock()
+
+    def _frame(self, index):
+        """
+        Builds the index-th stats frame, with a CPU load of about 150% and
+        counters that grow with every frame.
+        """
+
+        def cpu(frame):
+            return {
+                "cpu_usage": {"total_usage": frame * 1_500_000_000},
+                "system_cpu_usage": frame * 4_000_000_000,
+                "online_cpus": 4,
+                "throttling_data": {
+                    "throttled_periods": frame // 10,
+                    "throttled_time": frame * 1_000_000,
+                },
+            }
+
+        return {
+            "read": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "cpu_stats": cpu(index),
+            "precpu_stats": cpu(index - 1) if index else {},
+            "memory_stats": {
+                "usage": (64 + index % 32) * BYTES_PER_MB,
+                "max_usage": 96 * BYTES_PER_MB,
+            },
+            "networks": {
+                "eth0": {"rx_bytes": index * 4096, "tx_bytes": index * 1024},
+            },
+            "blkio_stats": {
+                "io_service_bytes_recursive": [
+                    {"op": "Read", "value": index * 8192},
+                    {"op": "Write", "value": index * 16384},
+                ],
+                "io_serviced_recursive": [
+                    {"op": "Read", "value": index * 2},
+                    {"op": "Write", "value": index * 4},
+                ],
+            },
+        }
+
+    def stats(self, stream=False, decode=False):
+        if not stream:
+            return self._frame(self.frames)
+
+        def frames():
+            while self.status == "running":
+                with self.lock:
+                    self.frames += 1
+                    index = self.frames
+                yield self._frame(index)
+                if self.client.frame_interval:
+                    time.sleep(self.client.frame_interval)
+
+        return frames()
+
+    def exec_run(self, command, **kwargs):
+        script = command[-1] if isinstance(command, list) else command
+        exit_code, output = 0, b""
+        if command == ["mkdir", LEASE_DIRECTORY]:
+            with self.lock:
+                exit_code = 1 if LEASE_DIRECTORY in self.files else 0
+                self.files[LEASE_DIRECTORY] = time.time()
+        elif command == ["cat", TIMINGS_FILE]:
+            output = self.files.get(TIMINGS_FILE, b"")
+            exit_code = 0 if output else 1
+        elif f"rm -rf {LEASE_DIRECTORY}" in script:
+            # Under an init, the idle command is a child that `kill -9 -1`
+            # reaches, and the init exits with it
+            if "kill -9 -1" in script and self.options.get("init"):
+                self.status = "exited"
+            self.files.pop(LEASE_DIRECTORY, None)
+            self.files[IDLE_MARKER] = time.time()
+        elif "stat -c" in script:
+            if LEASE_DIRECTORY in self.files:
+                output = f"leased {int(self.files[LEASE_DIRECTORY])}".encode()
+            else:
+                output = (
+                    f"idle {int(self.files.get(IDLE_MARKER, time.time()))}".encode()
+                )
+        elif TIMINGS_FILE in script:
+            self.files.pop(TIMINGS_FILE, None)
+        return types.SimpleNamespace(exit_code=exit_code, output=output)
+
+    def put_archive(self, path, data):
+        self.files[path] = len(data)
+        return True
+
+    def update(self, **kwargs):
+        self.options.update(kwargs)
+
+    def reload(self):
+        pass
+
+    def stop(self, **kwargs):
+        self.status = "exited"
+
+    def remove(self, force=False, **kwargs):
+        self.status = "removed"
+        self.client.containers.containers.pop(self.name, None)
+
+
+class FakeContainers:
+    def __init__(self, client):
+        self.client = client
+        self.containers = {}
+
+    def run(self, image, name=None, labels=None, **options):
+        container = FakeContainer(self.client, image, name, labels, **options)
+        self.containers[container.name] = container
+        return container
+
+    def list(self, all=False, filters=None):
+        return [
+            container
+            for container in list(self.containers.values())
+            if _matches(container.labels, filters)
+        ]
+
+    def get(self, name):
+        return self.containers[name]
+
+
+class FakeAPI:
+    """
+    The low-level exec API. An exec is running until `exec_seconds` have passed
+    or, with `exec_frames`, until its container has streamed that many frames.
+    When it ends, the timing harness's results are left in the container.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.execs = {}
+        self.ids = itertools.count()
+
+    def exec_create(self, container_id, command, **kwargs):
+        container = next(
+            c
+            for c in self.client.containers.containers.values()
+            if c.id == container_id
+        )
+        exec_id = str(next(self.ids))
+        # The harness overwrites the timings of the previous exec
+        container.files.pop(TIMINGS_FILE, None)
+        runs = int(command[3]) if isinstance(command, list) and len(command) > 3 else 1
+        self.execs[exec_id] = {
+            "container": container,
+            "runs": runs,
+            "started_at": None,
+            "first_frame": 0,
+        }
+        return {"Id": exec_id}
+
+    def exec_start(self, exec_id, detach=False, **kwargs):
+        state = self.execs[exec_id]
+        state["started_at"] = time.monotonic()
+        state["first_frame"] = state["container"].frames
+
+    def exec_inspect(self, exec_id):
+        state = self.execs[exec_id]
+        container = state["container"]
+        if self.client.exec_frames:
+            running = container.frames - state["first_frame"] < self.client.exec_frames
+        else:
+            running = time.monotonic() - state["started_at"] < self.client.exec_seconds
+        exit_code = self.client.exit_code
+        if not running and TIMINGS_FILE not in container.files:
+            # Like the harness, stop timing at the first failed run
+            timings = [self.client.exec_seconds / state["runs"]] * state["runs"]
+            container.files[TIMINGS_FILE] = json.dumps(
+                {"timings": [] if exit_code else timings, "exit_code": exit_code}
+            ).encode()
+        return {"Running": running, "ExitCode": None if running else exit_code}
+
+
+class FakeDockerClient:
+    """
+    A Docker client backed by memory.
+
+    `frame_interval` spaces the stats frames of every container (0 streams them
+    as fast as they are consumed). Execs last `exec_seconds`, or `exec_frames`
+    frames when that is set, and the code they run exits with `exit_code`.
+    The daemon reports `cpus` CPUs, by default those of this host.
+    """
+
+    def __init__(
+        self,
+        frame_interval=0.0,
+        exec_seconds=0.2,
+        exec_frames=None,
+        exit_code=0,
+        cpus=None,
+    ):
+        self.frame_interval = frame_interval
+        self.cpus = cpus
+        self.exec_seconds = exec_seconds
+        self.exec_frames = exec_frames
+        self.exit_code = exit_code
+        self.images = FakeImages()
+        self.containers = FakeContainers(self)
+        self.api = FakeAPI(self)
+
+    def info(self):
+        return {"NCPU": self.cpus or os.cpu_count() or 1}
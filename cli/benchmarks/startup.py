@@ -0,0 +1,145 @@
+"""
+Measures how long `tin` takes to start for each command, and which imports
+that time goes to.
+
+Commands import what they need inside their body, so `tin <command> --help`
+only measures what every command shares. Each command is therefore timed as
+`app.main` followed by the modules the command imports when it runs, found in
+its source, without running the command itself. Run from the cli directory:
+
+    python benchmarks/startup.py
+    python benchmarks/startup.py --repeat 10 --top 8
+"""
+
+import argparse
+import ast
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+CLI_DIRECTORY = Path(__file__).resolve().parent.parent
+MAIN_FILE = CLI_DIRECTORY / "app" / "main.py"
+
+
+def command_imports():
+    """
+    Maps every command of the Typer app, by its command name, to the modules
+    its body imports, including those of the helpers of app/main.py it calls.
+    `tin` itself imports nothing more.
+    """
+    tree = ast.parse(MAIN_FILE.read_text())
+    functions = {
+        node.name: node for node in tree.body if isinstance(node, ast.FunctionDef)
+    }
+
+    def imports(function, seen):
+        seen.add(function.name)
+        modules = []
+        for node in ast.walk(function):
+            if isinstance(node, ast.Import):
+                modules.extend(alias.name for alias in node.names)
+            elif isinstance(node, ast.ImportFrom) and node.module:
+                modules.append(node.module)
+            elif (
+                isinstance(node, ast.Call)
+                and isinstance(node.func, ast.Name)
+                and node.func.id in functions
+                and node.func.id not in seen
+            ):
+                modules.extend(imports(functions[node.func.id], seen))
+        return list(dict.fromkeys(modules))
+
+    commands = {"": []}
+    for function in functions.values():
+        for decorator in function.decorator_list:
+            if not (
+                isinstance(decorator, ast.Call)
+                and ast.unparse(decorator.func) == "app.command"
+            ):
+                continue
+            # Typer names commands after their function unless told otherwise
+            name = function.name.replace("_", "-")
+            if decorator.args:
+                name = ast.literal_eval(decorator.args[0])
+            for keyword in decorator.keywords:
+                if keyword.arg == "name":
+                    name = ast.literal_eval(keyword.value)
+            commands[name] = imports(function, set())
+    return commands
+
+
+def run_imports(modules, import_time=False):
+    """
+    Imports `app.main` and then `modules` in a fresh interpreter, like a command
+    does when it runs, and returns the wall time and stderr.
+    """
+    command = [sys.executable]
+    if import_time:
+        command += ["-X", "importtime"]
+    code = "; ".join(f"import {module}" for module in ["app.main", *modules])
+    command += ["-c", code]
+
+    started = time.perf_counter()
+    result = subprocess.run(
+        command,
+        cwd=CLI_DIRECTORY,
+        env={**os.environ, "PYTHONPATH": str(CLI_DIRECTORY)},
+        capture_output=True,
+        text=True,
+    )
+    elapsed = time.perf_counter() - started
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {code} failed:\n{result.stderr}")
+    return elapsed, result.stderr
+
+
+def deferred_imports(stderr):
+    """
+    Parses `-X importtime` output into the packages imported after `app.main`,
+    with the time spent importing their own modules in milliseconds, so a
+    library pulled in by an app module is counted as itself.
+    """
+    packages = {}
+    after_main = False
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_time, _, name = line[len("import time:") :].split("|")
+        if name.rstrip() == " app.main":
+            after_main = True
+        elif after_main:
+            package = name.strip().split(".")[0]
+            packages[package] = packages.get(package, 0) + int(self_time) / 1000
+    return sorted(packages.items(), key=lambda item: item[1], reverse=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per command")
+    parser.add_argument("--top", type=int, default=5, help="Imports listed per command")
+    args = parser.parse_args()
+
+    # Warm the filesystem cache and the bytecode cache once
+    run_imports([])
+
+    for name, modules in command_imports().items():
+        timings = [run_imports(modules)[0] for _ in range(args.repeat)]
+        _, stderr = run_imports(modules, import_time=True)
+        packages = deferred_imports(stderr)
+        imports = ", ".join(
+            f"{package} {milliseconds:.1f}ms"
+            for package, milliseconds in packages[: args.top]
+        )
+        print(
+            f"tin {name or '--help':<14} "
+            f"median {statistics.median(timings) * 1000:6.1f}ms  "
+            f"min {min(timings) * 1000:6.1f}ms  "
+            f"own imports {sum(ms for _, ms in packages):6.1f}ms  | {imports}"
+        )
+
+
+if __name__ == "__main__":
+    main()
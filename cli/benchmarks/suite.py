@@ -0,0 +1,467 @@
+"""
+Benchmarks tin's own overhead against an in-process fake Docker client, and
+compares the results with a stored baseline.
+
+Measures the sampler's CPU cost per sample, report writer throughput, the
+summary table, upload throughput for a large project, and end-to-end latency
+of an upload job for growing numbers of machines. Run from the cli directory:
+
+    python benchmarks/suite.py --save-baseline   # record a baseline on this host
+    python benchmarks/suite.py                   # compare with benchmarks/baseline.json
+    python benchmarks/suite.py --only sampler writer
+
+The baseline holds absolute timings of the host that recorded it, so it is not
+checked in: record one on each machine before comparing, and again whenever
+the machine or its load changes.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tarfile
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+CLI_DIRECTORY = Path(__file__).resolve().parent.parent
+BASELINE_FILE = Path(__file__).resolve().parent / "baseline.json"
+
+# Fractional slowdown against the baseline that counts as a regression
+DEFAULT_TOLERANCE = 0.25
+
+# Timed runs of the shortest measurements, whatever --repeat asks for; those
+# of tens of milliseconds vary by up to a third from one run to the next
+MIN_REPEAT = 7
+
+# Key of the baseline entry that describes the host that recorded it
+HOST_KEY = "_host"
+
+# Keep results out of the user's store; must be set before app.store is imported
+WORKSPACE = Path(tempfile.mkdtemp(prefix="tin-bench-"))
+os.environ["TIN_RESULTS_DB"] = str(WORKSPACE / "results.db")
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+sys.path.insert(0, str(CLI_DIRECTORY))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import app.docker_client  # noqa: E402
+from fake_docker import FakeDockerClient  # noqa: E402
+
+# Metric name -> (unit, whether lower values are better)
+METRICS = {}
+
+
+def metric(name, unit, lower_is_better=True):
+    METRICS[name] = (unit, lower_is_better)
+    return name
+
+
+def use_client(client):
+    """
+    Makes every part of tin that calls get_client() talk to `client`.
+    """
+    app.docker_client._client = client
+
+
+def machines(count):
+    return [
+        {"name": f"Bench{index}", "image": f"bench:{index}", "enabled": True}
+        for index in range(count)
+    ]
+
+
+def host():
+    """
+    Describes this host, to tell whether a baseline was recorded on it.
+    """
+    return {
+        "node": platform.node(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpus": os.cpu_count(),
+        "python": platform.python_version(),
+    }
+
+
+def run_process(client, container, runs=1):
+    from app.execution import TimedExecProcess
+
+    return TimedExecProcess(client, container, "python3 main.py", runs=runs)
+
+
+def bench_sampler(repeat):
+    """
+    CPU time the sampler spends per sample, when frames arrive as fast as they
+    are consumed, with and without the report writer.
+    """
+    from app.pipeline import ReportWriter
+    from app.sampler import collect_stats_to_csv
+    from app.store import ResultsStore
+
+    results = {}
+    for sample_count in (100, 1000, 10000):
+        for mode in ("csv", "writer"):
+            costs = []
+            for _ in range(repeat):
+                client = FakeDockerClient(exec_frames=sample_count)
+                container = client.containers.run("bench", name="bench")
+                process = run_process(client, container)
+                output_file = WORKSPACE / "sampler.csv"
+                output_file.unlink(missing_ok=True)
+
+                writer = None
+                if mode == "writer":
+                    store = ResultsStore(WORKSPACE / "sampler.db")
+                    writer = ReportWriter(store, store.create_run()).start()
+                try:
+                    result = collect_stats_to_csv(
+                        container,
+                        str(output_file),
+                        process,
+                        interval=1e-9,
+                        sampler="docker",
+                        writer=writer,
+                    )
+                finally:
+                    container.stop()
+                    if writer is not None:
+                        writer.close()
+                        store.close()
+                costs.append(result["sampler_seconds"] / result["samples"] * 1e6)
+            name = metric(f"sampler.{mode}.{sample_count}_samples", "µs/sample")
+            results[name] = statistics.median(costs)
+    return results
+
+
+def bench_writer(repeat):
+    """
+    Rows per second the report writer stores, with four machines queueing rows
+    at the same time.
+    """
+    from app.metrics import docker_stats_metrics
+    from app.pipeline import ReportWriter
+    from app.sampler import report_row
+    from app.store import ResultsStore
+
+    client = FakeDockerClient()
+    container = client.containers.run("bench", name="bench")
+    sample = docker_stats_metrics(container.stats())
+    sample.update(
+        timestamp="2024-01-01 00:00:00",
+        runtime_seconds=1.0,
+        disk_read_iops=0.0,
+        disk_write_iops=0.0,
+    )
+    rows_per_machine, machine_count = 25_000, 4
+
+    throughputs, blocked = [], []
+    for _ in range(repeat):
+        path = WORKSPACE / "writer.db"
+        for suffix in ("", "-wal", "-shm"):
+            Path(f"{path}{suffix}").unlink(missing_ok=True)
+        store = ResultsStore(path)
+        writer = ReportWriter(store, store.create_run()).start()
+
+        def produce(name):
+            for _ in range(rows_per_machine):
+                writer.put(report_row(name, sample, None))
+
+        started = time.perf_counter()
+        threads = [
+            threading.Thread(target=produce, args=(f"Bench{index}",))
+            for index in range(machine_count)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        stats = writer.close()
+        elapsed = time.perf_counter() - started
+        store.close()
+
+        throughputs.append(stats["rows"] / elapsed)
+        blocked.append(stats["blocked_seconds"] * 1000)
+
+    return {
+        metric("writer.rows_per_second", "rows/s", lower_is_better=False): (
+            statistics.median(throughputs)
+        ),
+        metric("writer.blocked", "ms"): statistics.median(blocked),
+    }
+
+
+def bench_format_table(repeat):
+    """
+    Time to print the summary table for growing numbers of machines.
+    """
+    from app.timing import summarize_timings
+    from app.utils import format_table
+
+    results = {}
+    for machine_count in (10, 100):
+        stats = []
+        for index in range(machine_count):
+            timings = [1 + index / 100 + run / 1000 for run in range(30)]
+            stats.append(
+                {
+                    "container": f"Bench{index}",
+                    "status": "Success",
+                    "execution_time": statistics.median(timings),
+                    "exit_code": 0,
+                    "success": True,
+                    "timings": timings,
+                    "peak_cpu": 150.0,
+                    "peak_memory_mb": 96.0,
+                    **summarize_timings(timings),
+                }
+            )
+        durations = []
+        # The first run is left out: it imports and caches what Rich needs
+        for run in range(1 + max(repeat, MIN_REPEAT)):
+            started = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                format_table(stats)
+            if run:
+                durations.append((time.perf_counter() - started) * 1000)
+        name = metric(f"format_table.{machine_count}_machines", "ms")
+        results[name] = statistics.median(durations)
+    return results
+
+
+def _project(directory, file_count=500, file_size=64 * 1024):
+    """
+    Writes a project of `file_count` files of random-looking content.
+    """
+    for index in range(file_count):
+        path = directory / f"package{index % 20}" / f"module{index}.py"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(os.urandom(file_size))
+    return file_count * file_size
+
+
+def bench_upload(repeat):
+    """
+    Upload throughput for a large project sent as files and as one tar archive,
+    the first time and again once its contents are stored.
+    """
+    from app.api.uploads import save_uploads
+
+    project = WORKSPACE / "project"
+    size_mb = _project(project) / 1024 / 1024
+    paths = sorted(path for path in project.rglob("*") if path.is_file())
+    archive = WORKSPACE / "project.tar"
+    with tarfile.open(archive, "w") as tar:
+        tar.add(project, arcname=".")
+
+    def upload_files(folder, blobs):
+        files = [(str(path.relative_to(project)), open(path, "rb")) for path in paths]
+        try:
+            save_uploads(folder, files, blob_directory=blobs)
+        finally:
+            for _, fileobj in files:
+                fileobj.close()
+
+    def upload_archive(folder, blobs):
+        with open(archive, "rb") as fileobj:
+            save_uploads(folder, [("project.tar", fileobj)], blob_directory=blobs)
+
+    results = {}
+    for kind, upload in (("files", upload_files), ("tar", upload_archive)):
+        first, again = [], []
+        for _ in range(repeat):
+            blobs = WORKSPACE / "blobs"
+            shutil.rmtree(blobs, ignore_errors=True)
+            for attempt, timings in ((0, first), (1, again)):
+                folder = WORKSPACE / f"upload{attempt}"
+                shutil.rmtree(folder, ignore_errors=True)
+                started = time.perf_counter()
+                upload(str(folder), str(blobs))
+                timings.append(size_mb / (time.perf_counter() - started))
+        for label, timings in (("new", first), ("stored", again)):
+            name = metric(f"upload.{kind}.{label}", "MB/s", lower_is_better=False)
+            results[name] = statistics.median(timings)
+    return results
+
+
+def bench_job(repeat):
+    """
+    Latency of a whole upload job beyond the time its code runs, from the
+    upload request to the completed job, for growing numbers of machines.
+    """
+    try:
+        from starlette.testclient import TestClient
+    except ImportError as e:
+        print(f"Skipping job latency: {e}")
+        return {}
+    import app.api.main as api
+    from app.api import utils as api_utils
+
+    # Jobs publish their report to the frontend; keep whatever is there now
+    public = CLI_DIRECTORY.parent / "frontend" / "public"
+    published = {
+        path: path.read_bytes() for path in public.glob("tin-*.csv") if path.is_file()
+    }
+
+    exec_seconds = 0.2
+    results = {}
+    configured_machines = api_utils.MACHINES
+
+    def run_job(http, configs):
+        api_utils.MACHINES = configs
+        use_client(FakeDockerClient(frame_interval=0.02, exec_seconds=exec_seconds))
+        started = time.perf_counter()
+        response = http.post(
+            "/upload",
+            data={
+                "machines": json.dumps([m["name"] for m in configs]),
+                "language": "python",
+                "entryPoint": "main.py",
+                "parallel": str(len(configs)),
+                "pool": "false",
+            },
+            files=[("files", ("main.py", b"print('hello')\n"))],
+        )
+        job_id = response.json()["job_id"]
+        while True:
+            job = http.get(f"/jobs/{job_id}").json()
+            if job["status"] not in ("queued", "running"):
+                break
+            time.sleep(0.01)
+        if job["status"] != "completed":
+            raise RuntimeError(f"Job failed: {job['error']}")
+        return (time.perf_counter() - started - exec_seconds) * 1000
+
+    cwd = os.getcwd()
+    os.chdir(WORKSPACE)
+    # The API logs and prints as it goes; only the measurements are of interest
+    logging.disable(logging.INFO)
+    try:
+        with TestClient(api.app) as http, contextlib.redirect_stdout(io.StringIO()):
+            # Leaves imports and first-request setup out of the measurements
+            run_job(http, machines(1))
+            for machine_count in (1, 4, 8):
+                # And the first job of each size, which starts its threads
+                run_job(http, machines(machine_count))
+                latencies = [
+                    run_job(http, machines(machine_count))
+                    for _ in range(max(repeat, MIN_REPEAT))
+                ]
+                name = metric(f"job.{machine_count}_machines.overhead", "ms")
+                results[name] = statistics.median(latencies)
+    finally:
+        logging.disable(logging.NOTSET)
+        os.chdir(cwd)
+        api_utils.MACHINES = configured_machines
+        for path in public.glob("tin-*.csv"):
+            if path not in published:
+                path.unlink()
+        for path, contents in published.items():
+            path.write_bytes(contents)
+    return results
+
+
+BENCHMARKS = {
+    "sampler": bench_sampler,
+    "writer": bench_writer,
+    "format_table": bench_format_table,
+    "upload": bench_upload,
+    "job": bench_job,
+}
+
+
+def compare(results, baseline, tolerance):
+    """
+    Prints every metric next to its baseline. Returns the regressed metrics.
+    """
+    recorded_on = baseline.get(HOST_KEY)
+    if recorded_on is not None and recorded_on != host():
+        print(
+            f"The baseline was recorded on another host ({recorded_on['node']}); "
+            "record one here with --save-baseline.\n"
+        )
+    regressions = []
+    for name, value in results.items():
+        unit, lower_is_better = METRICS[name]
+        reference = baseline.get(name)
+        if reference is None:
+            print(f"{name:<38} {value:12.2f} {unit:<10} (no baseline)")
+            continue
+        change = (value - reference) / reference if reference else 0
+        slowdown = change if lower_is_better else -change
+        flag = ""
+        if slowdown > tolerance:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(
+            f"{name:<38} {value:12.2f} {unit:<10} "
+            f"baseline {reference:12.2f} ({change:+.0%}){flag}"
+        )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--only", nargs="+", choices=sorted(BENCHMARKS), help="Benchmarks to run"
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=DEFAULT_TOLERANCE,
+        help="Slowdown against the baseline that fails the run (0.25 = 25%%)",
+    )
+    parser.add_argument(
+        "--baseline", type=Path, default=BASELINE_FILE, help="Baseline file"
+    )
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="Store the results as the new baseline instead of comparing",
+    )
+    args = parser.parse_args()
+
+    results = {}
+    try:
+        for name in args.only or BENCHMARKS:
+            print(f"Running {name}...", file=sys.stderr)
+            results.update(BENCHMARKS[name](args.repeat))
+    finally:
+        shutil.rmtree(WORKSPACE, ignore_errors=True)
+
+    if args.save_baseline:
+        baseline = (
+            json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+        )
+        # Metrics of another host cannot be compared with those of this one
+        if baseline.get(HOST_KEY, host()) != host():
+            baseline = {}
+        baseline.update({name: round(value, 3) for name, value in results.items()})
+        baseline[HOST_KEY] = host()
+        args.baseline.write_text(json.dumps(baseline, indent=2, sort_keys=True) + "\n")
+        print(f"Saved {len(results)} metrics to {args.baseline}")
+        return
+
+    if not args.baseline.exists():
+        print(
+            f"No baseline at {args.baseline}; record one on this host with "
+            "`python benchmarks/suite.py --save-baseline`.\n"
+        )
+    baseline = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(
+            f"\n{len(regressions)} metrics regressed by more than {args.tolerance:.0%}"
+        )
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
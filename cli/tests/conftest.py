@@ -0,0 +1,9 @@
+import os
+import tempfile
+from pathlib import Path
+
+# Keep results out of the user's store; must be set before app.store is imported
+os.environ["TIN_RESULTS_DB"] = str(
+    Path(tempfile.mkdtemp(prefix="tin-test-")) / "results.db"
+)
+os.environ.setdefault("OPENAI_API_KEY", "test")
@@ -0,0 +1,52 @@
+import pytest
+from app import docker_client
+from app.store import ResultsStore
+from app.utils import run_docker_containers_and_collect_stats
+from fake_docker import FakeDockerClient
+
+MACHINES = [
+    {"name": "Bench0", "image": "bench:0"},
+    {"name": "Bench1", "image": "bench:1"},
+]
+
+
+@pytest.fixture
+def run(tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        docker_client,
+        "_client",
+        FakeDockerClient(frame_interval=0.01, exec_seconds=0.05),
+    )
+    code = tmp_path / "code"
+    code.mkdir()
+    (code / "main.py").write_text("print('hello')\n")
+    store = ResultsStore(tmp_path / "results.db")
+
+    def run(**options):
+        stats = run_docker_containers_and_collect_stats(
+            MACHINES,
+            "python",
+            str(code),
+            "main.py",
+            str(tmp_path / "tin-report.csv"),
+            use_pool=False,
+            store=store,
+            **options,
+        )
+        return [result["container"] for result in stats if result.get("cached")]
+
+    return run
+
+
+def test_unchanged_runs_are_cached(run):
+    assert run() == []
+    assert run() == ["Bench0", "Bench1"]
+
+
+@pytest.mark.parametrize(
+    "options", [{"parallel": 2}, {"parallel": 2, "isolated": True}]
+)
+def test_concurrency_settings_are_part_of_the_key(run, options):
+    run()
+    assert run(**options) == []
+    assert run(**options) == ["Bench0", "Bench1"]
@@ -0,0 +1,224 @@
+import csv
+import inspect
+import threading
+import time
+import types
+
+import pytest
+from app import sampler
+from app.cgroup import (
+    CgroupReader,
+    cgroup_reader_for,
+    find_container_cgroup,
+    read_cgroup_counters,
+)
+from fake_docker import FakeDockerClient
+
+CONTAINER_ID = "0123abcd"
+MB = 1024 * 1024
+
+
+def write_cgroup(root, container_id=CONTAINER_ID, **files):
+    """
+    Builds a cgroup v2 tree with a container cgroup in the systemd layout.
+    """
+    root.mkdir(parents=True, exist_ok=True)
+    (root / "cgroup.controllers").write_text("cpu io memory pids\n")
+    path = root / "system.slice" / f"docker-{container_id}.scope"
+    path.mkdir(parents=True)
+    contents = {
+        "cpu.stat": "usage_usec 2000000\nuser_usec 1500000\nsystem_usec 500000\n"
+        "nr_periods 40\nnr_throttled 3\nthrottled_usec 120000\n",
+        "memory.current": f"{64 * MB}\n",
+        "memory.peak": f"{96 * MB}\n",
+        "memory.events": "low 0\nhigh 0\nmax 2\noom 0\noom_kill 0\n",
+        "io.stat": f"8:0 rbytes={2 * MB} wbytes={4 * MB} rios=10 wios=20 dbytes=0 dios=0\n"
+        f"8:16 rbytes={MB} wbytes=0 rios=5 wios=0 dbytes=0 dios=0\n",
+        **files,
+    }
+    for name, content in contents.items():
+        if content is not None:
+            (path / name).write_text(content)
+    return path
+
+
+def write_net_dev(proc_root, pid):
+    net = proc_root / str(pid) / "net"
+    net.mkdir(parents=True)
+    (net / "dev").write_text(
+        "Inter-|   Receive                            |  Transmit\n"
+        " face |bytes    packets errs drop fifo frame compressed multicast|bytes\n"
+        f"    lo: {9 * MB} 1 0 0 0 0 0 0 {9 * MB} 1 0 0 0 0 0 0\n"
+        f"  eth0: {3 * MB} 1 0 0 0 0 0 0 {MB} 1 0 0 0 0 0 0\n"
+    )
+
+
+def test_finds_the_container_cgroup(tmp_path):
+    path = write_cgroup(tmp_path)
+    assert find_container_cgroup(CONTAINER_ID, tmp_path) == path
+    assert find_container_cgroup("other", tmp_path) is None
+
+
+def test_reads_counters(tmp_path):
+    counters = read_cgroup_counters(write_cgroup(tmp_path))
+    assert counters == {
+        "cpu_usage_usec": 2000000,
+        "nr_periods": 40,
+        "nr_throttled": 3,
+        "throttled_usec": 120000,
+        "memory_current": 64 * MB,
+        "memory_peak": 96 * MB,
+        "io_read_bytes": 3 * MB,
+        "io_write_bytes": 4 * MB,
+        "io_read_ops": 15,
+        "io_write_ops": 20,
+    }
+
+
+def test_missing_or_unreadable_files_read_as_zero(tmp_path):
+    path = write_cgroup(tmp_path, **{"io.stat": None, "memory.peak": None})
+    # A directory in place of a file cannot be read like one
+    (path / "memory.current").unlink()
+    (path / "memory.current").mkdir()
+
+    counters = read_cgroup_counters(path)
+    assert counters["memory_current"] == 0
+    assert counters["memory_peak"] == 0
+    assert counters["io_read_bytes"] == counters["io_write_ops"] == 0
+    assert counters["cpu_usage_usec"] == 2000000
+
+
+def test_samples_report_metrics(tmp_path):
+    path = write_cgroup(tmp_path / "cgroup")
+    write_net_dev(tmp_path / "proc", 42)
+    reader = CgroupReader(path, pid=42, proc_root=tmp_path / "proc")
+
+    first = reader.sample()
+    assert first["cpu_usage_percentage"] == 0
+    assert first["memory_usage_mb"] == 64
+    assert first["memory_peak_mb"] == 96
+    assert first["network_received_mb"] == 3
+    assert first["network_sent_mb"] == 1
+    assert first["disk_read_mb"] == 3
+    assert first["disk_write_mb"] == 4
+    assert first["cpu_throttled_periods"] == 3
+
+    # Half a core over one second
+    (path / "cpu.stat").write_text("usage_usec 2500000\n")
+    reader.previous["time"] -= 1.0
+    second = reader.sample()
+    assert second["cpu_usage_percentage"] == pytest.approx(50, rel=0.01)
+
+
+@pytest.mark.parametrize(
+    "layout",
+    [
+        # cgroup v1: per-controller hierarchies, no cgroup.controllers
+        {"cpu,cpuacct/docker/0123abcd/cpuacct.usage": "1000\n"},
+        # Not a cgroup mount at all
+        {},
+    ],
+)
+def test_falls_back_to_docker_stats_without_cgroup_v2(tmp_path, monkeypatch, layout):
+    for name, content in layout.items():
+        (tmp_path / name).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / name).write_text(content)
+    container = types.SimpleNamespace(id=CONTAINER_ID)
+    assert cgroup_reader_for(container, root=tmp_path) is None
+
+    client = FakeDockerClient(frame_interval=0.01, exec_seconds=0.1)
+    container = client.containers.run("image", name="machine")
+    monkeypatch.setattr(
+        sampler,
+        "cgroup_reader_for",
+        lambda container: cgroup_reader_for(container, root=tmp_path),
+    )
+
+    class Process:
+        started_at = 1.0
+        exit_code = 0
+        duration = 0.1
+
+        def __init__(self):
+            self.done = threading.Event()
+
+        def wait(self, timeout):
+            return self.done.wait(timeout)
+
+    process = Process()
+    threading.Timer(0.1, process.done.set).start()
+    output_file = tmp_path / "report.csv"
+    result = sampler.collect_stats_to_csv(
+        container, output_file, process, interval=0.01, sampler="auto"
+    )
+
+    assert container.frames > 0
+    assert result["samples"] > 0
+    with open(output_file) as file:
+        rows = list(csv.DictReader(file))
+    assert rows and float(rows[-1]["network_received_mb"]) > 0
+
+
+def test_the_docker_stats_stream_is_closed_when_sampling_stops():
+    client = FakeDockerClient(frame_interval=0.01)
+    container = client.containers.run("image", name="machine")
+    streams = []
+    stats = container.stats
+
+    def stream(**kwargs):
+        streams.append(stats(**kwargs))
+        return streams[-1]
+
+    container.stats = stream
+    stop = threading.Event()
+    sampler.stream_samples(
+        container, lambda sample, started: stop.set(), stop, time.monotonic(), 0, 60
+    )
+
+    assert inspect.getgeneratorstate(streams[0]) == inspect.GEN_CLOSED
+
+
+@pytest.mark.parametrize("reused, peak", [(False, 96), (True, 64)])
+def test_memory_peak_only_counts_for_a_fresh_container(
+    tmp_path, monkeypatch, reused, peak
+):
+    path = write_cgroup(tmp_path / "cgroup")
+    write_net_dev(tmp_path / "proc", 42)
+    monkeypatch.setattr(
+        sampler,
+        "cgroup_reader_for",
+        lambda container: CgroupReader(path, pid=42, proc_root=tmp_path / "proc"),
+    )
+
+    class Process:
+        """
+        A short program, started by the sampler after its baseline sample.
+        """
+
+        started_at = None
+        exit_code = 0
+        duration = 0.01
+
+        def __init__(self):
+            self.done = threading.Event()
+
+        def start(self):
+            self.started_at = 1.0
+            self.done.set()
+            return self
+
+        def wait(self, timeout):
+            return self.done.wait(timeout)
+
+    container = types.SimpleNamespace(id=CONTAINER_ID, name="machine")
+    result = sampler.collect_stats_to_csv(
+        container,
+        tmp_path / "report.csv",
+        Process(),
+        interval=0.01,
+        sampler="cgroup",
+        reused=reused,
+    )
+
+    # memory.peak (96 MB) is above every sampled memory.current (64 MB)
+    assert result["peak_memory_mb"] == peak
@@ -0,0 +1,161 @@
+import json
+
+import httpx
+import pytest
+from app.api import main
+from app.api.chat import SYSTEM_PROMPT, ChatGPTInteraction
+from app.constants import REPORT_HEADERS
+from fastapi.testclient import TestClient
+from openai import AsyncOpenAI
+
+REPORT = "\n".join(
+    [
+        ",".join(REPORT_HEADERS),
+        "2026-01-01 00:00:00,Ubuntu22.04,50,64,0,0,0,0,0.5,1.2,0,0,0",
+        "2026-01-01 00:00:01,Ubuntu22.04,80,70,0,0,0,0,1.0,1.2,0,0,0",
+        "2026-01-01 00:00:00,Fedora40,40,60,0,0,0,0,0.5,1.0,0,0,0",
+    ]
+)
+
+
+class StubServer:
+    """
+    A chat completions endpoint that streams a fixed answer, or fails with
+    `status` when it is set.
+    """
+
+    def __init__(self, tokens=("Fedora ", "is ", "faster."), status=None):
+        self.tokens = tokens
+        self.status = status
+        self.requests = []
+
+    def handle(self, request):
+        self.requests.append(json.loads(request.content))
+        if self.status is not None:
+            return httpx.Response(
+                self.status, json={"error": {"message": "upstream is down"}}
+            )
+        chunks = [
+            {
+                "id": "chat-1",
+                "object": "chat.completion.chunk",
+                "created": 0,
+                "model": "stub",
+                "choices": [
+                    {"index": 0, "delta": {"content": token}, "finish_reason": None}
+                ],
+            }
+            for token in self.tokens
+        ]
+        body = "".join(f"data: {json.dumps(chunk)}\n\n" for chunk in chunks)
+        return httpx.Response(
+            200,
+            content=(body + "data: [DONE]\n\n").encode(),
+            headers={"content-type": "text/event-stream"},
+        )
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    server = StubServer()
+    interaction = ChatGPTInteraction()
+    interaction.client = AsyncOpenAI(
+        api_key="test",
+        base_url="http://stub/v1",
+        max_retries=0,
+        http_client=httpx.AsyncClient(transport=httpx.MockTransport(server.handle)),
+    )
+    monkeypatch.setattr(main, "chat_interaction", interaction)
+    return server
+
+
+def ask(prompt="Which OS is faster?", **fields):
+    client = TestClient(main.app)
+    return client.post(
+        "/api/chat", json={"csv_data": REPORT, "user_prompt": prompt, **fields}
+    )
+
+
+def test_sends_the_summary_and_returns_the_answer(stub):
+    response = ask()
+
+    assert response.status_code == 200
+    assert response.json()["response"] == "Fedora is faster."
+    assert response.json()["session_id"]
+
+    (payload,) = stub.requests
+    assert payload["stream"] is True
+    assert payload["messages"][0] == {"role": "system", "content": SYSTEM_PROMPT}
+    assert "Ubuntu22.04" in payload["messages"][1]["content"]
+    assert "Fedora40" in payload["messages"][1]["content"]
+    # Raw rows are only sent when asked for
+    assert all("2026-01-01" not in m["content"] for m in payload["messages"])
+    assert payload["messages"][-1] == {
+        "role": "user",
+        "content": "Which OS is faster?",
+    }
+
+
+def test_follow_ups_carry_the_session_history(stub):
+    session_id = ask().json()["session_id"]
+    ask("Why?", session_id=session_id, include_raw=True)
+
+    messages = stub.requests[-1]["messages"]
+    assert any("2026-01-01" in m["content"] for m in messages)
+    assert messages[-3:] == [
+        {"role": "user", "content": "Which OS is faster?"},
+        {"role": "assistant", "content": "Fedora is faster."},
+        {"role": "user", "content": "Why?"},
+    ]
+
+
+def test_repeated_questions_are_answered_from_the_cache(stub):
+    ask()
+    response = ask()
+
+    assert response.json()["response"] == "Fedora is faster."
+    assert len(stub.requests) == 1
+
+
+def test_streams_tokens_as_server_sent_events(stub):
+    response = ask(stream=True)
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = [
+        (block.split("\n")[0], json.loads(block.split("\n")[1][len("data: ") :]))
+        for block in response.text.strip().split("\n\n")
+    ]
+    assert events[0][0] == "event: session"
+    assert [data["token"] for event, data in events if event == "event: token"] == [
+        "Fedora ",
+        "is ",
+        "faster.",
+    ]
+    assert events[-1] == ("event: end", {})
+
+
+@pytest.mark.parametrize("status", [401, 429, 500])
+def test_upstream_errors_map_to_bad_gateway(stub, status):
+    stub.status = status
+    response = ask()
+
+    assert response.status_code == 502
+    assert "Failed to generate response" in response.json()["error"]
+
+
+def test_upstream_errors_end_the_stream_with_an_error_event(stub):
+    stub.status = 500
+    response = ask(stream=True)
+
+    assert response.status_code == 200
+    assert "event: error" in response.text
+    assert response.text.endswith("event: end\ndata: {}\n\n")
+
+
+def test_rejects_a_report_that_cannot_be_parsed(stub):
+    response = ask(csv_data="not,a\nreport")
+
+    assert response.status_code == 400
+    assert "error" in response.json()
+    assert stub.requests == []
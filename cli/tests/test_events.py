@@ -0,0 +1,30 @@
+import asyncio
+
+from app.api import jobs
+from app.api.events import EventBroker
+from app.api.jobs import JobQueue
+
+
+def test_evicted_jobs_release_their_topics(monkeypatch):
+    monkeypatch.setattr(jobs, "MAX_FINISHED_JOBS", 2)
+    broker = EventBroker()
+    queue = JobQueue(on_evict=lambda job: broker.forget(job.id))
+
+    def task(job):
+        broker.close(job.id)
+
+    for _ in range(10):
+        queue.submit(task).future.result()
+    queue.submit(task).future.result()
+
+    assert len(broker.closed_topics) <= 3
+    assert broker.closed_topics <= set(queue.jobs)
+
+
+def test_subscribing_to_a_closed_topic_ends_at_once():
+    async def subscribe():
+        broker = EventBroker()
+        broker.close("job")
+        return [event async for event in broker.stream("job")]
+
+    assert asyncio.run(subscribe()) == ["event: end\ndata: {}\n\n"]
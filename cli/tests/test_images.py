@@ -0,0 +1,106 @@
+import shutil
+import tarfile
+
+import pytest
+from app import images
+from app.images import (
+    ensure_runtime_image,
+    prepare_runtime_images,
+    prune_runtime_images,
+    runtime_image_key,
+)
+from fake_docker import FakeDockerClient
+
+MACHINE = {"name": "Ubuntu22.04", "image": "ubuntu:22.04"}
+VERSION = {
+    **MACHINE,
+    "name": "Ubuntu22.04-python3.12",
+    "distro": "Ubuntu22.04",
+    "runtime": {"python": "3.12"},
+}
+
+
+@pytest.fixture
+def scripts(tmp_path, monkeypatch):
+    """
+    A copy of the install scripts that tests can change.
+    """
+    directory = tmp_path / "scripts"
+    shutil.copytree(images.SCRIPTS_DIRECTORY, directory)
+    monkeypatch.setattr(images, "SCRIPTS_DIRECTORY", directory)
+    return directory
+
+
+@pytest.fixture
+def client():
+    client = FakeDockerClient()
+    client.builds = []
+    build = client.images.build
+
+    def record(**kwargs):
+        with tarfile.open(fileobj=kwargs["fileobj"]) as tar:
+            dockerfile = tar.extractfile("Dockerfile").read().decode()
+        client.builds.append((kwargs["tag"], dockerfile))
+        return build(**kwargs)
+
+    client.images.build = record
+    return client
+
+
+def test_the_key_covers_the_base_image_and_the_script():
+    key = runtime_image_key("sha256:a", b"apt-get install python3")
+
+    assert key == runtime_image_key("sha256:a", b"apt-get install python3")
+    assert key != runtime_image_key("sha256:b", b"apt-get install python3")
+    assert key != runtime_image_key("sha256:a", b"apt-get install nodejs")
+    # The separator keeps the two parts apart
+    assert runtime_image_key("ab", b"c") != runtime_image_key("a", b"bc")
+
+
+def test_runtime_images_are_built_once(scripts, client):
+    tag = ensure_runtime_image(client, MACHINE)
+
+    assert ensure_runtime_image(client, MACHINE) == tag
+    assert [built for built, _ in client.builds] == [tag]
+    labels = client.images.get(tag).labels
+    assert labels[images.RUNTIME_IMAGE_MACHINE_LABEL] == "Ubuntu22.04"
+    assert tag.endswith(labels[images.RUNTIME_IMAGE_KEY_LABEL])
+
+
+def test_runtime_images_are_rebuilt_when_the_install_script_changes(scripts, client):
+    tag = ensure_runtime_image(client, MACHINE)
+    with open(scripts / "linux_install.sh", "a") as script:
+        script.write("\necho changed\n")
+
+    changed = ensure_runtime_image(client, MACHINE)
+
+    assert changed != tag
+    assert [built for built, _ in client.builds] == [tag, changed]
+
+
+def test_runtime_versions_are_built_on_the_distro_image(scripts, client):
+    tag = ensure_runtime_image(client, VERSION)
+
+    (distro, distro_dockerfile), (version, dockerfile) = client.builds
+    assert version == tag
+    assert f"FROM {client.images.get('ubuntu:22.04').id}" in distro_dockerfile
+    assert f"FROM {distro}\n" in dockerfile
+    assert "PYTHON_VERSION=3.12 bash /tmp/runtime_install.sh" in dockerfile
+
+
+def test_prune_keeps_the_images_of_current_keys(scripts, client):
+    tags = prepare_runtime_images(client, [MACHINE, VERSION])
+    distro = tags["Ubuntu22.04"]
+
+    # The distro image stays while a version is built on it, even when the
+    # distro itself is no longer configured
+    assert prune_runtime_images(client, [MACHINE, VERSION]) == []
+    assert prune_runtime_images(client, [VERSION]) == []
+    assert client.images.get(distro)
+
+    with open(scripts / "runtime_install.sh", "a") as script:
+        script.write("\necho changed\n")
+    assert prune_runtime_images(client, [MACHINE, VERSION]) == [
+        tags["Ubuntu22.04-python3.12"]
+    ]
+    assert prune_runtime_images(client, []) == [distro]
@@ -0,0 +1,29 @@
+import threading
+
+from app.api.jobs import CANCELLED, COMPLETED, JobQueue
+
+
+def test_cleanup_runs_after_a_job():
+    cleaned = []
+    queue = JobQueue(max_workers=1)
+    job = queue.submit(lambda job: "done", cleanup=cleaned.append)
+    job.future.result()
+
+    assert job.status == COMPLETED
+    assert cleaned == [job]
+
+
+def test_cleanup_runs_for_a_job_cancelled_while_queued():
+    cleaned = []
+    release = threading.Event()
+    queue = JobQueue(max_workers=1)
+    blocker = queue.submit(lambda job: release.wait())
+    queued = queue.submit(lambda job: None, cleanup=cleaned.append)
+
+    queue.cancel(queued.id)
+    release.set()
+    blocker.future.result()
+
+    assert queued.status == CANCELLED
+    assert queued.finished_at is not None
+    assert cleaned == [queued]
@@ -0,0 +1,21 @@
+import pytest
+from app.machines import expand_machines
+
+
+def test_runtime_versions_become_machines():
+    machines = expand_machines(
+        [{"name": "Ubuntu24.04", "python": ["default", "3.12", "3.13.0rc1"]}],
+        "python",
+    )
+
+    assert [machine["name"] for machine in machines] == [
+        "Ubuntu24.04",
+        "Ubuntu24.04-python3.12",
+        "Ubuntu24.04-python3.13.0rc1",
+    ]
+
+
+@pytest.mark.parametrize("version", ["3.12; rm -rf /", "3.12 ", "$(id)", "3.12\n", ""])
+def test_invalid_runtime_versions_are_rejected(version):
+    with pytest.raises(ValueError):
+        expand_machines([{"name": "Ubuntu24.04", "python": [version]}], "python")
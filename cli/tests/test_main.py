@@ -0,0 +1,126 @@
+import pytest
+from app import docker_client, main, utils
+from app.main import app
+from fake_docker import FakeDockerClient
+from typer.testing import CliRunner
+
+CONFIG = """
+[[machines]]
+name = "Ubuntu22.04"
+image = "ubuntu:22.04"
+enabled = true
+"""
+
+
+@pytest.fixture
+def config(tmp_path, monkeypatch):
+    path = tmp_path / ".tin-config.toml"
+    path.write_text(CONFIG)
+    monkeypatch.setattr(main, "CONFIG_FILE_PATH", path)
+    return path
+
+
+def benchmark(*options):
+    return CliRunner().invoke(
+        app,
+        ["benchmark", "-dir", ".", "-f", "main.py", "-l", "python", *options],
+    )
+
+
+@pytest.mark.parametrize("options", [[], ["--baseline", "run-id"]])
+def test_a_failed_run_exits_with_an_error(config, monkeypatch, options):
+    def fail(*args, **kwargs):
+        raise RuntimeError("Docker is not running")
+
+    monkeypatch.setattr(utils, "run_docker_containers_and_collect_stats", fail)
+    monkeypatch.setattr(
+        "app.regression.load_baseline", lambda baseline, store: {"Ubuntu22.04": [1]}
+    )
+
+    result = benchmark(*options)
+
+    assert result.exit_code == 1
+    assert "Docker is not running" in result.output
+    assert "Execution successful" not in result.output
+
+
+def test_a_successful_run_exits_cleanly(config, monkeypatch):
+    monkeypatch.setattr(
+        utils,
+        "run_docker_containers_and_collect_stats",
+        lambda *args, **kwargs: [{"container": "Ubuntu22.04", "success": True}],
+    )
+
+    result = benchmark()
+
+    assert result.exit_code == 0
+    assert "Execution successful" in result.output
+
+
+@pytest.fixture
+def docker(config, tmp_path, monkeypatch):
+    """
+    Runs the benchmark command against a fake Docker daemon, in a directory
+    of its own.
+    """
+    client = FakeDockerClient(frame_interval=0.01, exec_seconds=0.05)
+    monkeypatch.setattr(docker_client, "_client", client)
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "main.py").write_text("print('hello')\n")
+    return client
+
+
+def baseline(monkeypatch, timings):
+    monkeypatch.setattr("app.regression.load_baseline", lambda baseline, store: timings)
+    return ["--baseline", "baseline.json"]
+
+
+def test_a_failing_entry_point_exits_with_an_error(docker):
+    docker.exit_code = 1
+
+    result = benchmark("--no-pool")
+
+    assert result.exit_code == 1
+    assert "Execution failed on Ubuntu22.04" in result.output
+    assert "Execution successful" not in result.output
+
+
+def test_a_failing_entry_point_fails_the_baseline_comparison(docker, monkeypatch):
+    docker.exit_code = 1
+
+    result = benchmark(
+        "--no-pool", *baseline(monkeypatch, {"Ubuntu22.04": [0.05, 0.05]})
+    )
+
+    assert result.exit_code == 1
+    # Without timings the machine compares as missing, not as regressed
+    assert "Missing from the run or the baseline: Ubuntu22.04" in result.output
+
+
+def test_a_machine_that_does_not_start_exits_with_an_error(docker, monkeypatch):
+    def fail(*args, **kwargs):
+        raise RuntimeError("no space left on device")
+
+    monkeypatch.setattr(docker.containers, "run", fail)
+
+    result = benchmark("--no-pool")
+
+    assert result.exit_code == 1
+    assert "Execution failed on Ubuntu22.04" in result.output
+
+
+def test_a_machine_missing_from_the_run_exits_with_an_error(docker, monkeypatch):
+    timings = {"Ubuntu22.04": [0.05] * 4, "Fedora40": [0.05] * 4}
+
+    result = benchmark("--no-pool", "--runs", "4", *baseline(monkeypatch, timings))
+
+    assert result.exit_code == 1
+    assert "Execution successful" in result.output
+    assert "Missing from the run or the baseline: Fedora40" in result.output
+
+
+def test_a_passing_entry_point_exits_cleanly(docker):
+    result = benchmark("--no-pool")
+
+    assert result.exit_code == 0, result.output
+    assert "Execution successful" in result.output
@@ -0,0 +1,191 @@
+import pytest
+from app.metrics import (
+    BYTES_PER_MB,
+    add_io_rate,
+    blkio_totals,
+    cgroup_metrics,
+    cpu_percentage,
+    docker_stats_metrics,
+    subtract_baseline,
+)
+
+
+def cpu(total_usage, system_cpu_usage, online_cpus=4, percpu_usage=None):
+    usage = {"total_usage": total_usage}
+    if percpu_usage is not None:
+        usage["percpu_usage"] = percpu_usage
+    return {
+        "cpu_usage": usage,
+        "system_cpu_usage": system_cpu_usage,
+        "online_cpus": online_cpus,
+    }
+
+
+def frame(**overrides):
+    """
+    A Docker stats frame of a container that used 1.5 of 4 cores.
+    """
+    return {
+        "cpu_stats": {
+            **cpu(3_000_000_000, 8_000_000_000),
+            "throttling_data": {"throttled_periods": 7, "throttled_time": 250_000_000},
+        },
+        "precpu_stats": cpu(1_500_000_000, 4_000_000_000),
+        "memory_stats": {"usage": 64 * BYTES_PER_MB, "max_usage": 96 * BYTES_PER_MB},
+        "networks": {
+            "eth0": {"rx_bytes": 2 * BYTES_PER_MB, "tx_bytes": BYTES_PER_MB},
+            "eth1": {"rx_bytes": BYTES_PER_MB, "tx_bytes": 0},
+        },
+        "blkio_stats": {
+            "io_service_bytes_recursive": [
+                {"major": 8, "minor": 0, "op": "Read", "value": 4 * BYTES_PER_MB},
+                {"major": 8, "minor": 0, "op": "Write", "value": 8 * BYTES_PER_MB},
+                {"major": 8, "minor": 0, "op": "Total", "value": 12 * BYTES_PER_MB},
+                {"major": 8, "minor": 16, "op": "read", "value": BYTES_PER_MB},
+            ],
+            "io_serviced_recursive": [
+                {"op": "Read", "value": 10},
+                {"op": "Write", "value": 20},
+                {"op": "Total", "value": 30},
+            ],
+        },
+        **overrides,
+    }
+
+
+def test_cpu_percentage_from_the_precpu_delta():
+    # 1.5e9 ns of CPU over 4e9 ns of system time on 4 cores: 1.5 cores
+    assert cpu_percentage(frame()) == pytest.approx(150)
+
+
+def test_the_first_frame_has_no_cpu_percentage():
+    assert cpu_percentage(frame(precpu_stats={})) == 0
+    assert cpu_percentage(frame(precpu_stats=cpu(0, 0))) == 0
+
+
+def test_no_system_time_means_no_cpu_percentage():
+    stats = frame(precpu_stats=cpu(1_500_000_000, 8_000_000_000))
+    assert cpu_percentage(stats) == 0
+
+
+def test_cpus_are_counted_from_percpu_usage_without_online_cpus():
+    stats = frame(
+        cpu_stats=cpu(3_000_000_000, 8_000_000_000, None, [1, 1]),
+        precpu_stats=cpu(1_500_000_000, 4_000_000_000, None),
+    )
+    assert cpu_percentage(stats) == pytest.approx(75)
+
+
+def test_blkio_sums_reads_and_writes_of_every_device():
+    assert blkio_totals(frame()) == {
+        "read_bytes": 5 * BYTES_PER_MB,
+        "write_bytes": 8 * BYTES_PER_MB,
+        "read_ops": 10,
+        "write_ops": 20,
+    }
+
+
+def test_blkio_is_empty_on_cgroup_v2():
+    # Docker reports these lists as null when it has no v1 blkio stats
+    stats = frame(
+        blkio_stats={
+            "io_service_bytes_recursive": None,
+            "io_serviced_recursive": None,
+        }
+    )
+    assert blkio_totals(stats) == {
+        "read_bytes": 0,
+        "write_bytes": 0,
+        "read_ops": 0,
+        "write_ops": 0,
+    }
+    assert blkio_totals(frame(blkio_stats=None))["read_bytes"] == 0
+
+
+def test_docker_stats_metrics():
+    assert docker_stats_metrics(frame()) == {
+        "cpu_usage_percentage": pytest.approx(150),
+        "memory_usage_mb": 64,
+        "memory_peak_mb": 96,
+        "network_received_mb": 3,
+        "network_sent_mb": 1,
+        "disk_read_mb": 5,
+        "disk_write_mb": 8,
+        "disk_read_ops": 10,
+        "disk_write_ops": 20,
+        "cpu_throttled_periods": 7,
+        "cpu_throttled_seconds": 0.25,
+    }
+
+
+def test_docker_stats_metrics_of_a_container_without_a_network():
+    metrics = docker_stats_metrics(frame(networks=None))
+    assert metrics["network_received_mb"] == metrics["network_sent_mb"] == 0
+
+
+def counters(time, cpu_usage_usec):
+    return {
+        "time": time,
+        "cpu_usage_usec": cpu_usage_usec,
+        "memory_current": 32 * BYTES_PER_MB,
+        "memory_peak": 48 * BYTES_PER_MB,
+        "network_rx_bytes": BYTES_PER_MB,
+        "network_tx_bytes": 2 * BYTES_PER_MB,
+        "io_read_bytes": 3 * BYTES_PER_MB,
+        "io_write_bytes": 4 * BYTES_PER_MB,
+        "io_read_ops": 5,
+        "io_write_ops": 6,
+        "nr_throttled": 2,
+        "throttled_usec": 500_000,
+    }
+
+
+def test_cgroup_metrics():
+    # 100 ms of CPU time over 50 ms: two cores
+    metrics = cgroup_metrics(counters(10.0, 1_000_000), counters(10.05, 1_100_000))
+
+    assert metrics == {
+        "cpu_usage_percentage": pytest.approx(200),
+        "memory_usage_mb": 32,
+        "memory_peak_mb": 48,
+        "network_received_mb": 1,
+        "network_sent_mb": 2,
+        "disk_read_mb": 3,
+        "disk_write_mb": 4,
+        "disk_read_ops": 5,
+        "disk_write_ops": 6,
+        "cpu_throttled_periods": 2,
+        "cpu_throttled_seconds": 0.5,
+    }
+
+
+def test_the_first_cgroup_sample_has_no_cpu_usage():
+    assert cgroup_metrics(None, counters(10.0, 1_000_000))["cpu_usage_percentage"] == 0
+    same_time = cgroup_metrics(counters(10.0, 0), counters(10.0, 1_000_000))
+    assert same_time["cpu_usage_percentage"] == 0
+
+
+def test_iops_from_the_previous_sample():
+    previous = {"monotonic": 1.0, "disk_read_ops": 10, "disk_write_ops": 20}
+    sample = {"monotonic": 1.5, "disk_read_ops": 15, "disk_write_ops": 30}
+
+    add_io_rate(sample, previous)
+    assert sample["disk_read_iops"] == 10
+    assert sample["disk_write_iops"] == 20
+
+    first = add_io_rate(dict(sample), None)
+    assert first["disk_read_iops"] == first["disk_write_iops"] == 0
+
+
+def test_cumulative_metrics_are_relative_to_the_baseline():
+    baseline = docker_stats_metrics(frame())
+    sample = docker_stats_metrics(
+        frame(networks={"eth0": {"rx_bytes": 0, "tx_bytes": 0}})
+    )
+
+    subtract_baseline(sample, baseline)
+    assert sample["disk_read_mb"] == 0
+    # Counters that went back, e.g. after a network reset, do not go negative
+    assert sample["network_received_mb"] == 0
+    # Gauges are left alone
+    assert sample["memory_usage_mb"] == 64
@@ -0,0 +1,123 @@
+import threading
+import time
+
+import pytest
+from app.pipeline import REPORT_FLUSH_INTERVAL, ReportWriter
+
+
+class FakeStore:
+    """
+    Records the writes of a ReportWriter. Writes wait while `gate` is clear.
+    """
+
+    def __init__(self, error=None):
+        self.calls = []
+        self.error = error
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def add_samples(self, run_id, rows):
+        self.gate.wait()
+        if self.error is not None:
+            raise self.error
+        self.calls.append(("add_samples", run_id, list(rows), time.monotonic()))
+
+    def set_execution_time(self, run_id, machine_name, execution_time):
+        self.calls.append(("set_execution_time", run_id, machine_name, execution_time))
+
+    def batches(self):
+        return [call[2] for call in self.calls if call[0] == "add_samples"]
+
+
+def wait_for(condition, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_full_batches_are_written_without_waiting_for_the_interval():
+    store = FakeStore()
+    writer = ReportWriter(store, "run", batch_size=3, flush_interval=60).start()
+
+    for row in range(7):
+        writer.put(row)
+    wait_for(lambda: len(store.batches()) == 2)
+    assert store.batches() == [[0, 1, 2], [3, 4, 5]]
+
+    stats = writer.close()
+    assert store.batches() == [[0, 1, 2], [3, 4, 5], [6]]
+    assert stats["rows"] == 7 and stats["batches"] == 3
+
+
+def test_partial_batches_are_written_after_the_flush_interval():
+    store = FakeStore()
+    writer = ReportWriter(store, "run").start()
+
+    started = time.monotonic()
+    writer.put("row")
+    time.sleep(REPORT_FLUSH_INTERVAL / 2)
+    assert store.batches() == []
+
+    wait_for(lambda: store.batches())
+    _, _, rows, written = store.calls[0]
+    assert rows == ["row"]
+    assert written - started >= REPORT_FLUSH_INTERVAL * 0.9
+    writer.close()
+
+
+def test_close_writes_everything_still_queued():
+    store = FakeStore()
+    store.gate.clear()
+    writer = ReportWriter(store, "run", batch_size=2, flush_interval=60).start()
+
+    for row in range(5):
+        writer.put(row)
+    writer.set_execution_time("Ubuntu22.04", 1.5)
+    writer.put(5)
+    store.gate.set()
+    writer.close()
+
+    assert store.batches() == [[0, 1], [2, 3], [4], [5]]
+    # The rows before the execution time are written before it
+    assert store.calls[3][:4] == ("set_execution_time", "run", "Ubuntu22.04", 1.5)
+    assert not writer.thread.is_alive()
+    # Closing twice is harmless
+    writer.close()
+
+
+def test_time_spent_blocked_on_a_full_queue_is_counted():
+    store = FakeStore()
+    store.gate.clear()
+    writer = ReportWriter(store, "run", queue_size=1, batch_size=1).start()
+
+    writer.put(0)
+    wait_for(lambda: writer.queue.empty())
+    # The writer is stuck on row 0 with row 1 queued, so row 2 waits
+    writer.put(1)
+    threading.Timer(0.2, store.gate.set).start()
+    writer.put(2)
+    stats = writer.close()
+
+    assert store.batches() == [[0], [1], [2]]
+    assert stats["blocked_seconds"] >= 0.15
+    assert stats["max_queue_depth"] == 1
+
+
+def test_an_unblocked_writer_has_no_blocked_time():
+    writer = ReportWriter(FakeStore(), "run").start()
+    for row in range(10):
+        writer.put(row)
+
+    assert writer.close()["blocked_seconds"] == 0
+
+
+def test_store_errors_are_raised_on_close():
+    store = FakeStore(error=OSError("disk full"))
+    writer = ReportWriter(store, "run", queue_size=2, batch_size=1).start()
+
+    # The writer keeps draining, so a sampler never blocks on it
+    for row in range(10):
+        writer.put(row)
+    with pytest.raises(OSError, match="disk full"):
+        writer.close()
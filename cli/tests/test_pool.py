@@ -0,0 +1,112 @@
+import os
+import types
+
+import pytest
+
+from app.pool import IDLE_MARKER, LEASE_DIRECTORY, ContainerPool
+from fake_docker import FakeDockerClient
+
+MACHINE = {"name": "Ubuntu22.04", "image": "ubuntu:22.04"}
+
+
+def make_pool():
+    return ContainerPool(client=FakeDockerClient())
+
+
+def test_release_kills_leftover_processes_before_idling(tmp_path):
+    pool = make_pool()
+    lease = pool.acquire(MACHINE, str(tmp_path))
+    commands = []
+    exec_run = lease.container.exec_run
+
+    def record(command, **kwargs):
+        commands.append(command)
+        return exec_run(command, **kwargs)
+
+    lease.container.exec_run = record
+    pool.release(lease)
+
+    script = commands[-1][-1]
+    assert script.index("kill -9 -1") < script.index(f"rm -rf {LEASE_DIRECTORY}")
+    assert IDLE_MARKER in lease.container.files
+    assert lease.container.status == "running"
+
+
+def test_release_removes_a_container_that_cannot_be_cleaned(tmp_path):
+    pool = make_pool()
+    lease = pool.acquire(MACHINE, str(tmp_path))
+    lease.container.exec_run = lambda command, **kwargs: types.SimpleNamespace(
+        exit_code=126, output=b""
+    )
+    pool.release(lease)
+
+    assert lease.container.status == "removed"
+    assert pool.pooled_containers(MACHINE["name"]) == []
+
+
+def test_containers_outside_the_pool_mount_a_private_copy(tmp_path):
+    code = tmp_path / "files"
+    code.mkdir()
+    (code / "main.py").write_text("print('hello')\n")
+    pool = ContainerPool(client=FakeDockerClient(), max_size=0)
+
+    lease = pool.acquire(MACHINE, str(code), private=True)
+    (mounted,) = lease.container.options["volumes"]
+    assert mounted == lease.copy and mounted != str(code)
+    assert (
+        os.stat(os.path.join(mounted, "main.py")).st_ino
+        != os.stat(code / "main.py").st_ino
+    )
+
+    pool.release(lease)
+    assert not os.path.exists(lease.copy)
+    assert (code / "main.py").read_text() == "print('hello')\n"
+
+
+def test_containers_outside_the_pool_mount_the_code_itself_by_default(tmp_path):
+    pool = ContainerPool(client=FakeDockerClient(), max_size=0)
+    lease = pool.acquire(MACHINE, str(tmp_path))
+    assert list(lease.container.options["volumes"]) == [str(tmp_path)]
+    assert lease.copy is None
+
+
+def test_leases_tell_whether_their_container_ran_earlier_code(tmp_path):
+    pool = make_pool()
+    first = pool.acquire(MACHINE, str(tmp_path))
+    assert not first.reused
+    pool.release(first)
+
+    again = pool.acquire(MACHINE, str(tmp_path))
+    assert again.container is first.container
+    assert again.reused
+
+    unpooled = ContainerPool(client=FakeDockerClient(), max_size=0)
+    assert not unpooled.acquire(MACHINE, str(tmp_path)).reused
+
+
+def test_released_containers_are_reused(tmp_path):
+    pool = make_pool()
+    lease = pool.acquire(MACHINE, str(tmp_path))
+    pool.release(lease)
+
+    assert lease.container.status == "running"
+    assert pool.acquire(MACHINE, str(tmp_path)).container is lease.container
+
+
+def test_the_idle_command_is_pid_1_and_exits_on_sigterm(tmp_path):
+    pool = make_pool()
+    lease = pool.acquire(MACHINE, str(tmp_path))
+
+    assert not lease.container.options.get("init")
+    assert "trap 'exit 0' TERM" in lease.container.options["command"][-1]
+
+
+def test_release_removes_containers_outside_the_pool_without_a_grace_period(
+    tmp_path,
+):
+    pool = ContainerPool(client=FakeDockerClient(), max_size=0)
+    lease = pool.acquire(MACHINE, str(tmp_path))
+    lease.container.stop = lambda **kwargs: pytest.fail("stop waits for SIGTERM")
+
+    pool.release(lease)
+    assert lease.container.status == "removed"
@@ -0,0 +1,165 @@
+import threading
+import time
+
+import pytest
+from app.profiles import (
+    CpusetScheduler,
+    container_limits,
+    parse_cpuset,
+    pinned,
+    profile_key,
+    resolve_profile,
+)
+from fake_docker import FakeDockerClient
+
+
+class PinnedContainer:
+    """
+    Records the cpusets a container is pinned to.
+    """
+
+    def __init__(self):
+        self.cpusets = []
+
+    def update(self, cpuset_cpus):
+        self.cpusets.append(cpuset_cpus)
+
+
+def run_machines(scheduler, count, seconds=0.05):
+    """
+    Runs `count` machines at once on the scheduler. Returns the CPUs each one
+    got and the largest number of machines that ran at the same time.
+    """
+    lock = threading.Lock()
+    running = []
+    state = {"most": 0}
+    cpus = {}
+
+    def run(index):
+        with scheduler.pinned(PinnedContainer()) as taken:
+            with lock:
+                for other in running:
+                    assert not set(taken) & set(cpus[other])
+                cpus[index] = taken
+                running.append(index)
+                state["most"] = max(state["most"], len(running))
+            time.sleep(seconds)
+            with lock:
+                running.remove(index)
+
+    threads = [threading.Thread(target=run, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return cpus, state["most"]
+
+
+def test_machines_running_at_the_same_time_get_disjoint_cpus():
+    scheduler = CpusetScheduler.for_profile(FakeDockerClient(cpus=4), {"cpus": 1})
+
+    cpus, most = run_machines(scheduler, 4)
+
+    assert most == 4
+    assert sorted(cpu for taken in cpus.values() for cpu in taken) == [0, 1, 2, 3]
+
+
+def test_machines_that_do_not_fit_wait_for_a_turn():
+    scheduler = CpusetScheduler.for_profile(FakeDockerClient(cpus=4), {"cpus": 1.5})
+    assert scheduler.slots == 2
+
+    cpus, most = run_machines(scheduler, 5)
+
+    assert most == 2
+    assert len(cpus) == 5
+    assert all(len(taken) == 2 for taken in cpus.values())
+    assert sorted(scheduler.free) == [0, 1, 2, 3]
+
+
+def test_containers_go_back_on_every_cpu_after_their_run():
+    scheduler = CpusetScheduler.for_profile(
+        FakeDockerClient(cpus=8), {"cpus": 2, "cpuset": "2-5"}
+    )
+    container = PinnedContainer()
+
+    with scheduler.pinned(container) as taken:
+        assert taken == [2, 3]
+    assert container.cpusets == ["2,3", "2,3,4,5"]
+
+
+def test_profiles_without_cpus_are_not_pinned():
+    assert CpusetScheduler.for_profile(FakeDockerClient(), {"mem_limit": "1g"}) is None
+    container = PinnedContainer()
+    with pinned(None, container):
+        pass
+    assert container.cpusets == []
+
+
+def test_machines_wider_than_the_host_are_rejected():
+    with pytest.raises(ValueError):
+        CpusetScheduler.for_profile(FakeDockerClient(cpus=2), {"cpus": 3})
+
+
+def test_built_in_and_configured_profiles():
+    assert resolve_profile("default") == {"name": "default"}
+    assert resolve_profile("pinned")["cpus"] == 1
+    # Profiles from the config file take precedence
+    assert resolve_profile("pinned", {"pinned": {"cpus": 2}}) == {
+        "name": "pinned",
+        "cpus": 2,
+    }
+
+
+@pytest.mark.parametrize(
+    "options",
+    [
+        {"cpus": 0},
+        {"cpus": -1},
+        {"cpus": "many"},
+        {"cpuset": "0-"},
+        {"cpuset": "3-1"},
+        {"cpuset": "a,b"},
+        {"cpuset": ""},
+        {"pids_limit": 0},
+        {"memory": "1g"},
+    ],
+)
+def test_invalid_profiles_are_rejected(options):
+    with pytest.raises(ValueError):
+        resolve_profile("custom", {"custom": options})
+
+
+def test_unknown_profiles_are_rejected():
+    with pytest.raises(ValueError, match="available: default, pinned"):
+        resolve_profile("turbo")
+
+
+def test_cpusets_are_expanded():
+    assert parse_cpuset("0-3,8, 6") == [0, 1, 2, 3, 6, 8]
+
+
+def test_container_limits():
+    assert container_limits(None) == {}
+    assert container_limits(
+        {
+            "name": "x",
+            "cpus": 1.5,
+            "cpuset": "3,0-1",
+            "mem_limit": "1g",
+            "pids_limit": "64",
+        }
+    ) == {
+        "nano_cpus": 1_500_000_000,
+        "cpuset_cpus": "0,1,3",
+        "mem_limit": "1g",
+        "memswap_limit": "1g",
+        "pids_limit": 64,
+    }
+
+
+def test_profiles_with_the_same_limits_share_a_key():
+    assert profile_key(None) == profile_key({"name": "default"}) == ""
+    assert profile_key({"name": "a", "cpus": 1}) == profile_key(
+        {"name": "b", "cpus": 1}
+    )
+    assert profile_key({"cpus": 1}) != profile_key({"cpus": 2})
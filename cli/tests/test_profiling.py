@@ -0,0 +1,97 @@
+import io
+import json
+import shlex
+import subprocess
+import sys
+import tarfile
+
+import pytest
+from app.execution import RUN_PLACEHOLDER, build_command, timed_command
+from app.profiling import collect_profiles, profiled_command
+
+
+def cpuprofile(seconds):
+    """
+    A V8 profile that spent `seconds` in one function.
+    """
+    return {
+        "nodes": [
+            {
+                "id": 1,
+                "callFrame": {"functionName": "(root)", "url": ""},
+                "children": [2],
+            },
+            {"id": 2, "callFrame": {"functionName": "work", "url": "/app/main.js"}},
+        ],
+        "samples": [2],
+        "timeDeltas": [seconds * 1e6],
+    }
+
+
+class ProfiledContainer:
+    """
+    A container whose profile directory holds the given files.
+    """
+
+    def __init__(self, files):
+        self.files = files
+
+    def exec_run(self, command, **kwargs):
+        pass
+
+    def get_archive(self, path):
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode="w") as tar:
+            for name, data in self.files.items():
+                info = tarfile.TarInfo(f"tin-profile/{name}")
+                info.size = len(data)
+                tar.addfile(info, io.BytesIO(data))
+        return [buffer.getvalue()], {}
+
+
+def test_every_run_writes_its_own_profile():
+    assert f"-o /tmp/tin-profile/{RUN_PLACEHOLDER}.prof" in profiled_command(
+        "python", "main.py"
+    )
+    assert f"--cpu-prof-name={RUN_PLACEHOLDER}.cpuprofile" in profiled_command(
+        "javascript", "main.js"
+    )
+
+
+@pytest.mark.parametrize("file", ["my code/main.py", "main.py; rm -rf /app"])
+@pytest.mark.parametrize("language", ["python", "javascript"])
+def test_the_entry_point_stays_one_argument(language, file):
+    for command in (build_command(language, file), profiled_command(language, file)):
+        assert timed_command(command)[-1] == file
+
+
+def test_the_harness_labels_measured_and_warmup_runs(tmp_path):
+    touch = f"{sys.executable} -c 'import sys; open(sys.argv[1], \"w\")'"
+    command = timed_command(f"{touch} {shlex.quote(str(tmp_path))}/{{run}}.prof", 2, 1)
+    command[0] = sys.executable
+
+    subprocess.run(command, check=True)
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "run-0.prof",
+        "run-1.prof",
+        "warmup-0.prof",
+    ]
+
+
+def test_warmup_profiles_are_left_out(tmp_path):
+    container = ProfiledContainer(
+        {
+            "warmup-0.cpuprofile": json.dumps(cpuprofile(100)).encode(),
+            "run-0.cpuprofile": json.dumps(cpuprofile(1)).encode(),
+            "run-1.cpuprofile": json.dumps(cpuprofile(3)).encode(),
+        }
+    )
+
+    functions = collect_profiles(container, "javascript", tmp_path)
+
+    assert functions["work (main.js)"]["self_seconds"] == pytest.approx(2)
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "run-0.cpuprofile",
+        "run-1.cpuprofile",
+    ]
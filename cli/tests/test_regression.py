@@ -0,0 +1,127 @@
+import json
+import math
+
+import pytest
+from app.regression import (
+    IMPROVED,
+    INSUFFICIENT,
+    MISSING,
+    REGRESSED,
+    UNCHANGED,
+    _tied_tail,
+    bootstrap_change,
+    compare_machine,
+    compare_runs,
+    mann_whitney,
+    write_diff,
+)
+
+
+@pytest.mark.parametrize(
+    "baseline, current, p_value",
+    [
+        # Only one of the 20 orderings of 3 vs 3 is this extreme
+        ([1, 2, 3], [4, 5, 6], 1 / 20),
+        ([1, 2, 3], [1.5, 2.5, 3.5], 7 / 20),
+        ([4, 5, 6], [1, 2, 3], 1.0),
+        ([1, 2, 3, 4], [5, 6, 7, 8], 1 / 70),
+    ],
+)
+def test_exact_p_values_without_ties(baseline, current, p_value):
+    assert mann_whitney(baseline, current) == pytest.approx(p_value)
+
+
+def test_tied_samples_use_the_exact_null_of_their_ranks():
+    # The smallest p-value 3 vs 3 timings can produce, not the normal
+    # approximation's 0.023
+    assert mann_whitney([1, 1, 1], [2, 2, 2]) == pytest.approx(1 / 20)
+    # All six tied: every ordering has the same rank sum
+    assert mann_whitney([1, 1, 1], [1, 1, 1]) == 1.0
+
+
+def test_the_tied_null_matches_the_untied_one_for_distinct_ranks():
+    baseline, current = [1, 3, 4, 8, 9], [2, 5, 6, 7, 10]
+    ranks = list(range(1, 11))
+    rank_sum = sum(ranks[value - 1] for value in current)
+
+    assert _tied_tail(ranks, 5, rank_sum) == pytest.approx(
+        mann_whitney(baseline, current)
+    )
+
+
+def test_large_samples_use_the_normal_approximation():
+    baseline = [float(value) for value in range(1, 26)]
+    current = [value + 10.5 for value in baseline]
+    n = m = 25
+    u = sum(1 for b in baseline for c in current if c > b)
+    z = (u - n * m / 2 - 0.5) / math.sqrt(n * m * (n + m + 1) / 12)
+
+    assert mann_whitney(baseline, current) == pytest.approx(
+        0.5 * math.erfc(z / math.sqrt(2))
+    )
+
+
+def test_bootstrap_interval_of_the_change():
+    assert bootstrap_change([1.0] * 5, [1.1] * 5) == pytest.approx((0.1, 0.1))
+
+    low, high = bootstrap_change([1.0, 1.1, 0.9, 1.0], [1.2, 1.3, 1.1, 1.2])
+    assert 0 < low <= 0.2 <= high
+    # The same timings always give the same interval
+    assert bootstrap_change([1.0, 1.1, 0.9, 1.0], [1.2, 1.3, 1.1, 1.2]) == (
+        low,
+        high,
+    )
+
+
+def test_bootstrap_interval_without_a_baseline_median():
+    assert bootstrap_change([0, 0], [1, 1]) == (None, None)
+
+
+@pytest.mark.parametrize(
+    "baseline, current, status",
+    [
+        ([1.0, 1.01, 0.99, 1.0, 1.02], [1.5, 1.52, 1.49, 1.51, 1.5], REGRESSED),
+        ([1.5, 1.52, 1.49, 1.51, 1.5], [1.0, 1.01, 0.99, 1.0, 1.02], IMPROVED),
+        ([1.0, 1.01, 0.99, 1.0, 1.02], [1.0, 1.02, 0.98, 1.01, 1.0], UNCHANGED),
+        # Significantly slower, but by less than the threshold
+        ([1.0, 1.001, 0.999, 1.0, 1.002], [1.01, 1.011, 1.009, 1.01, 1.012], UNCHANGED),
+        # Too few runs to reach significance
+        ([1.0, 1.0, 1.0], [2.0, 2.0, 2.0], UNCHANGED),
+        ([1.0], [2.0, 2.1], INSUFFICIENT),
+        ([1.0, 1.1], None, MISSING),
+        (None, [1.0, 1.1], MISSING),
+    ],
+)
+def test_statuses(baseline, current, status):
+    assert compare_machine("Ubuntu22.04", baseline, current, 0.05)["status"] == status
+
+
+def test_machines_missing_from_the_run_are_reported():
+    comparisons = compare_runs(
+        {"Ubuntu22.04": [1.0, 1.1], "Fedora40": [1.0, 1.1]},
+        [{"container": "Ubuntu22.04", "timings": [1.0, 1.1]}],
+        0.05,
+    )
+
+    assert [(c["machine"], c["status"]) for c in comparisons] == [
+        ("Ubuntu22.04", UNCHANGED),
+        ("Fedora40", MISSING),
+    ]
+
+
+def test_write_diff_round_trip(tmp_path):
+    comparisons = [
+        compare_machine(
+            "Ubuntu22.04", [1.0, 1.01, 0.99, 1.0], [1.5, 1.5, 1.49, 1.52], 0.05
+        ),
+        compare_machine("Fedora40", [1.0, 1.1], None, 0.05),
+    ]
+    output_file = tmp_path / "tin-diff.json"
+
+    diff = write_diff(output_file, "baseline.json", "run-1", comparisons, 0.05)
+
+    with open(output_file) as file:
+        assert json.load(file) == diff
+    assert diff["regressed"]
+    assert diff["baseline"] == "baseline.json" and diff["run_id"] == "run-1"
+    assert [machine["status"] for machine in diff["machines"]] == [REGRESSED, MISSING]
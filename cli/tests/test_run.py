@@ -0,0 +1,150 @@
+import pytest
+from app import docker_client, utils
+from app.api import utils as api_utils
+from app.api.utils import create_machine_config, run_code_in_container
+from app.pool import LEASE_DIRECTORY, ContainerPool
+from app.store import ResultsStore
+from app.utils import run_docker_containers_and_collect_stats
+from fake_docker import FakeDockerClient
+
+MACHINES = ["Ubuntu22.04", "Ubuntu24.04"]
+
+
+class FailingPool(ContainerPool):
+    """
+    A pool whose first releases fail.
+    """
+
+    def __init__(self, client, failures):
+        super().__init__(client=client)
+        self.failures = failures
+        self.released = []
+
+    def release(self, lease):
+        self.released.append(lease.machine_name)
+        if len(self.released) <= self.failures:
+            raise RuntimeError("daemon went away")
+        super().release(lease)
+
+
+def run(tmp_path, client, container_pool):
+    (tmp_path / "main.py").write_text("print('hello')\n")
+    return run_code_in_container(
+        create_machine_config(MACHINES, "python"),
+        str(tmp_path),
+        "python",
+        "main.py",
+        parallel=2,
+        output_file=str(tmp_path / "tin-report.csv"),
+        client=client,
+        container_pool=container_pool,
+    )
+
+
+def test_every_lease_is_released_and_errors_are_reported(tmp_path):
+    client = FakeDockerClient(frame_interval=0.01, exec_seconds=0.05)
+    container_pool = FailingPool(client, failures=2)
+
+    error = run(tmp_path, client, container_pool)
+
+    assert sorted(container_pool.released) == MACHINES
+    assert error == "; ".join(
+        f"{name}: daemon went away" for name in container_pool.released
+    )
+
+
+def test_leases_are_released_when_the_run_fails(tmp_path, monkeypatch):
+    client = FakeDockerClient(frame_interval=0.01, exec_seconds=0.05)
+    container_pool = ContainerPool(client=client)
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("runner crashed")
+
+    monkeypatch.setattr(api_utils, "run_concurrently", fail)
+    with pytest.raises(RuntimeError):
+        run(tmp_path, client, container_pool)
+
+    containers = client.containers.list()
+    assert len(containers) == len(MACHINES)
+    assert all(LEASE_DIRECTORY not in container.files for container in containers)
+
+
+def test_cli_leases_are_released_when_storing_the_results_fails(tmp_path, monkeypatch):
+    client = FakeDockerClient(frame_interval=0.01, exec_seconds=0.05)
+    monkeypatch.setattr(docker_client, "_client", client)
+    store = ResultsStore(tmp_path / "results.db")
+
+    def fail(*args, **kwargs):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(store, "export_csv", fail)
+    (tmp_path / "main.py").write_text("print('hello')\n")
+    with pytest.raises(OSError):
+        run_docker_containers_and_collect_stats(
+            [{"name": name, "image": name.lower()} for name in MACHINES],
+            "python",
+            str(tmp_path),
+            "main.py",
+            str(tmp_path / "tin-report.csv"),
+            store=store,
+        )
+
+    containers = client.containers.list()
+    assert len(containers) == len(MACHINES)
+    assert all(LEASE_DIRECTORY not in container.files for container in containers)
+
+
+def test_cli_run_is_finished_when_the_runner_fails(tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        docker_client,
+        "_client",
+        FakeDockerClient(frame_interval=0.01, exec_seconds=0.05),
+    )
+    store = ResultsStore(tmp_path / "results.db")
+    writers = []
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("runner crashed")
+
+    def start(writer):
+        writers.append(writer)
+        return start_writer(writer)
+
+    start_writer = utils.ReportWriter.start
+    monkeypatch.setattr(utils, "run_concurrently", fail)
+    monkeypatch.setattr(utils.ReportWriter, "start", start)
+    (tmp_path / "main.py").write_text("print('hello')\n")
+    with pytest.raises(RuntimeError):
+        run_docker_containers_and_collect_stats(
+            [{"name": name, "image": name.lower()} for name in MACHINES],
+            "python",
+            str(tmp_path),
+            "main.py",
+            str(tmp_path / "tin-report.csv"),
+            store=store,
+        )
+
+    (run,) = store.runs()
+    assert run["status"] == "failed"
+    assert not writers[0].thread.is_alive()
+
+
+def test_code_that_exits_nonzero_fails_the_run(tmp_path, monkeypatch):
+    client = FakeDockerClient(frame_interval=0.01, exec_seconds=0.05, exit_code=3)
+
+    error = run(tmp_path, client, ContainerPool(client=client))
+
+    assert error == "Ubuntu22.04: exited with code 3"
+    # The CLI fails the same machines
+    monkeypatch.setattr(docker_client, "_client", client)
+    results = run_docker_containers_and_collect_stats(
+        [{"name": name, "image": name.lower()} for name in MACHINES],
+        "python",
+        str(tmp_path),
+        "main.py",
+        str(tmp_path / "tin-cli-report.csv"),
+    )
+    assert [(result["status"], result["exit_code"]) for result in results] == [
+        ("Failed", 3),
+        ("Failed", 3),
+    ]
@@ -0,0 +1,82 @@
+import threading
+import time
+
+import pytest
+from app.runner import run_concurrently
+
+
+class Overlap:
+    """
+    Tracks the most tasks that were inside a section at the same time.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.inside = 0
+        self.most = 0
+
+    def __enter__(self):
+        with self.lock:
+            self.inside += 1
+            self.most = max(self.most, self.inside)
+
+    def __exit__(self, *exc_info):
+        with self.lock:
+            self.inside -= 1
+
+
+def run_machines(isolated):
+    tasks, measured = Overlap(), Overlap()
+
+    def task(item, timed_section):
+        with tasks:
+            time.sleep(0.02)
+            with timed_section(), measured:
+                time.sleep(0.02)
+            time.sleep(0.02)
+        return item * 2
+
+    results = run_concurrently(range(4), task, parallel=4, isolated=isolated)
+    return results, tasks.most, measured.most
+
+
+def test_isolated_runs_measure_one_machine_at_a_time():
+    results, tasks, measured = run_machines(isolated=True)
+
+    assert results == [0, 2, 4, 6]
+    assert measured == 1
+    # Setup and teardown still overlap
+    assert tasks > 1
+
+
+def test_runs_overlap_without_isolation():
+    results, tasks, measured = run_machines(isolated=False)
+
+    assert results == [0, 2, 4, 6]
+    assert measured > 1
+
+
+def test_an_interrupted_wait_cancels_the_run():
+    cancel_event = threading.Event()
+    running = threading.Event()
+    started, wound_down = [], []
+
+    def task(item, timed_section):
+        started.append(item)
+        if item == 0:
+            running.wait(2)
+            raise KeyboardInterrupt
+        running.set()
+        assert cancel_event.wait(2)
+        time.sleep(0.05)
+        wound_down.append(item)
+
+    began = time.monotonic()
+    with pytest.raises(KeyboardInterrupt):
+        run_concurrently(range(4), task, parallel=2, cancel_event=cancel_event)
+
+    assert cancel_event.is_set()
+    assert time.monotonic() - began < 1
+    # Tasks that were running saw the cancellation, queued ones never started
+    assert sorted(wound_down) == sorted(started)[1:]
+    assert 3 not in started
@@ -0,0 +1,59 @@
+import math
+import random
+
+import pytest
+from app.series import SERIES_COLUMNS, downsample
+
+
+def series(count=1000, seed=1):
+    generator = random.Random(seed)
+    return [
+        {
+            "runtime_seconds": index / 10,
+            **{
+                column: math.sin(index / (position + 3)) * 50 + generator.random()
+                for position, column in enumerate(SERIES_COLUMNS)
+            },
+        }
+        for index in range(count)
+    ]
+
+
+@pytest.mark.parametrize("budget", [1, 2, 5, 10, 19, 20, 21, 29, 50, 100, 500])
+def test_never_returns_more_rows_than_the_budget(budget):
+    rows = series()
+    reduced = downsample(rows, budget)
+
+    assert 0 < len(reduced) <= budget
+    indices = [rows.index(row) for row in reduced]
+    assert indices == sorted(indices)
+
+
+@pytest.mark.parametrize("budget", [20, 50, 500])
+def test_keeps_every_peak_within_the_budget(budget):
+    rows = series()
+    reduced = downsample(rows, budget)
+
+    assert reduced[0] is rows[0] and reduced[-1] is rows[-1]
+    for column in SERIES_COLUMNS:
+        assert max(row[column] for row in reduced) == max(row[column] for row in rows)
+        assert min(row[column] for row in reduced) == min(row[column] for row in rows)
+
+
+def test_small_budgets_keep_the_maxima_first():
+    rows = series()
+    reduced = downsample(rows, 2 + len(SERIES_COLUMNS))
+
+    for column in SERIES_COLUMNS:
+        assert max(row[column] for row in reduced) == max(row[column] for row in rows)
+
+
+def test_large_budgets_use_most_of_the_budget():
+    # LTTB picks overlap between columns, so some of the budget goes unused
+    assert len(downsample(series(), 500)) >= 375
+
+
+def test_short_series_are_kept_whole():
+    rows = series(50)
+    assert downsample(rows, 50) is rows
+    assert downsample(rows, 0) is rows
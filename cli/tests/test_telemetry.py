@@ -0,0 +1,58 @@
+from app.api import main
+from app.telemetry import CONTENT_TYPE, SampleGauges
+from fastapi.testclient import TestClient
+from prometheus_client import CollectorRegistry, generate_latest
+
+
+def make_gauges():
+    gauges = SampleGauges(
+        [
+            ("cpu_usage_percentage", "tin_container_cpu_percent", "CPU usage"),
+            ("memory_usage_mb", "tin_container_memory_mb", "Memory usage"),
+        ]
+    )
+    registry = CollectorRegistry()
+    registry.register(gauges)
+    return gauges, registry
+
+
+def test_sample_gauges_read_the_latest_sample():
+    gauges, registry = make_gauges()
+    gauges.update(
+        "Ubuntu22.04", "a", {"cpu_usage_percentage": 10, "memory_usage_mb": 64}
+    )
+    gauges.update("Fedora40", "a", {"cpu_usage_percentage": 50, "memory_usage_mb": 32})
+    gauges.update(
+        "Ubuntu22.04", "a", {"cpu_usage_percentage": 20, "memory_usage_mb": 65}
+    )
+
+    assert generate_latest(registry).decode() == (
+        "# HELP tin_container_cpu_percent CPU usage\n"
+        "# TYPE tin_container_cpu_percent gauge\n"
+        'tin_container_cpu_percent{machine="Fedora40",run="a"} 50.0\n'
+        'tin_container_cpu_percent{machine="Ubuntu22.04",run="a"} 20.0\n'
+        "# HELP tin_container_memory_mb Memory usage\n"
+        "# TYPE tin_container_memory_mb gauge\n"
+        'tin_container_memory_mb{machine="Fedora40",run="a"} 32.0\n'
+        'tin_container_memory_mb{machine="Ubuntu22.04",run="a"} 65.0\n'
+    )
+
+
+def test_runs_of_the_same_machine_keep_their_own_series():
+    gauges, registry = make_gauges()
+    gauges.update("Fedora40", "a", {"cpu_usage_percentage": 10, "memory_usage_mb": 64})
+    gauges.update("Fedora40", "b", {"cpu_usage_percentage": 50, "memory_usage_mb": 32})
+    gauges.remove("Fedora40", "a")
+
+    text = generate_latest(registry).decode()
+    assert 'run="a"' not in text
+    assert 'tin_container_cpu_percent{machine="Fedora40",run="b"} 50.0' in text
+
+
+def test_serves_the_registry():
+    response = TestClient(main.app).get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == CONTENT_TYPE
+    assert "# TYPE tin_jobs_queued gauge" in response.text
+    assert "\ntin_workers 0.0\n" in response.text
@@ -0,0 +1,121 @@
+import csv
+import math
+
+import pytest
+from app.timing import (
+    SUMMARY_HEADERS,
+    percentile,
+    summarize_timings,
+    t_critical,
+    write_summary_csv,
+)
+
+
+@pytest.mark.parametrize(
+    "degrees_of_freedom, value",
+    [
+        (0, 0),
+        (1, 12.706),
+        (4, 2.776),
+        # Untabulated degrees of freedom round down
+        (11, 2.228),
+        (59, 2.021),
+        (120, 1.980),
+        # Past the table the normal value is used
+        (121, 1.960),
+        (10_000, 1.960),
+    ],
+)
+def test_t_critical(degrees_of_freedom, value):
+    assert t_critical(degrees_of_freedom) == value
+
+
+def test_percentile_interpolates_between_values():
+    assert percentile([5, 1, 4, 2, 3], 0.95) == pytest.approx(4.8)
+    assert percentile([5, 1, 4, 2, 3], 0.5) == 3
+    assert percentile([1, 2], 0.25) == pytest.approx(1.25)
+    assert percentile([7], 0.95) == 7
+    assert percentile([], 0.95) is None
+
+
+def test_summary_of_known_timings():
+    summary = summarize_timings([2.0, 5.0, 1.0, 4.0, 3.0])
+    # stdev of 1..5 is sqrt(2.5); four degrees of freedom
+    half_width = 2.776 * math.sqrt(2.5) / math.sqrt(5)
+
+    assert summary == {
+        "runs": 5,
+        "mean": 3.0,
+        "median": 3.0,
+        "p95": pytest.approx(4.8),
+        "stddev": pytest.approx(math.sqrt(2.5)),
+        "ci_low": pytest.approx(3.0 - half_width),
+        "ci_high": pytest.approx(3.0 + half_width),
+    }
+
+
+def test_summary_of_an_even_number_of_timings():
+    summary = summarize_timings([1.0, 2.0, 3.0, 10.0])
+
+    assert summary["mean"] == 4.0
+    assert summary["median"] == 2.5
+    assert summary["p95"] == pytest.approx(8.95)
+
+
+def test_summary_of_one_timing():
+    assert summarize_timings([1.5]) == {
+        "runs": 1,
+        "mean": 1.5,
+        "median": 1.5,
+        "p95": 1.5,
+        "stddev": 0.0,
+        "ci_low": 1.5,
+        "ci_high": 1.5,
+    }
+
+
+def test_summary_of_identical_timings():
+    summary = summarize_timings([0.25] * 4)
+
+    assert summary["mean"] == summary["median"] == summary["p95"] == 0.25
+    assert summary["stddev"] == 0
+    assert summary["ci_low"] == summary["ci_high"] == 0.25
+
+
+def test_summary_of_no_timings():
+    assert summarize_timings([]) == {
+        "runs": 0,
+        "mean": None,
+        "median": None,
+        "p95": None,
+        "stddev": None,
+        "ci_low": None,
+        "ci_high": None,
+    }
+
+
+def test_summary_csv(tmp_path):
+    output_file = tmp_path / "tin-summary.csv"
+    summaries = [
+        {"container": "Ubuntu22.04", "exit_code": 0, **summarize_timings([1.0, 2.0])},
+        {"container": "Fedora40", "exit_code": 1, **summarize_timings([])},
+    ]
+
+    write_summary_csv(output_file, summaries)
+
+    with open(output_file, newline="") as file:
+        header, ubuntu, fedora = csv.reader(file)
+    assert header == SUMMARY_HEADERS
+    # 1.5 ± 12.706 * 0.7071 / 1.4142
+    assert ubuntu == [
+        "Ubuntu22.04",
+        "2",
+        "1.5",
+        "1.5",
+        "1.95",
+        "0.707107",
+        "-4.853",
+        "7.853",
+        "0",
+    ]
+    assert fedora == ["Fedora40", "0", "", "", "", "", "", "", "1"]
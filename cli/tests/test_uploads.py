@@ -0,0 +1,81 @@
+import hashlib
+import io
+import tarfile
+import warnings
+import zipfile
+
+from app.api.uploads import save_uploads
+
+FIRST = b"print('first')\n"
+SECOND = b"print('second')\n"
+
+
+def blob(blobs, content):
+    return (blobs / hashlib.sha256(content).hexdigest()).read_bytes()
+
+
+def zip_archive(*entries):
+    buffer = io.BytesIO()
+    with warnings.catch_warnings():
+        # zipfile warns about the duplicate names these tests need
+        warnings.simplefilter("ignore")
+        with zipfile.ZipFile(buffer, "w") as archive:
+            for name, content in entries:
+                archive.writestr(name, content)
+    buffer.seek(0)
+    return buffer
+
+
+def tar_archive(*entries):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w") as archive:
+        for name, content in entries:
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            archive.addfile(info, io.BytesIO(content))
+    buffer.seek(0)
+    return buffer
+
+
+def test_duplicate_zip_entries_keep_both_blobs_intact(tmp_path):
+    blobs = tmp_path / "blobs"
+    archive = zip_archive(("main.py", FIRST), ("main.py", SECOND))
+
+    save_uploads(str(tmp_path / "job"), [("code.zip", archive)], blob_directory=blobs)
+
+    assert (tmp_path / "job" / "main.py").read_bytes() == SECOND
+    assert blob(blobs, FIRST) == FIRST
+    assert blob(blobs, SECOND) == SECOND
+
+
+def test_duplicate_tar_entries_keep_both_blobs_intact(tmp_path):
+    blobs = tmp_path / "blobs"
+    archive = tar_archive(("main.py", FIRST), ("./main.py", SECOND))
+
+    save_uploads(str(tmp_path / "job"), [("code.tar", archive)], blob_directory=blobs)
+
+    assert (tmp_path / "job" / "main.py").read_bytes() == SECOND
+    assert blob(blobs, FIRST) == FIRST
+
+
+def test_files_normalized_to_the_same_path(tmp_path):
+    blobs = tmp_path / "blobs"
+    files = [("main.py", io.BytesIO(FIRST)), ("lib/../main.py", io.BytesIO(SECOND))]
+
+    save_uploads(str(tmp_path / "job"), files, blob_directory=blobs)
+
+    assert (tmp_path / "job" / "main.py").read_bytes() == SECOND
+    assert blob(blobs, FIRST) == FIRST
+    assert sorted(p.name for p in (tmp_path / "job").iterdir()) == ["main.py"]
+
+
+def test_copies_keep_both_blobs_intact(tmp_path):
+    blobs = tmp_path / "blobs"
+    archive = zip_archive(("main.py", FIRST), ("main.py", SECOND))
+
+    save_uploads(
+        str(tmp_path / "job"), [("code.zip", archive)], link=False, blob_directory=blobs
+    )
+
+    assert (tmp_path / "job" / "main.py").read_bytes() == SECOND
+    assert blob(blobs, FIRST) == FIRST
@@ -0,0 +1,154 @@
+import io
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+
+import pytest
+from app import docker_client, pool, worker
+from app.api import main
+from app.api import utils as api_utils
+from app.api.utils import create_machine_config
+from app.api.workers import Dispatcher, run_code_on_workers
+from app.store import ResultsStore
+from fake_docker import FakeDockerClient
+from fastapi.testclient import TestClient
+
+MACHINES = ["Ubuntu22.04", "Ubuntu24.04"]
+
+
+class QuickDispatcher(Dispatcher):
+    """
+    Answers empty polls quickly, so agents notice when they are stopped.
+    """
+
+    def poll(self, worker_id, free, images=None, timeout=0.1):
+        return super().poll(worker_id, free, images, timeout)
+
+
+class Backend:
+    """
+    Serves the API to agents over `urllib` without opening a socket.
+    """
+
+    def __init__(self):
+        self.http = TestClient(main.app)
+
+    def urlopen(self, request, timeout=None):
+        if isinstance(request, str):
+            request = urllib.request.Request(request)
+        url = urllib.parse.urlsplit(request.full_url)
+        response = self.http.request(
+            request.get_method(),
+            url.path,
+            content=request.data,
+            headers=dict(request.header_items()),
+        )
+        if response.status_code >= 400:
+            raise urllib.error.HTTPError(
+                request.full_url,
+                response.status_code,
+                response.reason_phrase,
+                response.headers,
+                io.BytesIO(response.content),
+            )
+        return io.BytesIO(response.content)
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    monkeypatch.setattr(main, "dispatcher", QuickDispatcher(affinity_wait=0))
+    backend = Backend()
+    monkeypatch.setattr(urllib.request, "urlopen", backend.urlopen)
+
+    # Agents with a client of their own never touch the local daemon
+    def no_local_daemon():
+        raise AssertionError("The local Docker daemon was used")
+
+    for module in (docker_client, pool, worker, api_utils):
+        monkeypatch.setattr(module, "get_client", no_local_daemon)
+    return backend
+
+
+def start_agents(clients):
+    stop_event = threading.Event()
+    agents = [
+        worker.WorkerAgent("http://backend", name=f"worker-{index}", client=client)
+        for index, client in enumerate(clients)
+    ]
+    threads = []
+    for agent in agents:
+        agent.register()
+        thread = threading.Thread(target=agent.run, args=(stop_event,), daemon=True)
+        thread.start()
+        threads.append(thread)
+    return stop_event, threads
+
+
+def test_each_worker_runs_on_its_own_client(backend, tmp_path):
+    clients = [
+        FakeDockerClient(frame_interval=0.01, exec_seconds=0.3) for _ in range(2)
+    ]
+    stop_event, threads = start_agents(clients)
+
+    folder = tmp_path / "job" / "files"
+    folder.mkdir(parents=True)
+    (folder / "main.py").write_text("print('hello')\n")
+    store = ResultsStore(tmp_path / "results.db")
+    run_id = store.create_run("python", "main.py", source="api")
+
+    try:
+        error = run_code_on_workers(
+            main.dispatcher,
+            run_id,
+            create_machine_config(MACHINES, "python"),
+            str(folder),
+            "python",
+            "main.py",
+            store,
+            run_id,
+            output_file=str(tmp_path / "tin-report.csv"),
+        )
+    finally:
+        stop_event.set()
+        for thread in threads:
+            thread.join(timeout=10)
+
+    assert error is None
+    summaries = {row["container"]: row for row in store.summaries(run_id)}
+    assert set(summaries) == set(MACHINES)
+    assert all(row["status"] == "Success" for row in summaries.values())
+
+    # The two tasks were spread over both workers, one machine each
+    machines = [
+        {c.labels[pool.POOL_MACHINE_LABEL] for c in client.containers.list()}
+        for client in clients
+    ]
+    assert sorted(m for used in machines for m in used) == MACHINES
+    assert all(len(used) == 1 for used in machines)
+    assert store.samples(run_id)
+
+
+def test_accepts_a_missing_execution_time(backend):
+    http = backend.http
+    worker_id = http.post(
+        "/workers", json={"name": "worker", "capacity": 1, "images": []}
+    ).json()["worker_id"]
+    times = []
+    task = main.dispatcher.submit(
+        "job",
+        {"name": "Ubuntu22.04"},
+        "files.tar",
+        {},
+        lambda rows: None,
+        lambda machine_name, execution_time: times.append(execution_time),
+    )
+    assert http.post(f"/workers/{worker_id}/poll", json={"free": 1}).json()["task"]
+
+    response = http.post(
+        f"/workers/{worker_id}/tasks/{task.id}/execution-time",
+        json={"machine_name": "Ubuntu22.04", "execution_time": None},
+    )
+
+    assert response.status_code == 200
+    assert times == [None]
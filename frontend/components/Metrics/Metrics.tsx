@@ -34,6 +34,9 @@ interface MetricData {
   disk_write_mb: number;
   runtime_seconds: number;
   code_execution_time_seconds: number;
+  disk_read_iops: number;
+  disk_write_iops: number;
+  cpu_throttled_periods: number;
 }
 
 interface ChatMessage {
@@ -57,6 +60,7 @@ const Metrics: React.FC = () => {
   const [messages, setMessages] = useState<ChatMessage[]>([]);
   const [newMessage, setNewMessage] = useState('');
   const [isLoading, setIsLoading] = useState(false);
+  const [sessionId, setSessionId] = useState<string | null>(null);
 
   const metricOptions = [
     { value: 'code_execution_time_seconds', label: 'Completion Time' },
@@ -66,6 +70,9 @@ const Metrics: React.FC = () => {
     { value: 'network_sent_mb', label: 'Network Sent' },
     { value: 'disk_read_mb', label: 'Disk Read' },
     { value: 'disk_write_mb', label: 'Disk Write' },
+    { value: 'disk_read_iops', label: 'Disk Read IOPS' },
+    { value: 'disk_write_iops', label: 'Disk Write IOPS' },
+    { value: 'cpu_throttled_periods', label: 'CPU Throttling' },
   ] as const;
 
   useEffect(() => {
@@ -255,6 +262,9 @@ const Metrics: React.FC = () => {
         'disk_write_mb',
         'runtime_seconds',
         'code_execution_time_seconds',
+        'disk_read_iops',
+        'disk_write_iops',
+        'cpu_throttled_periods',
       ].join(',');
 
       const rows = data.map((row) =>
@@ -269,6 +279,9 @@ const Metrics: React.FC = () => {
           row.disk_write_mb,
           row.runtime_seconds,
           row.code_execution_time_seconds,
+          row.disk_read_iops,
+          row.disk_write_iops,
+          row.cpu_throttled_periods,
         ]
           .map((value) => {
             if (value === null || value === undefined) return '';
@@ -289,6 +302,7 @@ const Metrics: React.FC = () => {
         body: JSON.stringify({
           user_prompt: newMessage,
           csv_data: csvData,
+          session_id: sessionId,
         }),
       });
 
@@ -302,6 +316,8 @@ const Metrics: React.FC = () => {
         throw new Error('Invalid response format from server');
       }
 
+      setSessionId(result.session_id);
+
       setMessages((prev) => [
         ...prev,
         { role: 'assistant', content: result.response },
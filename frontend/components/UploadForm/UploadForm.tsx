@@ -92,6 +92,23 @@ const formSchema = z.object({
   entryPoint: z.string().min(1, 'Entry point is required'),
 });
 
+const JOB_POLL_INTERVAL_MS = 2000;
+
+async function waitForJob(jobURL: string) {
+  while (true) {
+    const response = await fetch(jobURL);
+    if (!response.ok) {
+      throw new Error(`HTTP error! status: ${response.status}`);
+    }
+    const job = await response.json();
+    if (job.status === 'completed') return job;
+    if (job.status === 'failed' || job.status === 'cancelled') {
+      throw new Error(job.error || `Job ${job.status}`);
+    }
+    await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+  }
+}
+
 export default function UploadForm() {
   const [files, setFiles] = useState<File[]>([]);
   const [downloadLink, setDownloadLink] = useState<string | null>(null);
@@ -121,9 +138,9 @@ export default function UploadForm() {
     formData.append('language', values.language);
     formData.append('entryPoint', values.entryPoint);
 
-    const backendURL = 'http://localhost:8000/upload';
+    const backendURL = 'http://localhost:8000';
 
-    fetch(backendURL, {
+    fetch(`${backendURL}/upload`, {
       method: 'POST',
       body: formData,
     })
@@ -133,11 +150,12 @@ export default function UploadForm() {
         }
         return response.json();
       })
-      .then((data) => {
-        if (data.path) {
-          const link = `http://localhost:8000/public/${data.path}`;
+      .then((data) => waitForJob(`${backendURL}/jobs/${data.job_id}`))
+      .then((job) => {
+        if (job.result?.path) {
+          const link = `http://localhost:8000/public/${job.result.path}`;
           setDownloadLink(link);
-          console.log('Performance metrics generated:', data);
+          console.log('Performance metrics generated:', job.result);
           setTimeout(() => {
             router.push('/metrics');
           }, 2000);